@@ -50,6 +50,16 @@ from werkzeug.middleware.proxy_fix import ProxyFix
  
 from app.config import Config
 from app.extensions import db, cors, init_redis
+from app.services.click_queue import init_click_queue
+from app.services.click_counters import init_click_counters
+from app.services.click_rollups import init_click_rollups
+from app.services.geoip import init_geoip
+from app.utils.user_agent import init_ua_cache
+from app.utils.timing import init_timing
+from app.utils.metrics import init_metrics
+from app.utils.structured_logging import init_logging
+from app.services.link_cache import init_link_cache
+from app.cli import register_cli_commands
 from app.utils.error_handler import register_error_handlers
 from app.routes.auth_routes import auth_bp
 from app.routes.core_routes import core_bp
@@ -61,6 +71,9 @@ def create_app() -> Flask:
  
     # Load configuration
     app.config.from_object(Config)
+
+    # Queue-backed JSON logging (first, so nothing logs synchronously)
+    init_logging(app)
  
     # Initialize extensions
     cors.init_app(app)
@@ -69,11 +82,32 @@ def create_app() -> Flask:
     # Initialize Redis
     try:
         init_redis(app)
-        # import extensions module to read the live redis_client value
-        import app.extensions as extensions
-        print(">>> Redis initialized in create_app:", extensions.redis_client)
     except Exception as e:
-        print(">>> Redis init error:", e)
+        app.logger.warning("Redis init error: %s", e)
+ 
+    # Background click writer (redirects never wait on analytics inserts)
+    init_click_queue(app)
+
+    # Redis click counters, flushed to url_click_counters in the background
+    init_click_counters(app)
+
+    # Hourly/daily click rollups, compacted from url_analytics in the background
+    init_click_rollups(app)
+
+    # Local Geo-IP table (memory-mapped on first lookup)
+    init_geoip(app)
+
+    # Parsed User-Agent cache
+    init_ua_cache(app)
+
+    # Per-worker L1 in front of the Redis redirect cache
+    init_link_cache(app)
+
+    # Per-phase timings (Server-Timing header, over-budget log lines)
+    init_timing(app)
+
+    # Prometheus metrics at /metrics (after init_timing: latency uses its start time)
+    init_metrics(app)
  
     # Fix proxy headers
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1)
@@ -88,13 +122,23 @@ def create_app() -> Flask:
     
     from app.routes.webhook_routes import webhook_bp
     app.register_blueprint(webhook_bp, url_prefix="/api/subscription")
+
+    # Admin-only tools (stack sampling profiler)
+    from app.routes.admin_routes import admin_bp
+    app.register_blueprint(admin_bp, url_prefix="/admin")
  
+    # CLI commands (flask geoip build ...)
+    register_cli_commands(app)
+
     # Create tables if not exists
     with app.app_context():
         from app.models.plan import Plan
         from app.models.user import User
         from app.models.url import Urls
         from app.models.url_analytics import UrlAnalytics
+        from app.models.short_code_sequence import ShortCodeSequence
+        from app.models.url_click_counter import ClickCounterBackfill, UrlClickCounter
+        from app.models.click_rollup import ClickRollupWatermark, UrlClickRollupDaily, UrlClickRollupHourly
         from app.models.subscription import RazorpaySubscriptionPlan, Subscription
         from app.models.billing_info import BillingInfo
         from app.models.webhook_events import WebhookEvent
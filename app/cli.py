@@ -0,0 +1,84 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .services import click_counters, click_partitions, click_rollups
+from .services.geoip import build_database
+
+
+geoip_cli = AppGroup("geoip", help="Manage the local Geo-IP table.")
+
+
+@geoip_cli.command("build")
+@click.argument("csv_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--output", "-o", default=None, help="Table path (defaults to GEOIP_DB_PATH).")
+def geoip_build(csv_path, output):
+    """Rebuild the Geo-IP table from an IPv4/IPv6 range CSV."""
+    out_path = output or current_app.config["GEOIP_DB_PATH"]
+    stats = build_database(csv_path, out_path)
+    click.echo(
+        f"Wrote {stats['ipv4']} IPv4 and {stats['ipv6']} IPv6 ranges "
+        f"({stats['locations']} locations, {stats['skipped']} lines skipped) to {out_path}"
+    )
+
+
+counters_cli = AppGroup("counters", help="Manage pre-aggregated click counters.")
+
+
+@counters_cli.command("backfill")
+@click.option("--until", "until", required=True, type=click.DateTime(),
+              help="UTC time click counting went live; older url_analytics rows are counted.")
+def counters_backfill(until):
+    """Count historical clicks into url_click_counters (safe to rerun)."""
+    stats = click_counters.backfill(until)
+    click.echo(f"Counted {stats['rows']} clicks for {stats['links']} links before {until.isoformat()}")
+
+
+@counters_cli.command("flush")
+def counters_flush():
+    """Write pending Redis counters to the DB now."""
+    click.echo(f"Flushed counters of {click_counters.flush()} links")
+
+
+rollups_cli = AppGroup("rollups", help="Manage hourly/daily click rollups.")
+
+
+@rollups_cli.command("compact")
+def rollups_compact():
+    """Fold new url_analytics rows into the rollup tables now."""
+    click.echo(f"Folded {click_rollups.compact()} clicks")
+
+
+@rollups_cli.command("backfill")
+@click.option("--rebuild", is_flag=True, help="Clear the rollups and the watermark first.")
+def rollups_backfill(rebuild):
+    """Fold the existing url_analytics history into the rollup tables."""
+    click.echo(f"Folded {click_rollups.backfill(rebuild=rebuild)} clicks")
+
+
+clicks_cli = AppGroup("clicks", help="Manage partitioned click storage.")
+
+
+@clicks_cli.command("partitions")
+def clicks_partitions():
+    """List the monthly click partitions."""
+    for month, table in click_partitions.partition_tables():
+        click.echo(f"{month:%Y-%m}  {table.name}")
+
+
+@clicks_cli.command("retention")
+@click.option("--months", type=int, default=None, help="Months to keep (defaults to CLICK_RETENTION_MONTHS).")
+def clicks_retention(months):
+    """Archive and drop click partitions older than the retention period."""
+    archives = click_partitions.apply_retention(months)
+    for archive in archives:
+        click.echo(f"Archived {archive['rows']} clicks from {archive['table']} to {archive['path']}")
+    if not archives:
+        click.echo("Nothing to archive")
+
+
+def register_cli_commands(app):
+    app.cli.add_command(geoip_cli)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(clicks_cli)
@@ -37,6 +37,90 @@ class Config:
  
     REDIS_URL = os.getenv("REDIS_URL")
     REDIS_TTL = int(os.getenv("REDIS_TTL", 3600))
+    # Per-worker L1 cache of resolved short codes in front of Redis
+    LINK_L1_SIZE = int(os.getenv("LINK_L1_SIZE", 10000))
+    LINK_L1_TTL = float(os.getenv("LINK_L1_TTL", 5))
+    # Seconds an unknown short code is remembered as "not found"
+    LINK_NEGATIVE_TTL = int(os.getenv("LINK_NEGATIVE_TTL", 60))
+    # Stale-while-revalidate window past REDIS_TTL, and single-flight lock (ms) / wait (s)
+    LINK_STALE_TTL = int(os.getenv("LINK_STALE_TTL", 300))
+    LINK_LOCK_MS = int(os.getenv("LINK_LOCK_MS", 2000))
+    LINK_LOCK_WAIT = float(os.getenv("LINK_LOCK_WAIT", 0.2))
+    # Generated short codes: sequence numbers reserved per worker in blocks, permuted with
+    # SHORT_CODE_KEY (defaults to SECRET_KEY; changing it changes which codes are issued next)
+    SHORT_CODE_BLOCK_SIZE = int(os.getenv("SHORT_CODE_BLOCK_SIZE", 100))
+    SHORT_CODE_KEY = os.getenv("SHORT_CODE_KEY")
+    # Browser/CDN cache lifetime (s) of "cached" (302) and "permanent" (301) redirects
+    LINK_CACHED_MAX_AGE = int(os.getenv("LINK_CACHED_MAX_AGE", 300))
+    LINK_PERMANENT_MAX_AGE = int(os.getenv("LINK_PERMANENT_MAX_AGE", 365 * 86400))
+    # Answer GET/HEAD /<short_code> with the minimal WSGI redirect app instead of Flask (wsgi.py)
+    FAST_REDIRECTS = os.getenv("FAST_REDIRECTS", "true").lower() in ("1", "true", "yes")
+    # asgi.py: threads for blocking work (DB fallbacks, non-redirect Flask requests) and async Redis pool size
+    ASGI_THREADS = int(os.getenv("ASGI_THREADS", 20))
+    ASGI_REDIS_MAX_CONNECTIONS = int(os.getenv("ASGI_REDIS_MAX_CONNECTIONS", 200))
+    # Per-phase request timings: Server-Timing header, and a log line past the budget (ms)
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+    REDIRECT_BUDGET_MS = float(os.getenv("REDIRECT_BUDGET_MS", 50))
+    REQUEST_BUDGET_MS = float(os.getenv("REQUEST_BUDGET_MS", 500))
+    # SQL statements per request before it is logged, and repeats of one statement shape flagged as N+1
+    QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 20))
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 5))
+    # /metrics: per-worker snapshots (default instance/metrics), how often they are written (s),
+    # when a stopped worker's snapshot is dropped (s), and the bearer token scrapes must send (unset: no /metrics)
+    METRICS_DIR = os.getenv("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+    METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", 3600))
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    # Logging: level, json|text, fraction of sub-WARNING records kept, queue bound, optional file (default stderr)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    LOG_FILE = os.getenv("LOG_FILE")
+    # Admin endpoints (/admin/profile); unset disables them
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    # Stack sampler: sampling interval (ms), longest capture (s), saved request profiles (default instance/profiles)
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+    PROFILE_DIR = os.getenv("PROFILE_DIR")
+    # Hours a cancelled owner's paid links keep redirecting (testing value: 1)
+    LINK_GRACE_PERIOD_HOURS = float(os.getenv("LINK_GRACE_PERIOD_HOURS", 1))
+
+    # Click pipeline: redirects queue analytics rows, a background writer bulk-inserts them
+    CLICK_QUEUE_MAXSIZE = int(os.getenv("CLICK_QUEUE_MAXSIZE", 10000))
+    CLICK_BATCH_SIZE = int(os.getenv("CLICK_BATCH_SIZE", 500))
+    CLICK_FLUSH_INTERVAL = float(os.getenv("CLICK_FLUSH_INTERVAL", 1.0))
+    CLICK_STREAM_KEY = os.getenv("CLICK_STREAM_KEY", "clicks:stream")
+    CLICK_STREAM_MAXLEN = int(os.getenv("CLICK_STREAM_MAXLEN", 1000000))
+    # Stream entries left unacknowledged this long (ms), e.g. by a crashed worker, are reclaimed
+    CLICK_STREAM_CLAIM_IDLE_MS = int(os.getenv("CLICK_STREAM_CLAIM_IDLE_MS", 60000))
+    # Click rows the DB rejects (after a row-by-row retry) are parked here instead of retried forever
+    CLICK_DEAD_LETTER_KEY = os.getenv("CLICK_DEAD_LETTER_KEY", "clicks:dead")
+    # Seconds between flushes of the Redis click counters into url_click_counters
+    CLICK_COUNTER_FLUSH_INTERVAL = float(os.getenv("CLICK_COUNTER_FLUSH_INTERVAL", 10))
+    # Rollup compactor: run every ROLLUP_INTERVAL s, fold url_analytics ids older than ROLLUP_LAG s
+    ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", 60))
+    ROLLUP_LAG = float(os.getenv("ROLLUP_LAG", 60))
+    ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", 5000))
+    # Click retention (flask clicks retention): months kept online (0 = keep forever);
+    # older monthly partitions are archived as <table>.ndjson.gz in CLICK_ARCHIVE_DIR and dropped
+    CLICK_RETENTION_MONTHS = int(os.getenv("CLICK_RETENTION_MONTHS", 0))
+    CLICK_ARCHIVE_DIR = os.getenv("CLICK_ARCHIVE_DIR")
+
+    # Geo-IP: local range table (flask geoip build <csv>); ipwho.is only when no table is installed
+    # and GEOIP_REMOTE_FALLBACK is switched on (off by default: one HTTP call per uncached IP;
+    # startup logs a warning when neither is available, as clicks then have no location)
+    GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH")
+    GEOIP_REMOTE_FALLBACK = os.getenv("GEOIP_REMOTE_FALLBACK", "false").lower() in ("1", "true", "yes")
+    # IP -> location cache: per-worker LRU + shared Redis hash; GEO_CACHE_KEY is "ip" or "prefix" (/24, /48)
+    GEO_CACHE_KEY = os.getenv("GEO_CACHE_KEY", "ip")
+    GEO_CACHE_SIZE = int(os.getenv("GEO_CACHE_SIZE", 10000))
+    GEO_CACHE_TTL = int(os.getenv("GEO_CACHE_TTL", 3600))
+    GEO_CACHE_REDIS_TTL = int(os.getenv("GEO_CACHE_REDIS_TTL", 7 * 86400))
+    GEO_CACHE_NEGATIVE_TTL = int(os.getenv("GEO_CACHE_NEGATIVE_TTL", 300))
+
+    # Parsed User-Agent LRU (entries are distinct UA strings)
+    UA_CACHE_SIZE = int(os.getenv("UA_CACHE_SIZE", 4096))
 
     RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
     RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
@@ -21,10 +21,8 @@ def init_redis(app):
     global redis_client
  
     url = app.config.get("REDIS_URL")
-    print(">>> init_redis() called")
- 
     if not url:
-        print(">>> No REDIS_URL found in environment")
+        app.logger.info("No REDIS_URL configured, running without Redis.")
         redis_client = None
         return
  
@@ -32,11 +30,9 @@ def init_redis(app):
         client = redis.Redis.from_url(url, decode_responses=True)
         client.ping()
         redis_client = client
-        print(">>> Redis OK — connected successfully")
         app.logger.info("Redis initialized successfully.")
     except Exception as exc:
         redis_client = None
-        print(">>> Redis ERROR:", exc)
         app.logger.warning(f"Redis initialization failed: {exc}")
  
  
@@ -0,0 +1,39 @@
+from ..extensions import db
+
+
+class _RollupColumns:
+    # Dimensions are never NULL (missing values are stored as "Unknown") so they can form the key
+    url_id = db.Column(db.Integer, db.ForeignKey('urls.id_'), primary_key=True)
+    source = db.Column(db.String(20), primary_key=True)
+    country = db.Column(db.String(100), primary_key=True)
+    browser = db.Column(db.String(100), primary_key=True)
+    os = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class UrlClickRollupHourly(_RollupColumns, db.Model):
+    """Clicks per link, IST hour and dimensions, folded from url_analytics."""
+    __tablename__ = "url_click_rollups_hourly"
+
+    bucket = db.Column(db.DateTime, primary_key=True)  # start of the IST hour (naive)
+
+
+class UrlClickRollupDaily(_RollupColumns, db.Model):
+    """Clicks per link, IST day and dimensions, folded from url_analytics."""
+    __tablename__ = "url_click_rollups_daily"
+
+    bucket = db.Column(db.Date, primary_key=True)  # IST calendar day
+
+
+class ClickRollupWatermark(db.Model):
+    """
+    Compactor progress per click table (``name``): rows with ``id <= last_id`` are folded in.
+    ``horizon_id`` is the highest id seen at ``horizon_at``; ids up to it are
+    only folded once they are old enough that every insert below it committed.
+    """
+    __tablename__ = "click_rollup_watermark"
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    horizon_id = db.Column(db.BigInteger, nullable=False, default=0)
+    horizon_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,12 @@
+from ..extensions import db
+
+
+class ShortCodeSequence(db.Model):
+    """hi/lo counter behind generated short codes; each worker reserves a block at a time."""
+    __tablename__ = "short_code_sequence"
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)
+
+    def __repr__(self):
+        return f"<ShortCodeSequence {self.name}={self.next_value}>"
@@ -8,7 +8,7 @@ class RazorpaySubscriptionPlan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     plan_name = db.Column(db.String(255), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)  # User-specific plan
-    razorpay_plan_id = db.Column(db.String(255), nullable=True)
+    razorpay_plan_id = db.Column(db.String(255), nullable=True, index=True)
     period = db.Column(db.String(50), nullable=True)
     interval = db.Column(db.Integer, nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -35,7 +35,7 @@ class Subscription(db.Model):
     cart_id = db.Column(db.String(255), default='', nullable=True)
     razorpay_plan_id = db.Column(db.String(255), default='', nullable=True)
     plan_amount = db.Column(db.Float, default=0.0, nullable=True)
-    razorpay_subscription_id = db.Column(db.String(255), default='', nullable=True)
+    razorpay_subscription_id = db.Column(db.String(255), default='', nullable=True, index=True)
     razorpay_signature_id = db.Column(db.String(255), default='', nullable=True)
     subscription_status = db.Column(db.String(50), default='Pending', nullable=True)
     subscription_start_date = db.Column(db.DateTime, nullable=True)
@@ -22,7 +22,23 @@ class Urls(db.Model):
     is_custom = db.Column(db.Boolean, default=False)
     is_edited = db.Column(db.Boolean, default=False)
     plan_name = db.Column(db.String(50), nullable=True)
+
+    # Redirect policy: "temporary" (302, not cached), "cached" (302 + max-age) or "permanent" (301)
+    redirect_policy = db.Column(db.String(20), nullable=True, default="temporary")
+    redirect_max_age = db.Column(db.Integer, nullable=True)  # seconds; None -> config default
  
  
  
-    user = db.relationship("User", backref=db.backref("urls", lazy=True))
\ No newline at end of file
+    user = db.relationship("User", backref=db.backref("urls", lazy=True))
+
+    # Kept in sync with migrations/add_hot_path_indexes.py (existing databases)
+    __table_args__ = (
+        db.Index(
+            "ux_urls_short", "short", unique=True,
+            mssql_where=db.text("short IS NOT NULL"),
+            postgresql_where=db.text("short IS NOT NULL"),
+            sqlite_where=db.text("short IS NOT NULL"),
+        ),
+        db.Index("ix_urls_user_id_plan_name", "user_id", "plan_name"),
+        db.Index("ix_urls_user_id_is_custom", "user_id", "is_custom"),
+    )
\ No newline at end of file
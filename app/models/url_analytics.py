@@ -55,4 +55,8 @@ class UrlAnalytics(db.Model):
  
  
     url = db.relationship("Urls", backref=db.backref("analytics", lazy=True))
+
+    __table_args__ = (
+        db.Index("ix_url_analytics_url_id_timestamp", "url_id", "timestamp"),
+    )
  
\ No newline at end of file
@@ -0,0 +1,28 @@
+from ..extensions import db
+
+
+class UrlClickCounter(db.Model):
+    """
+    Persisted click counters per link and bucket, e.g. ``total``,
+    ``source:qr``, ``day:2025-01-31``, ``hour:2025-01-31T14`` (IST) or
+    ``country:India``. Recent clicks live in Redis until the next flush.
+    """
+    __tablename__ = "url_click_counters"
+
+    url_id = db.Column(db.Integer, db.ForeignKey('urls.id_'), primary_key=True)
+    bucket = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UrlClickCounter {self.url_id} {self.bucket}={self.count}>"
+
+
+class ClickCounterBackfill(db.Model):
+    """
+    How far ``flask counters backfill`` has counted: stored clicks older than
+    ``counted_until`` (naive UTC) are already in url_click_counters.
+    """
+    __tablename__ = "url_click_counter_backfill"
+
+    name = db.Column(db.String(50), primary_key=True)
+    counted_until = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,131 @@
+"""
+Minimal WSGI app for short link redirects.
+
+Wrapped around the Flask app in wsgi.py: ``GET``/``HEAD /<short_code>`` is
+answered here through the shared redirect pipeline (link cache, Lua
+resolve-and-count, click queue) with a bodyless 301/302. Everything else
+goes to Flask untouched, and so does any redirect that fails here.
+
+Skipped on this path: request context, blueprint dispatch, flask-cors,
+ProxyFix and the HTML body of ``redirect()``. Only an app context is pushed,
+for the config and the DB fallback on a cache miss.
+"""
+import json
+import logging
+import time
+from urllib.parse import parse_qsl
+
+from werkzeug.urls import iri_to_uri
+
+from .services.redirect_service import (
+    EXPIRED_MESSAGES, LINK_EXPIRED, LINK_MISSING, MISSING_MESSAGE, client_ip, redirect_caching,
+    resolve_and_count, resolve_link, should_count
+)
+from .utils import metrics, query_counter, timing
+
+logger = logging.getLogger(__name__)
+
+_STATUS = {301: "301 MOVED PERMANENTLY", 302: "302 FOUND", 404: "404 NOT FOUND"}
+
+
+def _not_found(message: str) -> tuple[int, list, bytes]:
+    # Same envelope jsonify(api_response(...)) produces for the Flask route
+    body = (json.dumps({"data": None, "message": message, "success": False},
+                       sort_keys=True, separators=(",", ":")) + "\n").encode()
+    return 404, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))], body
+
+
+_MISSING = _not_found(MISSING_MESSAGE)
+_EXPIRED = {source: _not_found(message) for source, message in EXPIRED_MESSAGES.items()}
+
+
+def reserved_paths(flask_app) -> set:
+    """Single-segment routes (/login, /health, ...): these belong to Flask."""
+    return {
+        rule.rule.rstrip("/") for rule in flask_app.url_map.iter_rules()
+        if not rule.arguments and rule.rule.count("/") <= 2
+    }
+
+
+def click_source(query_string: str) -> str:
+    if not query_string:
+        return "direct"
+    return next((value for key, value in parse_qsl(query_string) if key == "source"), "direct")
+
+
+def response_for(link) -> tuple[int, list, bytes]:
+    """Status code, headers and body for a lookup (needs an app context)."""
+    if link.status == LINK_MISSING:
+        return _MISSING
+    if link.status == LINK_EXPIRED:
+        return _EXPIRED[link.source]
+    with timing.phase("response"):
+        code, caching = redirect_caching(link)
+        location = link.long_url if link.long_url.isascii() else iri_to_uri(link.long_url)
+        return code, [("Location", location), ("Content-Length", "0"), *caching.items()], b""
+
+
+def finish_redirect(code: int, headers: list, config, method: str, path: str) -> list:
+    """Records the latency of the redirect timed in this context; ``headers`` plus Server-Timing."""
+    timings = timing.current()
+    if timings is None:
+        return headers
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - timings.started,
+                    endpoint="url.redirection", method=method, status=code)
+    value = timing.report(timings, timing.budget_for(config, "url.redirection"), f"{method} {path}")
+    query_counter.review(timings.statements, config, f"{method} {path}")
+    if config.get("SERVER_TIMING", True):
+        headers = [*headers, ("Server-Timing", value)]
+    return headers
+
+
+class RedirectDispatcher:
+    """WSGI middleware: short codes are redirected here, the rest is passed to ``fallback``."""
+
+    def __init__(self, flask_app, fallback):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        self.reserved = reserved_paths(flask_app)
+
+    def short_code(self, environ) -> str | None:
+        if environ.get("REQUEST_METHOD") not in ("GET", "HEAD"):
+            return None
+        # Cross-origin requests need flask-cors headers; profiled ones the admin hooks
+        if "HTTP_ORIGIN" in environ or "HTTP_X_PROFILE" in environ:
+            return None
+        path = environ.get("PATH_INFO", "")
+        if len(path) < 2 or "/" in path[1:] or path in self.reserved:
+            return None
+        # WSGI hands the path over as latin-1; Flask decodes it as UTF-8
+        return path[1:].encode("latin-1").decode("utf-8", "replace")
+
+    def __call__(self, environ, start_response):
+        short_code = self.short_code(environ)
+        if short_code is None:
+            return self.fallback(environ, start_response)
+
+        token = timing.begin()
+        try:
+            with self.flask_app.app_context():
+                code, headers, body = self.redirect(environ, short_code)
+            headers = finish_redirect(code, headers, self.flask_app.config, environ["REQUEST_METHOD"], f"/{short_code}")
+        except Exception as exc:
+            # The full stack retries it (a counted click is debounced there)
+            logger.warning("Fast redirect failed for %s, falling back to Flask: %s", short_code, exc)
+            return self.fallback(environ, start_response)
+        finally:
+            timing.end(token)
+
+        start_response(_STATUS[code], headers)
+        return [] if environ["REQUEST_METHOD"] == "HEAD" else [body]
+
+    def redirect(self, environ, short_code: str) -> tuple[int, list, bytes]:
+        user_agent = environ.get("HTTP_USER_AGENT", "Unknown")
+        if should_count(environ["REQUEST_METHOD"], user_agent):
+            headers = {"X-Forwarded-For": environ.get("HTTP_X_FORWARDED_FOR", "")}
+            ip_address = client_ip(headers, environ.get("REMOTE_ADDR"))
+            source = click_source(environ.get("QUERY_STRING"))
+            link = resolve_and_count(short_code, user_agent, ip_address, source)
+        else:
+            link = resolve_link(short_code)
+        return response_for(link)
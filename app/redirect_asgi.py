@@ -0,0 +1,274 @@
+"""
+ASGI app for high-concurrency redirect deployments (see asgi.py).
+
+``GET``/``HEAD /<short_code>`` is served on the event loop: L1, then one
+``redis.asyncio`` call (the Lua script that resolves, debounces, counts and
+queues the click), so one process holds thousands of in-flight redirects.
+Clicks counted that way are enriched (UA, geo) by the click writer, never
+on the request path. The lock for refreshing a stale payload is taken with
+the async client too.
+
+Blocking work runs on a bounded thread pool: the DB fallback on a cache
+miss (there is no asyncio driver for pymssql), starting the per-process
+background threads, and every non-redirect request, which is handed to the
+Flask app through a buffered WSGI bridge.
+"""
+import asyncio
+import contextvars
+import io
+import logging
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import redis.asyncio as aioredis
+
+from . import extensions
+from .redirect_app import click_source, finish_redirect, reserved_paths, response_for
+from .services import click_counters, click_queue, link_cache
+from .services.redirect_service import (
+    client_ip, load_payload, peek_unavailable, redirect_script, redirect_script_call, redis_lookup,
+    resolve_and_record, resolve_link, script_payload, should_count
+)
+from .utils import metrics, timing
+
+logger = logging.getLogger(__name__)
+
+
+class RedirectASGI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.reserved = reserved_paths(flask_app)
+        self.threads = ThreadPoolExecutor(
+            max_workers=int(flask_app.config.get("ASGI_THREADS", 20)), thread_name_prefix="asgi-blocking"
+        )
+        self.redis = None
+        self.threads_pid = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        short_code = self.short_code(scope, headers)
+        if short_code is None:
+            return await self._call_flask(scope, receive, send)
+
+        token = timing.begin()
+        try:
+            with self.flask_app.app_context():
+                code, response_headers, body = await self.redirect(scope, headers, short_code)
+            response_headers = finish_redirect(code, response_headers, self.flask_app.config, scope["method"], scope["path"])
+        except Exception as exc:
+            logger.warning("Async redirect failed for %s, falling back to Flask: %s", short_code, exc)
+            return await self._call_flask(scope, receive, send)
+        finally:
+            timing.end(token)
+
+        await send({
+            "type": "http.response.start",
+            "status": code,
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response_headers],
+        })
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    def short_code(self, scope, headers: dict) -> str | None:
+        # Same rules as RedirectDispatcher.short_code; ASGI paths are already decoded
+        if scope["method"] not in ("GET", "HEAD") or "origin" in headers or "x-profile" in headers:
+            return None
+        path = scope["path"]
+        if len(path) < 2 or "/" in path[1:] or path in self.reserved:
+            return None
+        return path[1:]
+
+    # -------------------------------------
+    # Redirects
+    # -------------------------------------
+    def client(self):
+        # Only when the sync client connected in create_app, i.e. Redis is configured and up
+        if self.redis is None and extensions.redis_client:
+            pool = aioredis.BlockingConnectionPool.from_url(
+                self.flask_app.config["REDIS_URL"],
+                max_connections=int(self.flask_app.config.get("ASGI_REDIS_MAX_CONNECTIONS", 200)),
+                decode_responses=True,
+            )
+            self.redis = aioredis.Redis(connection_pool=pool)
+        return self.redis
+
+    async def blocking(self, fn, *args):
+        def run():
+            with self.flask_app.app_context():
+                return fn(*args)
+        # The thread adds its phases to this request's timings
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.threads, context.run, run)
+
+    async def start_threads(self):
+        # Invalidation listener, counter flusher and click writer: started from the pool, once per process
+        pid = os.getpid()
+        if self.threads_pid != pid:
+            await self.blocking(start_background_threads)
+            self.threads_pid = pid
+
+    async def refresh_lock(self, short_code: str) -> str | None:
+        """``link_cache._acquire_lock`` over the async client."""
+        token = uuid.uuid4().hex
+        client = self.client()
+        if not client:
+            return token
+        try:
+            lock_ms = int(self.flask_app.config.get("LINK_LOCK_MS", 2000))
+            return token if await client.set(link_cache.lock_key(short_code), token, nx=True, px=lock_ms) else None
+        except Exception:
+            return token  # Redis down: refresh on our own rather than not at all
+
+    async def cached_lookup(self, short_code: str, payload: dict):
+        if link_cache.is_stale(payload) and link_cache.claim_refresh(short_code):
+            # Serve the stale copy; the rebuild runs on link_cache's refresher pool
+            link_cache.start_refresh(short_code, load_payload, await self.refresh_lock(short_code))
+        return redis_lookup(payload)
+
+    async def redirect(self, scope, headers: dict, short_code: str) -> tuple[int, list, bytes]:
+        user_agent = headers.get("user-agent", "Unknown")
+        if should_count(scope["method"], user_agent):
+            remote_addr = (scope.get("client") or (None,))[0]
+            ip_address = client_ip({"X-Forwarded-For": headers.get("x-forwarded-for", "")}, remote_addr)
+            source = click_source(scope.get("query_string", b"").decode("latin-1"))
+            link = await self.resolve_and_count(short_code, user_agent, ip_address, source)
+        else:
+            link = await self.resolve_link(short_code)
+        return response_for(link)
+
+    async def resolve_link(self, short_code: str):
+        payload = link_cache.peek(short_code)
+        client = self.client()
+        if payload is None and client:
+            await self.start_threads()
+            try:
+                with timing.phase("cache"):
+                    payload = link_cache.remember(short_code, await client.get(link_cache.cache_key(short_code)))
+                metrics.inc("link_cache_redis_total", result="miss" if payload is None else "hit")
+            except Exception as exc:
+                logger.warning("Async Redis GET failed for %s: %s", short_code, exc)
+                metrics.inc("link_cache_redis_total", result="error")
+        if payload is not None:
+            return await self.cached_lookup(short_code, payload)
+        return await self.blocking(resolve_link, short_code)
+
+    async def resolve_and_count(self, short_code: str, user_agent: str, ip_address: str, source: str):
+        link = peek_unavailable(short_code)
+        if link is not None:
+            return link
+
+        client = self.client()
+        if client:
+            await self.start_threads()
+            keys, args = redirect_script_call(short_code, user_agent, ip_address, source)
+            try:
+                with timing.phase("cache"):
+                    result = await redirect_script(client)(keys=keys, args=args)
+            except Exception as exc:
+                logger.warning("Async redirect script failed for %s: %s", short_code, exc)
+                metrics.inc("link_cache_redis_total", result="error")
+                result = None
+            payload = script_payload(short_code, result)
+            link = None if payload is None else await self.cached_lookup(short_code, payload)
+            if result is not None:
+                metrics.inc("link_cache_redis_total", result="miss" if link is None else "hit")
+            if link is not None:
+                return link
+
+        # Cache miss: DB lookup and queueing run in a thread
+        return await self.blocking(resolve_and_record, short_code, user_agent, ip_address, source)
+
+    # -------------------------------------
+    # Everything else: Flask over WSGI
+    # -------------------------------------
+    async def _call_flask(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        environ = wsgi_environ(scope, bytes(body))
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(
+            self.threads, self._run_wsgi, environ
+        )
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+    def _run_wsgi(self, environ) -> tuple[int, list, bytes]:
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"], started["headers"] = status, headers
+
+        result = self.flask_app(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return int(started["status"].split(" ", 1)[0]), started["headers"], content
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.redis is not None:
+                    await self.redis.aclose()
+                self.threads.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def start_background_threads():
+    link_cache.ensure_subscriber()
+    click_counters.ensure_flusher()
+    # Clicks counted by the redirect script only reach the DB through the stream the writer drains
+    click_queue.ensure_writer()
+
+
+def wsgi_environ(scope, body: bytes) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI carries the UTF-8 path bytes as latin-1 text
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body is fully buffered (chunked uploads included)
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
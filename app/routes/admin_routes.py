@@ -0,0 +1,89 @@
+import hmac
+import os
+from functools import wraps
+
+from flask import Blueprint, Response, current_app, g, request, send_file
+
+from ..utils import profiler
+
+admin_bp = Blueprint("admin", __name__)
+
+
+def admin_token_ok(token: str | None) -> bool:
+    expected = current_app.config.get("ADMIN_TOKEN")
+    return bool(expected and token) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def admin_required(f):
+    """Bearer ADMIN_TOKEN; without one configured the admin routes do not exist."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_app.config.get("ADMIN_TOKEN"):
+            return {"error": "Not found"}, 404
+        auth = request.headers.get("Authorization", "")
+        if not auth.startswith("Bearer "):
+            return {"error": "Missing admin token"}, 401
+        if not admin_token_ok(auth[7:]):
+            return {"error": "Invalid admin token"}, 403
+        return f(*args, **kwargs)
+    return decorated
+
+
+# -------------------------------------
+# Profiling
+# -------------------------------------
+@admin_bp.route("/profile", methods=["POST"])
+@admin_required
+def profile_worker():
+    """Sample every thread of this worker for ?seconds= (collapsed stacks)."""
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval_ms = float(request.args.get("interval_ms", current_app.config.get("PROFILE_INTERVAL_MS", 5)))
+    except ValueError:
+        return {"error": "seconds and interval_ms must be numbers"}, 400
+    limit = float(current_app.config.get("PROFILE_MAX_SECONDS", 60))
+    if not 0 < seconds <= limit:
+        return {"error": f"seconds must be between 0 and {limit:g}"}, 400
+
+    sampler = profiler.capture(seconds, profiler.interval_seconds(interval_ms))
+    if sampler is None:
+        return {"error": "A profile is already running in this worker"}, 409
+    response = Response(sampler.collapsed(), mimetype="text/plain")
+    response.headers["X-Profile-Samples"] = str(sampler.samples)
+    response.headers["X-Profile-Pid"] = str(os.getpid())
+    return response
+
+
+@admin_bp.route("/profile/<name>", methods=["GET"])
+@admin_required
+def request_profile(name):
+    """A single-request profile saved by an ``X-Profile`` request."""
+    path = profiler.profile_path(current_app, name)
+    if path is None or not os.path.isfile(path):
+        return {"error": "Profile not found"}, 404
+    return send_file(path, mimetype="text/plain")
+
+
+@admin_bp.before_app_request
+def _start_request_profile():
+    if admin_token_ok(request.headers.get("X-Profile")):
+        g._profiler = profiler.start_request_profile(
+            profiler.interval_seconds(current_app.config.get("PROFILE_INTERVAL_MS", 5))
+        )
+
+
+@admin_bp.after_app_request
+def _save_request_profile(response):
+    sampler = g.pop("_profiler", None)
+    if sampler is not None:
+        profiler.finish_request_profile(sampler)
+        response.headers["X-Profile"] = profiler.save(sampler, request.endpoint)
+    return response
+
+
+@admin_bp.teardown_app_request
+def _stop_request_profile(exc):
+    # Only still set when the request failed before after_request
+    sampler = g.pop("_profiler", None)
+    if sampler is not None:
+        profiler.finish_request_profile(sampler)
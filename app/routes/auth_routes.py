@@ -10,6 +10,7 @@ from ..models.plan import Plan
 from ..utils.jwt_helper import encode_token, decode_token
 from ..utils.response import api_response
 from ..utils.passwords import verify_and_upgrade_password
+from ..utils.timing import phase
  
  
 auth_bp = Blueprint("auth", __name__)
@@ -117,8 +118,9 @@ def token_required(f):
             return api_response(False, "Token is missing!", None)
  
         try:
-            payload = decode_token(token)
-            current_user = User.query.filter_by(id=payload['user_id'],email=payload['email']).first()
+            with phase("auth"):
+                payload = decode_token(token)
+                current_user = User.query.filter_by(id=payload['user_id'],email=payload['email']).first()
 
             if not current_user:
                 return api_response(False, "User not found!", None)
@@ -1,4 +1,7 @@
-from flask import Blueprint
+import hmac
+
+from flask import Blueprint, Response, current_app, request
+from ..utils import metrics
 from ..utils.response import api_response
 
 core_bp = Blueprint("core", __name__)
@@ -13,3 +16,17 @@ def root():
 @core_bp.route("/health")
 def health():
     return {"status": "ok"}, 200
+
+
+@core_bp.route("/metrics")
+def metrics_endpoint():
+    # Bearer METRICS_TOKEN; without one configured the endpoint does not exist
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        return {"error": "Not found"}, 404
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return {"error": "Missing metrics token"}, 401
+    if not hmac.compare_digest(auth[7:].encode(), token.encode()):
+        return {"error": "Invalid metrics token"}, 403
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
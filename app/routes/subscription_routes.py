@@ -14,9 +14,12 @@ import base64
 import hmac
 import hashlib
 import datetime
+import logging
 
 from threading import Lock
 
+logger = logging.getLogger(__name__)
+
 subscription_bp = Blueprint('subscription_bp', __name__)
 plan_lock = Lock()
 subscription_lock = Lock()
@@ -48,7 +51,7 @@ def create_plan(current_user):
             ).first()
 
             if existing_plan:
-                 print(f"DEBUG: Returning existing plan {existing_plan.razorpay_plan_id} for user {current_user.id}, plan {plan_name}")
+                 logger.debug("Returning existing plan %s for user %s, plan %s", existing_plan.razorpay_plan_id, current_user.id, plan_name)
                  return jsonify({
                     'message': 'Plan retrieved successfully (renewal)',
                     'plan': {
@@ -80,7 +83,7 @@ def create_plan(current_user):
             )
 
             if response.status_code != 200:
-                print(f"DEBUG: Razorpay Plan Creation Failed: {response.text}")
+                logger.warning("Razorpay Plan Creation Failed: %s", response.text)
                 return jsonify({'error': 'Razorpay API failed', 'details': response.json()}), response.status_code
 
             razorpay_data = response.json()
@@ -101,7 +104,7 @@ def create_plan(current_user):
             db.session.add(new_plan)
             db.session.commit()
             
-            print(f"DEBUG: Created new user-specific plan {razorpay_plan_id} for user {current_user.id}, plan {plan_name}")
+            logger.info("Created new user-specific plan %s for user %s, plan %s", razorpay_plan_id, current_user.id, plan_name)
 
             return jsonify({
                 'message': 'Plan created successfully',
@@ -142,7 +145,7 @@ def create_subscription(current_user):
             # ).order_by(Subscription.created_date.desc()).first()
 
             # if existing_sub:
-            #      print(f"DEBUG: Reuse existing Pending Subscription {existing_sub.razorpay_subscription_id}")
+            #      logger.debug("Reuse existing Pending Subscription %s", existing_sub.razorpay_subscription_id)
             #      return jsonify({
             #         'razorpay_subscription_id': existing_sub.razorpay_subscription_id,
             #         'key_id': razorpay_key_id,
@@ -263,7 +266,7 @@ def create_plan_and_subscription(current_user):
 
             # Create or get user-specific plan
             if existing_plan:
-                print(f"DEBUG: Using existing user-specific plan {existing_plan.razorpay_plan_id} for user {current_user.id}, plan {plan_name} (RENEWAL)")
+                logger.debug("Using existing user-specific plan %s for user %s, plan %s (RENEWAL)", existing_plan.razorpay_plan_id, current_user.id, plan_name)
                 razorpay_plan_id = existing_plan.razorpay_plan_id
             else:
                 # Create new user-specific plan on Razorpay
@@ -280,7 +283,7 @@ def create_plan_and_subscription(current_user):
                 )
 
                 if response.status_code != 200:
-                    print(f"DEBUG: Razorpay Plan Creation Failed: {response.text}")
+                    logger.warning("Razorpay Plan Creation Failed: %s", response.text)
                     return jsonify({'error': 'Razorpay plan creation failed', 'details': response.json()}), response.status_code
 
                 razorpay_data = response.json()
@@ -300,7 +303,7 @@ def create_plan_and_subscription(current_user):
 
                 db.session.add(new_plan)
                 db.session.commit()
-                print(f"DEBUG: Created new user-specific plan {razorpay_plan_id} for user {current_user.id}, plan {plan_name}")
+                logger.info("Created new user-specific plan %s for user %s, plan %s", razorpay_plan_id, current_user.id, plan_name)
 
 
             # ============================================================================
@@ -317,7 +320,7 @@ def create_plan_and_subscription(current_user):
             ).order_by(Subscription.created_date.desc()).first()
 
             if existing_sub:
-                print(f"DEBUG: Reuse existing Pending Subscription {existing_sub.razorpay_subscription_id}")
+                logger.debug("Reuse existing Pending Subscription %s", existing_sub.razorpay_subscription_id)
                 return jsonify({
                     'razorpay_subscription_id': existing_sub.razorpay_subscription_id,
                     'razorpay_plan_id': razorpay_plan_id,
@@ -369,7 +372,7 @@ def create_plan_and_subscription(current_user):
                 return jsonify({'error': 'Failed to create subscription', 'details': response.json()}), response.status_code
 
             sub_data = response.json()
-            print(f"DEBUG: Created subscription {sub_data}")
+            logger.info("Created subscription %s", sub_data)
             sub_id = sub_data.get('id')
 
             # Fetch plan details to get the amount
@@ -448,7 +451,7 @@ def verify_payment(current_user):
         # Store the verified signature
         sub.razorpay_signature_id = razorpay_signature
         db.session.commit()
-        print(f"DEBUG: Stored razorpay_signature for subscription {razorpay_subscription_id}")
+        logger.info("Stored razorpay_signature for subscription %s", razorpay_subscription_id)
 
         # Check if webhook has processed this payment
         webhook_processed = WebhookEvent.query.filter_by(
@@ -460,7 +463,7 @@ def verify_payment(current_user):
 
         # Return current status based on webhook processing
         if webhook_processed and sub.subscription_status == 'Active':
-            print(f"DEBUG: Webhook processed and subscription active for {razorpay_subscription_id}")
+            logger.info("Webhook processed and subscription active for %s", razorpay_subscription_id)
             return jsonify({
                 'message': 'Subscription verified and activated by webhook',
                 'status': 'Active',
@@ -468,7 +471,7 @@ def verify_payment(current_user):
                 'webhook_processed': True
             }), 200
         elif sub.subscription_status == 'Active':
-            print(f"DEBUG: Subscription already active for {razorpay_subscription_id}")
+            logger.debug("Subscription already active for %s", razorpay_subscription_id)
             return jsonify({
                 'message': 'Subscription is active',
                 'status': 'Active',
@@ -477,7 +480,7 @@ def verify_payment(current_user):
             }), 200
         else:
             # Payment verified but webhook hasn't processed yet
-            print(f"INFO: Payment verified but webhook pending for {razorpay_subscription_id}")
+            logger.info("Payment verified but webhook pending for %s", razorpay_subscription_id)
             return jsonify({
                 'message': 'Payment verified, waiting for webhook to activate subscription',
                 'status': sub.subscription_status,
@@ -487,7 +490,7 @@ def verify_payment(current_user):
             }), 202  # 202 Accepted - processing in progress
 
     except Exception as e:
-        print(f"ERROR: verify_payment failed: {str(e)}")
+        logger.error("verify_payment failed: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -601,11 +604,12 @@ def _create_subscription_history(subscription, reason='User Requested'):
         db.session.add(history)
         return history
     except Exception as e:
-        print(f"ERROR: Failed to create subscription history: {str(e)}")
+        logger.error("Failed to create subscription history: %s", e)
         raise
 
 
 from app.models.url import Urls
+from app.services.link_cache import invalidate_user_links
 
 def _downgrade_user_to_free(user_id):
     """
@@ -624,11 +628,13 @@ def _downgrade_user_to_free(user_id):
         
         # Set cancellation date to start the 60-day grace period
         user.cancellation_date = datetime.datetime.utcnow()
+        # Cached redirect payloads embed the owner's grace period -> drop them on commit
+        invalidate_user_links(user_id)
         
         # Find Free plan
         free_plan = Plan.query.filter_by(name='Free').first()
         if not free_plan:
-            print("WARNING: Free plan not found in database")
+            logger.warning("Free plan not found in database")
             return False
         
         # Update user plan
@@ -667,11 +673,11 @@ def _downgrade_user_to_free(user_id):
         user.usage_qr_with_logo = 0
         user.usage_editable_links = 0
         
-        print(f"DEBUG: Downgraded user {user_id} to Free plan with limits: links={user.usage_links}, qrs={user.usage_qrs}")
+        logger.info("Downgraded user %s to Free plan with limits: links=%s, qrs=%s", user_id, user.usage_links, user.usage_qrs)
         return True
         
     except Exception as e:
-        print(f"ERROR: Failed to downgrade user: {str(e)}")
+        logger.error("Failed to downgrade user: %s", e)
         return False
 
 
@@ -735,7 +741,7 @@ def cancel_subscription(current_user):
 
         db.session.commit()
 
-        print(f"DEBUG: Cancelled subscription {subscription_id} for user {current_user.id}")
+        logger.info("Cancelled subscription %s for user %s", subscription_id, current_user.id)
 
         return jsonify({
             'message': 'Subscription cancelled successfully',
@@ -746,7 +752,7 @@ def cancel_subscription(current_user):
 
     except Exception as e:
         db.session.rollback()
-        print(f"ERROR: cancel_subscription failed: {str(e)}")
+        logger.error("cancel_subscription failed: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -769,7 +775,7 @@ def get_subscription_history(current_user):
         }), 200
 
     except Exception as e:
-        print(f"ERROR: get_subscription_history failed: {str(e)}")
+        logger.error("get_subscription_history failed: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -817,6 +823,6 @@ def get_active_subscription(current_user):
         }), 200
 
     except Exception as e:
-        print(f"ERROR: get_active_subscription failed: {str(e)}")
+        logger.error("get_active_subscription failed: %s", e)
         return jsonify({'error': str(e)}), 500
 
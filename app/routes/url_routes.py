@@ -1,21 +1,14 @@
 import os
-import random
-import string
 import uuid
 import datetime
 from urllib.parse import urlparse
  
 from flask import Blueprint, logging, request, redirect
-import json
-import requests
-from user_agents import parse
 # from app.extensions import db, redis_client
-from .. import extensions    
  
-from ..extensions import db, redis_client
+from ..extensions import db
 from flask import current_app
 from ..models.url import Urls
-from ..models.url_analytics import UrlAnalytics
 from ..routes.auth_routes import token_required
 from ..utils.response import api_response
 from sqlalchemy import cast, Date, func
@@ -24,7 +17,14 @@ from ..models.user import User
 from ..utils.passwords import verify_and_upgrade_password
 from ..utils.static_urls import build_static_url
 from ..utils.qr_generator import generate_styled_qr
+from ..utils.timing import phase
 from ..utils.security import is_unsafe_url # Import security check
+from ..services import click_counters, click_partitions, click_rollups, link_cache, short_codes
+from ..services.geoip import get_location_from_ip
+from ..services.redirect_service import (
+    EXPIRED_MESSAGES, LINK_EXPIRED, LINK_MISSING, MISSING_MESSAGE, REDIRECT_POLICIES, REDIRECT_TEMPORARY, client_ip, redirect_caching,
+    resolve_and_count, resolve_link, should_count
+)
 from ..models.subscription import Subscription, RazorpaySubscriptionPlan
 from ..models.plan import Plan
 from ..models.subscription_history import SubscriptionHistory
@@ -36,31 +36,9 @@ from ..models.user_deletion_history import UserDeletionHistory
  
 url_bp = Blueprint("url", __name__)
  
-def get_location_from_ip(ip: str | None) -> dict:
-    ip = ip or ""
-    try:
-        resp = requests.get(f"https://ipwho.is/{ip}", timeout=3)
-        data = resp.json()
-        if data.get("success"):
-            return {
-                "country": data.get("country", "Unknown"),
- 
-                "region": data.get("region", "Unknown"),
- 
-                "city": data.get("city", "Unknown"),
-            }
-    except Exception:
-        pass
- 
-    return {"country": "Unknown", "region": "Unknown", "city": "Unknown"}
- 
 def _shorten_url() -> str:
-    chars = string.ascii_letters + string.digits
-    while True:
-        rand_chars = ''.join(random.choices(chars, k=7))
-        short_url = Urls.query.filter_by(short=rand_chars).first()
-        if not short_url:
-            return rand_chars
+    # Unique by construction (block-allocated sequence + keyed permutation): no lookup per create
+    return short_codes.allocate()
  
  
  
@@ -152,6 +130,8 @@ def create(current_user):
     if custom_short:
         if not custom_short.isalnum():
             return api_response(False, "Custom short URL must be alphanumeric.", None)
+        if short_codes.is_generated(custom_short):
+            return api_response(False, "This custom short URL is reserved. Please choose another.", None)
         if Urls.query.filter_by(short=custom_short).first():
             return api_response(False, "This custom short URL already exists.", None)
         short_code = custom_short
@@ -223,7 +203,8 @@ def create(current_user):
     db.session.add(current_user)
     db.session.commit()
  
-    # ❌ No Redis write here
+    # ✔ Write-through: warm the redirect cache before the first click
+    link_cache.write_through(new_url, current_user)
  
     result = {
         "title": title,
@@ -244,193 +225,39 @@ def create(current_user):
 @url_bp.route('/<short_url>')
 def redirection(short_url):
     # -------------------------------------
-    # 1) Try Redis first
-    # -------------------------------------
-    cached = None
-    long_url = None
-    url_id = None
-    url_entry = None
-   
- 
-    try:
-        if extensions.redis_client:
-            cached = extensions.redis_client.get(f"short:{short_url}")
-            print(">>> Redis GET:", cached)
-    except:
-        cached = None
- 
-    if cached:
-        # Redis HIT
-        try:
-            payload = json.loads(cached)
-            long_url = payload.get("long")
-            url_id = payload.get("id")          # using id_
-        except:
-            # If JSON failed, assume raw string
-            long_url = cached
-            url_id = None
- 
-        # -----------------------------
-        # REDIS HIT: Verify owner status (Testing: 2-hour grace period)
-        # -----------------------------
-        if url_id:
-            # We need to fetch the owner to check cancellation
-            u_entry = Urls.query.filter_by(id_=url_id).first()
-            
-            if u_entry:
-                    u_plan=u_entry.plan_name
-                    owner = User.query.get(u_entry.user_id)
-                    if owner and owner.cancellation_date and u_plan!='FREE':
-                        time_diff = datetime.datetime.utcnow() - owner.cancellation_date
-                        hours_since_cancel = time_diff.total_seconds() / 3600
-                       
-                        if hours_since_cancel > 1:
-                            # remove from redis
-                            if extensions.redis_client:
-                                extensions.redis_client.delete(f"short:{short_url}")
-                            # Block Access
-                            # api_response returns (json, 200). We need (json, 404)
-                            resp, _ = api_response(False, " Redis Cache Hit: This link is no longer active due to subscription expiry (Testing).", None)
-                            return resp, 404
- 
-    else:
-        # Redis MISS → fallback to DB
-        url_entry = Urls.query.filter_by(short=short_url).first()
-        if not url_entry:
-            resp, _ = api_response(False, "URL does not exist or is inactive", None)
-            return resp, 404
-        u_plan=url_entry.plan_name
-        # -----------------------------
-        # 60-DAY GRACE PERIOD CHECK
-        # -----------------------------
-        # Fetch the owner of the URL
-        owner = User.query.get(url_entry.user_id)
-        # if owner and owner.cancellation_date:
-        #     days_since_cancel = (datetime.datetime.utcnow() - owner.cancellation_date).days
-        #     if days_since_cancel > 60:
-        #          # GRACE PERIOD EXPIRED -> Block Access
-        #          return api_response(False, "This link is no longer active due to subscription expiry.", None), 404
- 
-        # -----------------------------
-        # TESTING: 10-HOUR GRACE PERIOD CHECK
-        # -----------------------------
-        if owner and owner.cancellation_date and u_plan!='FREE':
-            time_diff = datetime.datetime.utcnow() - owner.cancellation_date
-            hours_since_cancel = time_diff.total_seconds() / 3600
-           
-            if hours_since_cancel > 1:
-                 # GRACE PERIOD EXPIRED -> Block Access
-                 resp, _ = api_response(False, "Database Hit: This link is no longer active due to subscription expiry (Testing).", None)
-                 return resp, 404
- 
-        long_url = url_entry.long
-        url_id = url_entry.id_                 # using id_
- 
-        # Store in Redis (best effort)
-        try:
-            ttl = int(current_app.config.get("REDIS_TTL", 3600))
-            if extensions.redis_client:
-                extensions.redis_client.setex(
-                    f"short:{url_entry.short}",
-                 # f"short:{short_url}",
- 
-                    ttl,
-                    json.dumps({"long": long_url, "id": url_id})
-                )
-                print(">>> Redis SET short:" + short_url)
-        except:
-            pass
- 
-    # -------------------------------------
-    # 2) Parse User-Agent (browser/OS)
+    # 1) HEAD probes and bots are redirected without being counted or enriched
     # -------------------------------------
     user_agent_str = request.headers.get("User-Agent", "Unknown")
-    ua = parse(user_agent_str)
- 
-    browser = ua.browser.family or "Unknown"
-    browser_version = ua.browser.version_string or "Unknown"
-    os_family = ua.os.family or "Unknown"
-    os_version = ua.os.version_string or ""
-    platform = f"{os_family} {os_version}".strip()
- 
+    counted = should_count(request.method, user_agent_str)
+
     # -------------------------------------
-    # 3) Find IP & Location
+    # 2) Resolve short code (Redis first, DB fallback); counted clicks are
+    #    resolved, debounced and queued in a single Redis call when cached
     # -------------------------------------
-    xff = request.headers.get("X-Forwarded-For", '')
-    ip_address = xff.split(',')[0].strip() if xff else request.remote_addr or "0.0.0.0"
+    if counted:
+        ip_address = client_ip(request.headers, request.remote_addr)
+        source = request.args.get("source", "direct")
+        link = resolve_and_count(short_url, user_agent_str, ip_address, source)
+    else:
+        link = resolve_link(short_url)
  
-    location = get_location_from_ip(ip_address)
-    country = location.get("country")
-    region = location.get("region")
-    city = location.get("city")
+    if link.status == LINK_MISSING:
+        resp, _ = api_response(False, MISSING_MESSAGE, None)
+        return resp, 404
  
-    # -------------------------------------
-    # 4) Source tracking
-    # -------------------------------------
-    source = request.args.get("source", "direct")
+    if link.status == LINK_EXPIRED:
+        # api_response returns (json, 200). We need (json, 404)
+        resp, _ = api_response(False, EXPIRED_MESSAGES[link.source], None)
+        return resp, 404
  
     # -------------------------------------
-    # 5) Skip bot requests
+    # 3) Redirect to the long URL (302/301 and caching headers per the link's policy)
     # -------------------------------------
-    bot_keywords = [
-        "bot", "crawler", "spider", "preview", "fetch", "scan",
-        "safelinks", "teams", "outlook", "skype", "microsoft office",
-        "linkexpander", "slackbot", "discordbot", "whatsapp", "facebook",
-        "twitterbot", "google-read-aloud"
-    ]
- 
-    if any(b in user_agent_str.lower() for b in bot_keywords):
-        print(f">>> BOT skipped: {user_agent_str}")
-        return redirect(long_url, code=302)
-   
-#added these for double hits come at a time in mobile
- 
-    try:
-        if extensions.redis_client:
-            ua_hash = hash(user_agent_str)
-            debounce_key = f"click:{short_url}:{ip_address}:{ua_hash}"
- 
-            # duplicate click → don't count again
-            if extensions.redis_client.get(debounce_key):
-                return redirect(long_url, code=302)
- 
-            # block duplicates for 2 seconds
-            extensions.redis_client.setex(debounce_key, 2, "1")
-    except:
-        pass
-# end of addition(up to these lines)
- 
-    # -------------------------------------
-    # 6) Save analytics (only valid traffic)
-    # -------------------------------------
-    try:
-        if url_id is not None:
-            analytics = UrlAnalytics(
-                url_id=url_id,
-                user_agent=user_agent_str,
-                browser=browser,
-                browser_version=browser_version,
-                platform=platform,
-                os=os_family,
-                ip_address=ip_address,
-                country=country,
-                region=region,
-                city=city,
-                source=source
-            )
-            db.session.add(analytics)
-            db.session.commit()
-    except Exception as e:
-        print(">>> Analytics error:", e)
-        try:
-            db.session.rollback()
-        except:
-            pass
- 
-    # -------------------------------------
-    # 7) Redirect to the long URL
-    # -------------------------------------
-    return redirect(long_url, code=302)
+    with phase("response"):
+        code, headers = redirect_caching(link)
+        response = redirect(link.long_url, code=code)
+        response.headers.update(headers)
+    return response
  
  
  
@@ -462,10 +289,12 @@ def get_analytics(current_user, short_url):
         if not current_user.get_limit('allow_analytics'):
             return api_response(False, "Analytics not allowed on your plan. Please upgrade.", None)
  
-    clicks = UrlAnalytics.query.filter_by(url_id=url_entry.id_).order_by(UrlAnalytics.timestamp.desc()).all()
-   
-    qr_clicks = sum(1 for c in clicks if c.source == "qr")
-    direct_clicks = sum(1 for c in clicks if c.source == "direct")
+    clicks = click_partitions.select_clicks(url_entry.id_)
+
+    # Totals come from the pre-aggregated counters, not from counting rows
+    counts = click_counters.get_counts([url_entry.id_], ["total", "source:qr", "source:direct"])[url_entry.id_]
+    qr_clicks = counts["source:qr"]
+    direct_clicks = counts["source:direct"]
  
     # Filter based on Analytics Level
     analytics_level = current_user.get_limit('analytics_level') if plan else 'none'
@@ -493,16 +322,32 @@ def get_analytics(current_user, short_url):
             })
            
         click_data.append(item)
+
+    # Breakdowns aggregate the daily rollups (a few rows per day), not the raw clicks
+    breakdown = {
+        "daily": click_rollups.daily_series(url_entry.id_),
+        "sources": click_rollups.breakdown(url_entry.id_, "source"),
+        "browsers": click_rollups.breakdown(url_entry.id_, "browser"),
+    }
+    if analytics_level in ['basic', 'detailed']:
+        breakdown["countries"] = click_rollups.breakdown(url_entry.id_, "country")
+    if analytics_level == 'detailed':
+        breakdown["os"] = click_rollups.breakdown(url_entry.id_, "os")
    
     return api_response(True, "Analytics fetched", {
         "short_url": url_entry.short,
         "long_url": url_entry.long,
         "show_short": url_entry.show_short,
         "created_at": url_entry.created_at.isoformat(),
-        "total_clicks": len(clicks),
+        "total_clicks": counts["total"],
         "qr_clicks": qr_clicks,
         "direct_clicks": direct_clicks,
-        "clicks": click_data
+        "clicks": click_data,
+        "breakdown": breakdown,
+        # Cached/permanent redirects are served by the browser until they expire,
+        # so clicks count visits per cache lifetime rather than every click
+        "redirect_policy": url_entry.redirect_policy or REDIRECT_TEMPORARY,
+        "clicks_exact": (url_entry.redirect_policy or REDIRECT_TEMPORARY) == REDIRECT_TEMPORARY
     })
  
  
@@ -634,6 +479,7 @@ def my_urls(current_user):
     # TESTING: 10-HOUR GRACE PERIOD CHECK
     # -----------------------------
     free_urls = [u for u in urls if u.plan_name == "FREE"]
+    hits = {url_id: c["total"] for url_id, c in click_counters.get_counts([u.id_ for u in urls], ["total"]).items()}
 
     if current_user.cancellation_date :
          # Calculate hours since cancellation
@@ -653,7 +499,7 @@ def my_urls(current_user):
                 "created_at": u.created_at.isoformat(),
                 "qr_code": build_static_url(u.qr_code),
                 "show_short": u.show_short,
-                "hits": UrlAnalytics.query.filter_by(url_id=u.id_).count()
+                "hits": hits.get(u.id_, 0)
                 }for u in free_urls
                 ],
                 "is_frozen": True
@@ -671,7 +517,7 @@ def my_urls(current_user):
                 "created_at": u.created_at.isoformat(),
                 "qr_code": build_static_url(u.qr_code),
                 "show_short": u.show_short,
-                "hits": UrlAnalytics.query.filter_by(url_id=u.id_).count()  # ✅ ADD THIS
+                "hits": hits.get(u.id_, 0)
             }
             for u in urls
         ],
@@ -716,23 +562,20 @@ def delete_url(current_user, short_url):
                 current_app.logger.warning(f"Failed to delete QR file: {e}")
  
     # ✔ Delete analytics
-    UrlAnalytics.query.filter_by(url_id=url_entry.id_).delete()
+    click_partitions.delete_for_urls([url_entry.id_])
+    click_counters.delete_counters([url_entry.id_])
+    click_rollups.delete_rollups([url_entry.id_])
  
     # ✔ Delete URL
     db.session.delete(url_entry)
     db.session.commit()
  
-    # Remove from Redis cache (best-effort)
-    try:
-        if extensions.redis_client:
-            extensions.redis_client.delete(f"short:{short_url}")
-    except Exception:
-        pass
+    # Remove from Redis and every worker's L1 cache (best-effort)
+    link_cache.invalidate(short_url)
  
     return api_response(True, f"Short URL '{short_url}' deleted successfully.", None)
  
 import datetime
-import pytz
 from sqlalchemy import and_
  
 @url_bp.route('/totalclicks', methods=['GET'])
@@ -756,32 +599,11 @@ def dashboard_stats(current_user):
             total_clicks = 0
             clicks_today = 0
         else:
-            total_clicks = UrlAnalytics.query.filter(
-                UrlAnalytics.url_id.in_(url_ids)
-            ).count()
-
-            # -----------------------------
-            # FIX: IST TIME RANGE FOR TODAY
-            # -----------------------------
-            ist = pytz.timezone("Asia/Kolkata")
-            now_ist = datetime.datetime.now(ist)
-
-            # today's date in IST
-            today_ist = now_ist.date()
-
-            # start and end of the IST day (converted to UTC for querying DB)
-            start_ist = ist.localize(datetime.datetime(today_ist.year, today_ist.month, today_ist.day, 0, 0, 0))
-            end_ist = start_ist + datetime.timedelta(days=1)
-
-            start_utc = start_ist.astimezone(pytz.utc)
-            end_utc = end_ist.astimezone(pytz.utc)
-
-            # Query UTC timestamps using the calculated range
-            clicks_today = UrlAnalytics.query.filter(
-                UrlAnalytics.url_id.in_(url_ids),
-                UrlAnalytics.timestamp >= start_utc,
-                UrlAnalytics.timestamp < end_utc
-            ).count()
+            # O(1) per link: pre-aggregated counters (today = IST calendar day)
+            today = click_counters.day_bucket()
+            counts = click_counters.get_counts(url_ids, ["total", today]).values()
+            total_clicks = sum(c["total"] for c in counts)
+            clicks_today = sum(c[today] for c in counts)
         
         total_short_links = Urls.query.filter_by(
             user_id=current_user.id,
@@ -807,32 +629,11 @@ def dashboard_stats(current_user):
             total_short_links = 0
             total_qrs = 0
         else:
-            total_clicks = UrlAnalytics.query.filter(
-                UrlAnalytics.url_id.in_(url_ids)
-            ).count()
-
-            # -----------------------------
-            # FIX: IST TIME RANGE FOR TODAY
-            # -----------------------------
-            ist = pytz.timezone("Asia/Kolkata")
-            now_ist = datetime.datetime.now(ist)
-
-            # today's date in IST
-            today_ist = now_ist.date()
-
-            # start and end of the IST day (converted to UTC for querying DB)
-            start_ist = ist.localize(datetime.datetime(today_ist.year, today_ist.month, today_ist.day, 0, 0, 0))
-            end_ist = start_ist + datetime.timedelta(days=1)
-
-            start_utc = start_ist.astimezone(pytz.utc)
-            end_utc = end_ist.astimezone(pytz.utc)
-
-            # Query UTC timestamps using the calculated range
-            clicks_today = UrlAnalytics.query.filter(
-                UrlAnalytics.url_id.in_(url_ids),
-                UrlAnalytics.timestamp >= start_utc,
-                UrlAnalytics.timestamp < end_utc
-            ).count()
+            # O(1) per link: pre-aggregated counters (today = IST calendar day)
+            today = click_counters.day_bucket()
+            counts = click_counters.get_counts(url_ids, ["total", today]).values()
+            total_clicks = sum(c["total"] for c in counts)
+            clicks_today = sum(c[today] for c in counts)
 
         # your new fields (unchanged)
         total_short_links = Urls.query.filter_by(
@@ -911,6 +712,9 @@ def edit_short_url(current_user):
         if not new_short.isalnum():
             return api_response(False, "Short code must be alphanumeric", None)
  
+        if short_codes.is_generated(new_short):
+            return api_response(False, "Short URL is reserved. Please choose another.", None)
+ 
         if Urls.query.filter_by(short=new_short).first():
             return api_response(False, "Short URL already exists", None)
  
@@ -981,12 +785,10 @@ def edit_short_url(current_user):
        
            
        
-            # NEW ✔ Delete old key from Redis
-            try:
-                if extensions.redis_client:
-                    extensions.redis_client.delete(f"short:{old_short}")
-            except:
-                pass
+            # NEW ✔ Delete old key from Redis (and every worker's L1 cache),
+            # write the new one through
+            link_cache.invalidate(old_short)
+            link_cache.write_through(url, current_user)
  
             return api_response(True, "Short URL updated (QR regenerated)", {
                 "newShortUrl": f"{base_url}/{new_short}",
@@ -999,12 +801,10 @@ def edit_short_url(current_user):
             url.is_edited = True
             db.session.commit()
  
-            # NEW ✔ Delete old key from Redis
-            try:
-                if extensions.redis_client:
-                    extensions.redis_client.delete(f"short:{old_short}")
-            except:
-                pass
+            # NEW ✔ Delete old key from Redis (and every worker's L1 cache),
+            # write the new one through
+            link_cache.invalidate(old_short)
+            link_cache.write_through(url, current_user)
  
             return api_response(True, "Short URL updated successfully", {
                 "newShortUrl": f"{base_url}/{new_short}"
@@ -1039,9 +839,7 @@ def delete_account(current_user):
         # Calculate total clicks
         urls = Urls.query.filter_by(user_id=current_user.id).all()
         url_ids = [u.id_ for u in urls]
-        total_clicks = UrlAnalytics.query.filter(
-            UrlAnalytics.url_id.in_(url_ids)
-        ).count() if url_ids else 0
+        total_clicks = click_counters.total(url_ids)
        
         # Get IP address from request
         xff = request.headers.get("X-Forwarded-For", '')
@@ -1087,15 +885,15 @@ def delete_account(current_user):
         # ----------------------------------------------
         # 1. Collect all user's URLs
         # ----------------------------------------------
-        short_codes = [u.short for u in urls]
+        codes = [u.short for u in urls]
  
         # ----------------------------------------------
         # 2. Delete analytics records
         # ----------------------------------------------
         if url_ids:
-            UrlAnalytics.query.filter(
-                UrlAnalytics.url_id.in_(url_ids)
-            ).delete(synchronize_session=False)
+            click_partitions.delete_for_urls(url_ids)
+            click_counters.delete_counters(url_ids)
+            click_rollups.delete_rollups(url_ids)
  
         # ----------------------------------------------
         # 3. Delete QR image files
@@ -1112,12 +910,7 @@ def delete_account(current_user):
         # ----------------------------------------------
         # 4. Delete Redis keys
         # ----------------------------------------------
-        try:
-            if extensions.redis_client:
-                for s in short_codes:
-                    extensions.redis_client.delete(f"short:{s}")
-        except Exception as e:
-            current_app.logger.warning(f"Redis cleanup failed: {e}")
+        link_cache.invalidate(*codes)
  
         # ----------------------------------------------
         # 5. Delete URL records
@@ -1215,6 +1008,8 @@ def generate_qr(current_user):
     if custom_short:
         if not custom_short.isalnum():
             return api_response(False, "Custom short URL must be alphanumeric.", None)
+        if short_codes.is_generated(custom_short):
+            return api_response(False, "This custom short URL is reserved. Please choose another.", None)
         if Urls.query.filter_by(short=custom_short).first():
             return api_response(False, "This custom short URL is already taken.", None)
         short_code = custom_short
@@ -1278,7 +1073,8 @@ def generate_qr(current_user):
  
     db.session.commit()
  
-    # ❌ Do NOT write to Redis
+    # ✔ Write-through: warm the redirect cache before the first click
+    link_cache.write_through(new_url, current_user)
  
     data = {
         "title": title,
@@ -1377,6 +1173,9 @@ def enable_short_link(current_user, short_url):
         current_user.usage_links = (current_user.usage_links or 0) + 1
         db.session.add(current_user)
         db.session.commit()
+
+        # Short link is about to be shared: warm the redirect cache
+        link_cache.write_through(url_entry, current_user)
         
         return api_response(True, "Short link enabled successfully", {"short_url": short_url})
     except Exception as e:
@@ -1384,6 +1183,48 @@ def enable_short_link(current_user, short_url):
         return api_response(False, f"Failed to enable short link: {str(e)}", None)
 
 
+@url_bp.route('/redirect-policy/<short_url>', methods=['POST'])
+@token_required
+def set_redirect_policy(current_user, short_url):
+    """
+    Body: {"policy": "temporary" | "cached" | "permanent", "max_age": seconds (optional)}
+    """
+    url_entry = Urls.query.filter_by(short=short_url, user_id=current_user.id).first()
+    if not url_entry:
+        return api_response(False, "URL not found or unauthorized", None)
+
+    data = request.get_json(silent=True) or {}
+    policy = (data.get("policy") or "").strip().lower()
+    if policy not in REDIRECT_POLICIES:
+        return api_response(False, f"Policy must be one of: {', '.join(REDIRECT_POLICIES)}", None)
+
+    max_age = data.get("max_age")
+    if max_age is not None:
+        limit = current_app.config.get("LINK_PERMANENT_MAX_AGE", 365 * 86400)
+        if not isinstance(max_age, int) or isinstance(max_age, bool) or not 0 < max_age <= limit:
+            return api_response(False, f"max_age must be between 1 and {limit} seconds", None)
+
+    try:
+        url_entry.redirect_policy = policy
+        url_entry.redirect_max_age = max_age if policy != REDIRECT_TEMPORARY else None
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return api_response(False, f"Failed to update redirect policy: {str(e)}", None)
+
+    link_cache.invalidate(short_url)
+    link_cache.write_through(url_entry, current_user)
+
+    message = "Redirect policy updated"
+    if policy != REDIRECT_TEMPORARY:
+        message += ". Browsers keep the cached destination until it expires, even if the link is edited."
+    return api_response(True, message, {
+        "short_url": short_url,
+        "policy": policy,
+        "max_age": url_entry.redirect_max_age,
+    })
+
+
 @url_bp.route('/test-ip', methods=['POST'])
 def test_ip():
     """
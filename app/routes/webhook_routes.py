@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.services.webhook_service import verify_webhook_signature, process_webhook_event
+from app.utils import metrics
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 webhook_bp = Blueprint('webhook_bp', __name__)
 
@@ -19,47 +23,48 @@ def razorpay_webhook():
         signature = request.headers.get('X-Razorpay-Signature')
         
         if not signature:
-            print("ERROR: Missing X-Razorpay-Signature header")
+            logger.error("Missing X-Razorpay-Signature header")
             return jsonify({'error': 'Missing signature'}), 400
         
         # Get webhook secret from config
         webhook_secret = current_app.config.get('RAZORPAY_WEBHOOK_SECRET')
         
         if not webhook_secret:
-            print("ERROR: RAZORPAY_WEBHOOK_SECRET not configured")
+            logger.error("RAZORPAY_WEBHOOK_SECRET not configured")
             return jsonify({'error': 'Webhook not configured'}), 500
         
         # Verify signature
         if not verify_webhook_signature(payload_body, signature, webhook_secret):
-            print("ERROR: Invalid webhook signature")
+            logger.error("Invalid webhook signature")
             return jsonify({'error': 'Invalid signature'}), 401
         
         # Parse JSON payload
         try:
             event_data = json.loads(payload_body)
         except json.JSONDecodeError:
-            print("ERROR: Invalid JSON payload")
+            logger.error("Invalid JSON payload")
             return jsonify({'error': 'Invalid JSON'}), 400
         
         event_type = event_data.get('event', 'unknown')
-        print(f"DEBUG: Received webhook event: {event_type}")
+        logger.debug("Received webhook event: %s", event_type)
         
         # Process the webhook event
-        success, message = process_webhook_event(event_data, signature)
+        with metrics.timer("webhook_processing_seconds", event=event_type):
+            success, message = process_webhook_event(event_data, signature)
         
         if success:
-            print(f"DEBUG: Webhook processed successfully: {message}")
+            logger.debug("Webhook processed successfully: %s", message)
             # Always return 200 to acknowledge receipt
             return jsonify({'status': 'success', 'message': message}), 200
         else:
-            print(f"ERROR: Webhook processing failed: {message}")
+            logger.error("Webhook processing failed: %s", message)
             # Still return 200 to prevent Razorpay from retrying
             # The error is logged in the database
             return jsonify({'status': 'error', 'message': message}), 200
             
     except Exception as e:
         error_msg = f"Webhook handler error: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         # Return 200 to prevent retries, error is logged
         return jsonify({'status': 'error', 'message': error_msg}), 200
 
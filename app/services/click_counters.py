@@ -0,0 +1,363 @@
+"""
+Pre-aggregated click counters.
+
+Every counted click bumps a Redis hash of deltas, ``clicks:{url_id}``, with
+``total``, ``source:{source}`` (``qr`` or ``direct``), ``day:{YYYY-MM-DD}`` and
+``hour:{YYYY-MM-DDTHH}`` (IST) fields, and adds the link to the ``clicks:dirty`` set. The country is
+only known once a click has been enriched, so ``country:{name}`` is bumped by
+the click writer after the row is stored.
+
+A background flusher moves the deltas into ``url_click_counters`` every
+``CLICK_COUNTER_FLUSH_INTERVAL`` seconds. ``get_counts`` adds the persisted
+value and any pending delta, so reads cost one query and one pipeline no
+matter how many clicks a link has.
+
+Without Redis there is nowhere to keep deltas: the click writer then adds
+every field with ``count_rows``, in the transaction that stores the clicks.
+"""
+import atexit
+import datetime
+import logging
+import os
+import threading
+
+import pytz
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .. import extensions
+from ..extensions import db
+from ..models.url_click_counter import ClickCounterBackfill, UrlClickCounter
+
+logger = logging.getLogger(__name__)
+
+IST = pytz.timezone("Asia/Kolkata")
+DIRTY_SET = "clicks:dirty"
+CLICK_SOURCES = ("qr", "direct")
+_FLUSH_BATCH = 500
+_IN_CHUNK = 1000  # stay well below MSSQL's 2100-parameter limit
+
+_app = None
+_flusher = None
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def init_click_counters(app):
+    """Remember the app for the flusher thread; it starts on the first counted click."""
+    global _app
+    _app = app
+    atexit.register(shutdown)
+
+
+def counter_key(url_id) -> str:
+    return f"clicks:{url_id}"
+
+
+def day_bucket(ts: datetime.datetime | None = None) -> str:
+    """``day:`` field for a naive UTC timestamp (default: now), in IST."""
+    ts = ts or datetime.datetime.utcnow()
+    return "day:" + pytz.utc.localize(ts).astimezone(IST).strftime("%Y-%m-%d")
+
+
+def hour_bucket(ts: datetime.datetime | None = None) -> str:
+    ts = ts or datetime.datetime.utcnow()
+    return "hour:" + pytz.utc.localize(ts).astimezone(IST).strftime("%Y-%m-%dT%H")
+
+
+def normalize_source(source: str | None) -> str:
+    """``?source=`` is user input: anything but the sources we hand out counts as direct."""
+    return source if source in CLICK_SOURCES else "direct"
+
+
+def click_fields(source: str, ts: datetime.datetime | None = None) -> list:
+    """Hash fields bumped for one counted click (unknown sources count as direct)."""
+    ts = ts or datetime.datetime.utcnow()
+    return ["total", f"source:{normalize_source(source)}", day_bucket(ts), hour_bucket(ts)]
+
+
+def country_field(country: str | None) -> str:
+    return f"country:{(country or 'Unknown')[:100]}"
+
+
+def bump(url_id, fields: list, pipe=None):
+    """Queue HINCRBYs for ``fields`` (on ``pipe`` if given, else sent straight away)."""
+    client = extensions.redis_client
+    if not client:
+        return
+    own_pipe = pipe is None
+    try:
+        if own_pipe:
+            pipe = client.pipeline(transaction=False)
+        for field in fields:
+            pipe.hincrby(counter_key(url_id), field, 1)
+        pipe.sadd(DIRTY_SET, url_id)
+        if own_pipe:
+            pipe.execute()
+            ensure_flusher()
+    except Exception as exc:
+        logger.warning("Click counter update failed for url %s: %s", url_id, exc)
+
+
+def bump_countries(rows: list):
+    """Count stored click rows per country (called by the click writer)."""
+    client = extensions.redis_client
+    if not client or not rows:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for row in rows:
+            bump(row["url_id"], [country_field(row.get("country"))], pipe=pipe)
+        pipe.execute()
+        ensure_flusher()
+    except Exception as exc:
+        logger.warning("Country counter update failed: %s", exc)
+
+
+def _tally(totals: dict, url_id, source, ts, country):
+    link = totals.setdefault(url_id, {})
+    for field in click_fields(source, ts) + [country_field(country)]:
+        link[field] = link.get(field, 0) + 1
+
+
+def _add_totals(totals: dict):
+    for url_id, fields in totals.items():
+        for bucket, delta in fields.items():
+            _add(url_id, bucket, delta)
+
+
+def count_rows(rows: list):
+    """Add stored click rows straight to ``url_click_counters`` (caller commits)."""
+    totals = {}
+    for row in rows:
+        _tally(totals, row["url_id"], row.get("source"), row["timestamp"], row.get("country"))
+    _add_totals(totals)
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def get_counts(url_ids, fields) -> dict:
+    """
+    Current counts for ``fields`` of every link in ``url_ids``.
+
+    Returns:
+        dict: ``{url_id: {field: count}}`` (missing counters are 0)
+    """
+    url_ids = [i for i in dict.fromkeys(url_ids) if i is not None]
+    fields = list(fields)
+    counts = {url_id: dict.fromkeys(fields, 0) for url_id in url_ids}
+    if not url_ids or not fields:
+        return counts
+
+    for start in range(0, len(url_ids), _IN_CHUNK):
+        chunk = url_ids[start:start + _IN_CHUNK]
+        rows = db.session.execute(
+            select(UrlClickCounter.url_id, UrlClickCounter.bucket, UrlClickCounter.count)
+            .where(UrlClickCounter.url_id.in_(chunk), UrlClickCounter.bucket.in_(fields))
+        )
+        for url_id, bucket, count in rows:
+            counts[url_id][bucket] += count
+
+    client = extensions.redis_client
+    if client:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for url_id in url_ids:
+                pipe.hmget(counter_key(url_id), fields)
+            for url_id, pending in zip(url_ids, pipe.execute()):
+                for field, value in zip(fields, pending):
+                    if value:
+                        counts[url_id][field] += int(value)
+        except Exception as exc:
+            logger.warning("Pending click counters unavailable: %s", exc)
+    return counts
+
+
+def total(url_ids, field: str = "total") -> int:
+    """Sum of one counter over several links (e.g. a user's dashboard)."""
+    return sum(c[field] for c in get_counts(url_ids, [field]).values())
+
+
+# -----------------------------
+# Flushing to the DB
+# -----------------------------
+def increment(table, key: dict, delta: int):
+    """Add ``delta`` to ``table.count`` for the row matching ``key``, creating it if needed."""
+    match = and_(*[table.c[name] == value for name, value in key.items()])
+    if db.session.execute(update(table).where(match).values(count=table.c.count + delta)).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**key, count=delta))
+    except IntegrityError:
+        # Created by another worker in the meantime (or the link is gone: nothing to update)
+        db.session.execute(update(table).where(match).values(count=table.c.count + delta))
+
+
+def _add(url_id: int, bucket: str, delta: int):
+    increment(UrlClickCounter.__table__, {"url_id": url_id, "bucket": bucket}, delta)
+
+
+def flush() -> int:
+    """Move pending Redis deltas into ``url_click_counters``. Returns the links flushed."""
+    client = extensions.redis_client
+    if not client:
+        return 0
+
+    flushed = 0
+    while True:
+        url_ids = client.spop(DIRTY_SET, _FLUSH_BATCH)
+        if not url_ids:
+            return flushed
+
+        # Read and clear each hash atomically, so clicks landing meanwhile go to the next flush
+        pipe = client.pipeline(transaction=True)
+        for url_id in url_ids:
+            pipe.hgetall(counter_key(url_id))
+            pipe.delete(counter_key(url_id))
+        results = pipe.execute()
+        deltas = {int(url_id): results[i * 2] for i, url_id in enumerate(url_ids)}
+
+        try:
+            for url_id, fields in deltas.items():
+                for bucket, delta in fields.items():
+                    _add(url_id, bucket, int(delta))
+            db.session.commit()
+        except Exception as exc:
+            logger.warning("Click counter flush failed (%d links): %s", len(deltas), exc)
+            db.session.rollback()
+            _restore(client, deltas)
+            return flushed
+        flushed += len(deltas)
+        if len(url_ids) < _FLUSH_BATCH:
+            return flushed
+
+
+def _restore(client, deltas: dict):
+    """Put deltas back after a failed DB write so no click is lost."""
+    try:
+        pipe = client.pipeline(transaction=False)
+        for url_id, fields in deltas.items():
+            for bucket, delta in fields.items():
+                pipe.hincrby(counter_key(url_id), bucket, int(delta))
+            pipe.sadd(DIRTY_SET, url_id)
+        pipe.execute()
+    except Exception as exc:
+        logger.error("Could not restore click counter deltas: %s", exc)
+
+
+def delete_counters(url_ids):
+    """Drop persisted and pending counters of deleted links (caller commits)."""
+    url_ids = [i for i in url_ids if i is not None]
+    if not url_ids:
+        return
+    for start in range(0, len(url_ids), _IN_CHUNK):
+        chunk = url_ids[start:start + _IN_CHUNK]
+        db.session.execute(delete(UrlClickCounter).where(UrlClickCounter.url_id.in_(chunk)))
+    try:
+        if extensions.redis_client:
+            pipe = extensions.redis_client.pipeline(transaction=False)
+            pipe.delete(*[counter_key(i) for i in url_ids])
+            pipe.srem(DIRTY_SET, *url_ids)
+            pipe.execute()
+    except Exception as exc:
+        logger.warning("Redis counter cleanup failed: %s", exc)
+
+
+def shutdown():
+    _stop.set()
+    if _app is not None:
+        try:
+            with _app.app_context():
+                flush()
+        except Exception:
+            pass
+
+
+# -----------------------------
+# Flusher thread
+# -----------------------------
+def ensure_flusher():
+    """Start this worker's flusher thread if it is not running."""
+    global _flusher, _flusher_pid
+    pid = os.getpid()
+    if _app is None or (_flusher is not None and _flusher_pid == pid and _flusher.is_alive()):
+        return
+    with _flusher_lock:
+        if _flusher is not None and _flusher_pid == pid and _flusher.is_alive():
+            return
+        _stop.clear()
+        _flusher = threading.Thread(target=_run_flusher, name="click-counter-flusher", daemon=True)
+        _flusher_pid = pid
+        _flusher.start()
+
+
+def _run_flusher():
+    interval = float(_app.config.get("CLICK_COUNTER_FLUSH_INTERVAL", 10))
+    while not _stop.wait(interval):
+        try:
+            with _app.app_context():
+                flush()
+        except Exception as exc:  # never let the flusher die
+            logger.exception("Click counter flusher error: %s", exc)
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def _lock_backfill() -> datetime.datetime | None:
+    """Lock the backfill watermark row for the rest of the transaction; returns ``counted_until``."""
+    table = ClickCounterBackfill.__table__
+    match = table.c.name == UrlClickCounter.__tablename__
+    # A no-op UPDATE takes the row lock
+    if not db.session.execute(update(table).where(match).values(counted_until=table.c.counted_until)).rowcount:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(name=UrlClickCounter.__tablename__, counted_until=None))
+        except IntegrityError:
+            pass
+        db.session.execute(update(table).where(match).values(counted_until=table.c.counted_until))
+    return db.session.execute(select(table.c.counted_until).where(match)).scalar()
+
+
+def backfill(until: datetime.datetime, batch_size: int = 10000) -> dict:
+    """
+    Add counters for stored clicks older than ``until`` (naive UTC), i.e.
+    from before counting at click time was deployed.
+
+    The watermark in ``url_click_counter_backfill`` moves to ``until`` in the
+    same transaction, so a rerun only counts clicks no earlier run counted
+    (none, for the same ``until``).
+    """
+    from .click_partitions import read_tables
+
+    try:
+        since = _lock_backfill()
+        if since is not None and since >= until:
+            db.session.commit()
+            return {"rows": 0, "links": 0}
+
+        totals = {}
+        scanned = 0
+        for clicks in read_tables(since=since, until=until):
+            query = select(clicks.c.url_id, clicks.c.source, clicks.c.timestamp, clicks.c.country).where(
+                clicks.c.timestamp < until
+            )
+            if since is not None:
+                query = query.where(clicks.c.timestamp >= since)
+            for url_id, source, ts, country in db.session.execute(query.execution_options(yield_per=batch_size)):
+                scanned += 1
+                _tally(totals, url_id, source, ts, country)
+
+        _add_totals(totals)
+        table = ClickCounterBackfill.__table__
+        db.session.execute(
+            update(table).where(table.c.name == UrlClickCounter.__tablename__).values(counted_until=until)
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"rows": scanned, "links": len(totals)}
@@ -0,0 +1,350 @@
+"""
+Time-partitioned click storage.
+
+New clicks are stored by calendar month (UTC) of their timestamp:
+
+- PostgreSQL: ``url_analytics_parts`` is natively partitioned by range on
+  ``timestamp``, with one ``url_analytics_pYYYYMM`` partition per month.
+  Reads go through the parent and are pruned by the time bounds.
+- Everything else (MSSQL, SQLite): each month is its own table
+  ``url_analytics_pYYYYMM`` with the ``url_analytics`` columns.
+
+``url_analytics`` itself keeps the clicks recorded before partitioning and is
+read alongside the partitions. ``read_tables`` tells callers which tables hold
+clicks for a time range; ``select_clicks`` and ``delete_for_urls`` are the
+query layer used by the routes.
+
+``apply_retention`` exports months older than ``CLICK_RETENTION_MONTHS`` to
+``<CLICK_ARCHIVE_DIR>/<table>.ndjson.gz`` and drops them, once the rollup
+compactor has folded them in.
+"""
+import datetime
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, delete, func, inspect, insert,
+    select, text, union_all,
+)
+
+from ..extensions import db
+from ..models.url_analytics import UrlAnalytics
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "url_analytics_p"
+PG_PARENT = "url_analytics_parts"
+LEGACY = UrlAnalytics.__table__
+CLICK_COLUMNS = (
+    "id", "url_id", "user_agent", "browser", "browser_version", "platform", "os",
+    "ip_address", "country", "region", "city", "timestamp", "source",
+)
+
+_metadata = MetaData()
+_tables = {}
+_known = None
+_known_at = 0.0
+_lock = threading.Lock()
+_KNOWN_TTL = 60
+
+
+def month_start(ts: datetime.datetime) -> datetime.date:
+    return datetime.date(ts.year, ts.month, 1)
+
+
+def next_month(month: datetime.date) -> datetime.date:
+    return datetime.date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{PREFIX}{month:%Y%m}"
+
+
+def partition_month(name: str) -> datetime.date | None:
+    suffix = name[len(PREFIX):]
+    if not name.startswith(PREFIX) or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return datetime.date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def _is_postgres() -> bool:
+    return db.engine.dialect.name == "postgresql"
+
+
+def _columns(pg: bool) -> list:
+    # Same columns as url_analytics, minus the FK: partitions are dropped/archived on their own
+    return [
+        Column("id", BigInteger if pg else Integer, primary_key=True, autoincrement=True),
+        Column("url_id", Integer, nullable=False),
+        Column("user_agent", String(300)),
+        Column("browser", String(100)),
+        Column("browser_version", String(50)),
+        Column("platform", String(100)),
+        Column("os", String(50)),
+        Column("ip_address", String(50)),
+        Column("country", String(100)),
+        Column("region", String(100)),
+        Column("city", String(100)),
+        Column("timestamp", DateTime, nullable=False, primary_key=pg),
+        Column("source", String(20), default="direct"),
+    ]
+
+
+def _table(name: str) -> Table:
+    """Table object for a partition (or the PG parent); no DDL is issued."""
+    table = _tables.get(name)
+    if table is None:
+        table = Table(name, _metadata, *_columns(pg=name == PG_PARENT))
+        if name != PG_PARENT:
+            Index(f"ix_{name}_url_id_timestamp", table.c.url_id, table.c.timestamp)
+        _tables[name] = table
+    return table
+
+
+def _existing() -> set:
+    """Names of partition tables in the database (cached for a minute)."""
+    global _known, _known_at
+    now = time.monotonic()
+    with _lock:
+        if _known is None or now - _known_at > _KNOWN_TTL:
+            _known = {n for n in inspect(db.engine).get_table_names() if n.startswith(PREFIX) or n == PG_PARENT}
+            _known_at = now
+        return set(_known)
+
+
+def _forget():
+    global _known
+    with _lock:
+        _known = None
+
+
+# -----------------------------
+# DDL
+# -----------------------------
+def _ensure_pg_parent():
+    if PG_PARENT in _existing():
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {PG_PARENT} ('
+            ' id BIGINT GENERATED BY DEFAULT AS IDENTITY, url_id INTEGER NOT NULL,'
+            ' user_agent VARCHAR(300), browser VARCHAR(100), browser_version VARCHAR(50),'
+            ' platform VARCHAR(100), os VARCHAR(50), ip_address VARCHAR(50), country VARCHAR(100),'
+            ' region VARCHAR(100), city VARCHAR(100), "timestamp" TIMESTAMP NOT NULL,'
+            " source VARCHAR(20) DEFAULT 'direct', PRIMARY KEY (id, \"timestamp\")"
+            ') PARTITION BY RANGE ("timestamp")'
+        ))
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{PG_PARENT}_url_id_timestamp ON {PG_PARENT} (url_id, "timestamp")'
+        ))
+    _forget()
+
+
+def ensure_partition(month: datetime.date) -> str:
+    """Create the partition for ``month`` if it does not exist yet; returns its name."""
+    name = partition_name(month)
+    if name in _existing():
+        return name
+    if _is_postgres():
+        _ensure_pg_parent()
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PG_PARENT} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            ))
+    else:
+        try:
+            _table(name).create(db.engine, checkfirst=True)
+        except Exception:
+            # Another worker created it between the check and the CREATE
+            _forget()
+            if name not in _existing():
+                raise
+    _forget()
+    logger.info("Created click partition %s", name)
+    return name
+
+
+def _insert_target(month: datetime.date) -> Table:
+    name = ensure_partition(month)
+    return _table(PG_PARENT if _is_postgres() else name)
+
+
+# -----------------------------
+# Writes
+# -----------------------------
+def insert_rows(rows: list):
+    """Insert click rows into their month's partition (caller commits)."""
+    by_month = {}
+    for row in rows:
+        row.setdefault("timestamp", datetime.datetime.utcnow())
+        row.setdefault("source", "direct")
+        by_month.setdefault(month_start(row["timestamp"]), []).append(row)
+    # DDL first: it runs on its own connection, outside the session's transaction
+    targets = {month: _insert_target(month) for month in by_month}
+    for month, month_rows in by_month.items():
+        db.session.execute(insert(targets[month]), month_rows)
+
+
+def delete_for_urls(url_ids):
+    """Delete every stored click of ``url_ids`` (caller commits)."""
+    url_ids = [i for i in url_ids if i is not None]
+    for table in read_tables():
+        for start in range(0, len(url_ids), 1000):
+            chunk = url_ids[start:start + 1000]
+            db.session.execute(delete(table).where(table.c.url_id.in_(chunk)))
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def partition_tables() -> list:
+    """Month partitions as (month, Table), oldest first."""
+    months = sorted(
+        (month, name) for name in _existing() if (month := partition_month(name)) is not None
+    )
+    return [(month, _table(name)) for month, name in months]
+
+
+def read_tables(since: datetime.datetime | None = None, until: datetime.datetime | None = None) -> list:
+    """
+    Tables that can hold clicks with ``since <= timestamp < until``: the
+    legacy table, then the PG parent or the overlapping month tables.
+    """
+    tables = [LEGACY]
+    if _is_postgres():
+        if PG_PARENT in _existing():
+            tables.append(_table(PG_PARENT))
+        return tables
+    for month, table in partition_tables():
+        if since is not None and next_month(month) <= since.date():
+            continue
+        if until is not None and month > until.date():
+            continue
+        tables.append(table)
+    return tables
+
+
+def select_clicks(url_id: int, since=None, until=None, limit: int | None = None) -> list:
+    """Clicks of one link across partitions, newest first (rows support attribute access)."""
+    parts = []
+    for table in read_tables(since, until):
+        query = select(*[table.c[name] for name in CLICK_COLUMNS]).where(table.c.url_id == url_id)
+        if since is not None:
+            query = query.where(table.c.timestamp >= since)
+        if until is not None:
+            query = query.where(table.c.timestamp < until)
+        parts.append(query)
+    combined = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+    query = select(combined).order_by(combined.c.timestamp.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return db.session.execute(query).all()
+
+
+# -----------------------------
+# Retention
+# -----------------------------
+def _archive_dir() -> str:
+    path = current_app.config.get("CLICK_ARCHIVE_DIR") or os.path.join(current_app.instance_path, "click-archive")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _export(table: Table, path: str, where=None, batch_size: int = 10000) -> int:
+    """Stream ``table`` rows to gzip-compressed NDJSON (atomic rename). Returns rows written."""
+    query = select(*[table.c[name] for name in CLICK_COLUMNS]).order_by(table.c.id)
+    if where is not None:
+        query = query.where(where)
+    tmp_path = path + ".tmp"
+    written = 0
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+        for row in db.session.execute(query.execution_options(yield_per=batch_size)):
+            record = dict(row._mapping)
+            record["timestamp"] = record["timestamp"].isoformat() if record["timestamp"] else None
+            fh.write(json.dumps(record, separators=(",", ":")) + "\n")
+            written += 1
+    os.replace(tmp_path, path)
+    return written
+
+
+def _folded(table: Table) -> bool:
+    """True once the rollup compactor has folded every row of ``table``."""
+    from .click_rollups import is_folded
+    # PG partitions share the parent's id sequence and watermark
+    return is_folded(PG_PARENT if _is_postgres() else table.name, table)
+
+
+def _drop(table: Table):
+    with db.engine.begin() as conn:
+        if _is_postgres():
+            conn.execute(text(f"ALTER TABLE {PG_PARENT} DETACH PARTITION {table.name}"))
+        conn.execute(text(f"DROP TABLE {table.name}"))
+    if not _is_postgres():
+        from .click_rollups import forget_watermark
+        forget_watermark(table.name)
+    _tables.pop(table.name, None)
+    _metadata.remove(table)
+    _forget()
+
+
+def _delete_batched(table: Table, where, batch_size: int = 5000):
+    """Delete in small batches so one retention run does not lock the table for long."""
+    while True:
+        ids = db.session.execute(select(table.c.id).where(where).limit(batch_size)).scalars().all()
+        if not ids:
+            return
+        db.session.execute(delete(table).where(table.c.id.in_(ids)))
+        db.session.commit()
+
+
+def apply_retention(months: int | None = None) -> list:
+    """
+    Archive and drop partitions older than ``months`` full months.
+
+    Legacy ``url_analytics`` rows older than the cutoff are archived and
+    deleted the same way. Partitions the compactor has not finished are
+    skipped. Returns the archives written.
+    """
+    months = months if months is not None else int(current_app.config.get("CLICK_RETENTION_MONTHS") or 0)
+    if months <= 0:
+        return []
+
+    cutoff = month_start(datetime.datetime.utcnow())
+    for _ in range(months):
+        cutoff = datetime.date(cutoff.year - (cutoff.month == 1), (cutoff.month - 2) % 12 + 1, 1)
+
+    archives = []
+    directory = _archive_dir()
+    for month, table in partition_tables():
+        if month >= cutoff:
+            break
+        if not _folded(table):
+            logger.warning("Skipping retention of %s: rollups not folded yet", table.name)
+            continue
+        path = os.path.join(directory, f"{table.name}.ndjson.gz")
+        rows = _export(table, path)
+        _drop(table)
+        archives.append({"table": table.name, "path": path, "rows": rows})
+        logger.info("Archived %d clicks from %s to %s", rows, table.name, path)
+
+    legacy_cutoff = datetime.datetime.combine(cutoff, datetime.time())
+    has_old = db.session.execute(
+        select(func.count()).select_from(LEGACY).where(LEGACY.c.timestamp < legacy_cutoff)
+    ).scalar()
+    if has_old and is_legacy_folded():
+        path = os.path.join(directory, f"{LEGACY.name}_before_{cutoff:%Y%m}.ndjson.gz")
+        rows = _export(LEGACY, path, where=LEGACY.c.timestamp < legacy_cutoff)
+        _delete_batched(LEGACY, LEGACY.c.timestamp < legacy_cutoff)
+        archives.append({"table": LEGACY.name, "path": path, "rows": rows})
+    return archives
+
+
+def is_legacy_folded() -> bool:
+    from .click_rollups import is_folded
+    return is_folded(LEGACY.name, LEGACY)
@@ -0,0 +1,368 @@
+"""
+Asynchronous click-event pipeline.
+
+Redirects hand their analytics row to ``enqueue_click`` and return straight
+away. A background writer drains the bounded in-process queue in batches and
+bulk-inserts them into the month's click partition (see ``click_partitions``).
+
+If the in-process queue is full, or a batch cannot be written, events are
+appended to a Redis stream instead. The writer of every worker also consumes
+that stream (through a consumer group), so clicks survive a spike or a DB
+outage without ever blocking a redirect.
+
+A batch the DB rejects while it is reachable is retried row by row; rows
+that still fail go to the ``CLICK_DEAD_LETTER_KEY`` stream, so one bad
+event never holds the rest of its batch back.
+
+Redirects hand over raw events (User-Agent string and IP only); counted
+redirects served from the Redis cache append theirs to the stream directly
+(see ``redirect_service.resolve_and_count``). The writer fills in the parsed
+User-Agent and geo columns with ``enrich_click`` before storing, so neither
+lookup runs on the request path.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+
+from sqlalchemy import text
+
+from .. import extensions
+from ..extensions import db
+from ..utils import metrics
+from ..utils.timing import phase
+from ..utils.user_agent import parse_user_agent
+from .click_counters import bump_countries, count_rows
+from .click_partitions import insert_rows
+from .click_rollups import ensure_compactor
+from .geoip import get_location_from_ip
+
+logger = logging.getLogger(__name__)
+
+STREAM_GROUP = "click-writers"
+
+_app = None
+_queue = None
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_stop = threading.Event()
+_group_ready = False
+
+
+def init_click_queue(app):
+    """Create the bounded click queue; the writer thread starts lazily."""
+    global _app, _queue
+    _app = app
+    _queue = queue.Queue(maxsize=int(app.config.get("CLICK_QUEUE_MAXSIZE", 10000)))
+    metrics.register_collector(_collect_metrics)
+    atexit.register(shutdown)
+
+
+def enqueue_click(event: dict) -> bool:
+    """
+    Hand a click event over to the background writer.
+
+    Args:
+        event: Column values for a ``UrlAnalytics`` row
+
+    Returns:
+        bool: True if the event was queued or streamed, False if it was dropped
+    """
+    event.setdefault("timestamp", datetime.datetime.utcnow())
+
+    if _queue is None:
+        # Not initialised (scripts, shell) -> write inline
+        return not _store([event])
+
+    ensure_writer()
+    try:
+        _queue.put_nowait(event)
+        return True
+    except queue.Full:
+        pass
+
+    if _push_to_stream([event]):
+        return True
+
+    logger.warning("Click queue full and Redis unavailable; dropped click for url %s", event.get("url_id"))
+    return False
+
+
+def enrich_click(event: dict) -> dict:
+    """Fill in the parsed User-Agent and geo columns of a raw click event."""
+    with phase("ua"):
+        ua = parse_user_agent(event.get("user_agent") or "")
+    with phase("geo"):
+        location = get_location_from_ip(event.get("ip_address"))
+    event.update({
+        "browser": ua.browser,
+        "browser_version": ua.browser_version,
+        "platform": ua.platform,
+        "os": ua.os,
+        "country": location.get("country"),
+        "region": location.get("region"),
+        "city": location.get("city"),
+    })
+    return event
+
+
+def _enrich(rows: list):
+    for row in rows:
+        if "browser" in row:
+            continue
+        try:
+            enrich_click(row)
+        except Exception as exc:
+            logger.warning("Click enrichment failed for url %s: %s", row.get("url_id"), exc)
+            for column in ("browser", "browser_version", "platform", "os", "country", "region", "city"):
+                row.setdefault(column, None)
+
+
+def queue_depth() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+
+def _collect_metrics():
+    metrics.set_gauge("click_queue_depth", queue_depth())
+
+
+def flush():
+    """Synchronously write everything currently sitting in the in-process queue."""
+    if _queue is None or _app is None:
+        return
+    batch = _drain_queue(block=False)
+    if batch:
+        with _app.app_context():
+            pending = _store(batch)
+            if pending:
+                _push_to_stream(pending)
+
+
+def shutdown():
+    _stop.set()
+    writer = _writer
+    if writer is not None and writer.is_alive() and _writer_pid == os.getpid():
+        writer.join(timeout=5)
+    flush()
+
+
+# -----------------------------
+# Writer thread
+# -----------------------------
+def ensure_writer():
+    """Start this worker's writer thread (and the rollup compactor) if it is not running."""
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _app is None or (_writer is not None and _writer_pid == pid and _writer.is_alive()):
+        return
+    with _writer_lock:
+        if _writer is not None and _writer_pid == pid and _writer.is_alive():
+            return
+        # Forked worker (or dead thread): start a fresh writer for this process
+        _stop.clear()
+        _writer = threading.Thread(target=_run_writer, name="click-writer", daemon=True)
+        _writer_pid = pid
+        _writer.start()
+    # The rollup compactor folds what the writer stores
+    ensure_compactor()
+
+
+def _run_writer():
+    backlog = False
+    while not _stop.is_set():
+        try:
+            # Don't sit on the queue while the stream still has full batches waiting
+            batch = _drain_queue(block=not backlog)
+            with _app.app_context():
+                pending = _store(batch) if batch else []
+                if pending:
+                    _push_to_stream(pending)
+                backlog = _drain_stream() >= int(_app.config.get("CLICK_BATCH_SIZE", 500))
+        except Exception as exc:  # never let the writer die
+            backlog = False
+            logger.exception("Click writer error: %s", exc)
+
+
+def _drain_queue(block: bool) -> list:
+    batch_size = int(_app.config.get("CLICK_BATCH_SIZE", 500))
+    interval = float(_app.config.get("CLICK_FLUSH_INTERVAL", 1.0))
+
+    batch = []
+    if block:
+        try:
+            batch.append(_queue.get(timeout=interval))
+        except queue.Empty:
+            return batch
+    while len(batch) < batch_size:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_rows(rows: list) -> bool:
+    """Bulk insert click rows. Returns False (after rollback) on failure."""
+    try:
+        insert_rows(rows)
+        if not extensions.redis_client:
+            # No Redis to hold counter deltas: count in the same transaction as the insert
+            count_rows(rows)
+        db.session.commit()
+        bump_countries(rows)
+        return True
+    except Exception as exc:
+        logger.warning("Click batch write failed (%d rows): %s", len(rows), exc)
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return False
+
+
+def _db_available() -> bool:
+    try:
+        db.session.execute(text("SELECT 1"))
+        db.session.rollback()
+        return True
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return False
+
+
+def _store(rows: list) -> list:
+    """
+    Write click rows, splitting a rejected batch row by row.
+
+    Returns:
+        list: Rows to retry later because the DB is unreachable; rows the DB
+        rejects are dead-lettered, not returned
+    """
+    _enrich(rows)
+    if _write_rows(rows):
+        return []
+    if not _db_available():
+        return rows
+    failed = rows if len(rows) == 1 else [row for row in rows if not _write_rows([row])]
+    if failed and not _db_available():
+        return failed
+    _dead_letter(failed)
+    return []
+
+
+# -----------------------------
+# Redis stream fallback
+# -----------------------------
+def _stream_key() -> str:
+    return _app.config.get("CLICK_STREAM_KEY", "clicks:stream") if _app else "clicks:stream"
+
+
+def _encode(event: dict) -> dict:
+    return {"e": json.dumps(event, default=lambda v: v.isoformat() if hasattr(v, "isoformat") else str(v))}
+
+
+def _dead_letter(events: list):
+    if not events:
+        return
+    logger.error("Dead-lettering %d click rows the database rejected", len(events))
+    client = extensions.redis_client
+    key = _app.config.get("CLICK_DEAD_LETTER_KEY", "clicks:dead") if _app else "clicks:dead"
+    try:
+        if client:
+            pipe = client.pipeline(transaction=False)
+            for event in events:
+                pipe.xadd(key, _encode(event), maxlen=100000, approximate=True)
+            pipe.execute()
+            return
+    except Exception as exc:
+        logger.warning("Click dead-letter append failed: %s", exc)
+    for event in events:
+        logger.error("Dropped click row: %s", _encode(event)["e"])
+
+
+def _decode(fields: dict) -> dict:
+    event = json.loads(fields["e"])
+    if isinstance(event.get("timestamp"), str):
+        event["timestamp"] = datetime.datetime.fromisoformat(event["timestamp"])
+    return event
+
+
+def _push_to_stream(events: list) -> bool:
+    client = extensions.redis_client
+    if not client:
+        return False
+    try:
+        maxlen = int(_app.config.get("CLICK_STREAM_MAXLEN", 1000000)) if _app else 1000000
+        pipe = client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(_stream_key(), _encode(event), maxlen=maxlen, approximate=True)
+        pipe.execute()
+        return True
+    except Exception as exc:
+        logger.warning("Click stream append failed: %s", exc)
+        return False
+
+
+def _ensure_group(client):
+    global _group_ready
+    if _group_ready:
+        return
+    try:
+        client.xgroup_create(_stream_key(), STREAM_GROUP, id="0", mkstream=True)
+    except Exception as exc:
+        # BUSYGROUP: created by another worker already
+        if "BUSYGROUP" not in str(exc):
+            raise
+    _group_ready = True
+
+
+def _drain_stream() -> int:
+    """Move pending stream entries into the DB, acknowledging only what was written."""
+    client = extensions.redis_client
+    if not client:
+        return 0
+    try:
+        _ensure_group(client)
+        consumer = f"{socket.gethostname()}-{os.getpid()}"
+        batch_size = int(_app.config.get("CLICK_BATCH_SIZE", 500))
+
+        # Reclaim entries left behind by crashed workers, then read new ones
+        entries = []
+        try:
+            idle = int(_app.config.get("CLICK_STREAM_CLAIM_IDLE_MS", 60000))
+            claimed = client.xautoclaim(_stream_key(), STREAM_GROUP, consumer, min_idle_time=idle, count=batch_size)
+            entries.extend(claimed[1])
+        except Exception:
+            pass
+        response = client.xreadgroup(STREAM_GROUP, consumer, {_stream_key(): ">"}, count=batch_size)
+        for _, stream_entries in response or []:
+            entries.extend(stream_entries)
+        if not entries:
+            return 0
+
+        rows = {}
+        for entry_id, fields in entries:
+            try:
+                if fields:
+                    rows[entry_id] = _decode(fields)
+            except Exception as exc:
+                logger.error("Undecodable click stream entry %s: %s", entry_id, exc)
+                _dead_letter([fields])
+        pending = {id(row) for row in _store(list(rows.values()))} if rows else set()
+        # Entries whose rows were not written stay pending and are reclaimed on a later pass
+        ids = [entry_id for entry_id, _ in entries if id(rows.get(entry_id)) not in pending]
+        if ids:
+            client.xack(_stream_key(), STREAM_GROUP, *ids)
+            client.xdel(_stream_key(), *ids)
+        return len(ids)
+    except Exception as exc:
+        logger.warning("Click stream drain failed: %s", exc)
+        return 0
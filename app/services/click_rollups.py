@@ -0,0 +1,279 @@
+"""
+Hourly and daily click rollups.
+
+A compactor folds new ``url_analytics`` rows into ``url_click_rollups_hourly``
+and ``url_click_rollups_daily`` (counts per link, IST bucket, source, country,
+browser and OS), so breakdowns aggregate over a few hundred rollup rows
+instead of every raw click.
+
+Progress is a high-watermark on the click id, one row per click table
+(``url_analytics`` and each partition, see ``click_partitions``) in
+``click_rollup_watermark``. Click batches from different workers may commit out of id order, so ids are
+only folded up to a horizon recorded at least ``ROLLUP_LAG`` seconds earlier.
+Every step runs with the watermark row locked, so any number of workers can
+run the compactor.
+"""
+import atexit
+import datetime
+import logging
+import os
+import threading
+
+import pytz
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models.click_rollup import ClickRollupWatermark, UrlClickRollupDaily, UrlClickRollupHourly
+from . import click_partitions
+from .click_counters import IST, increment
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "Unknown"
+DIMENSIONS = ("source", "country", "browser", "os")
+
+_app = None
+_compactor = None
+_compactor_pid = None
+_compactor_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def init_click_rollups(app):
+    """Remember the app for the compactor thread; it starts with the click writer."""
+    global _app
+    _app = app
+    atexit.register(shutdown)
+
+
+def hour_start(ts: datetime.datetime) -> datetime.datetime:
+    """Start of the IST hour containing naive UTC ``ts`` (naive IST)."""
+    local = pytz.utc.localize(ts).astimezone(IST)
+    return local.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def ist_day(ts: datetime.datetime) -> datetime.date:
+    return pytz.utc.localize(ts).astimezone(IST).date()
+
+
+def _dims(source, country, browser, os_name) -> tuple:
+    return (
+        (source or "direct")[:20],
+        (country or UNKNOWN)[:100],
+        (browser or UNKNOWN)[:100],
+        (os_name or UNKNOWN)[:50],
+    )
+
+
+# -----------------------------
+# Compaction
+# -----------------------------
+def _lock_watermark(name: str):
+    table = ClickRollupWatermark.__table__
+    match = table.c.name == name
+    # A no-op UPDATE takes the row lock for the rest of the transaction
+    if not db.session.execute(update(table).where(match).values(last_id=table.c.last_id)).rowcount:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(name=name, last_id=0, horizon_id=0))
+        except IntegrityError:
+            pass
+        db.session.execute(update(table).where(match).values(last_id=table.c.last_id))
+    return db.session.execute(select(table).where(match)).one()
+
+
+def _fold(rows) -> None:
+    hourly, daily = {}, {}
+    for _, url_id, ts, source, country, browser, os_name in rows:
+        if ts is None:
+            continue
+        dims = _dims(source, country, browser, os_name)
+        for totals, bucket in ((hourly, hour_start(ts)), (daily, ist_day(ts))):
+            key = (url_id, bucket) + dims
+            totals[key] = totals.get(key, 0) + 1
+
+    for model, totals in ((UrlClickRollupHourly, hourly), (UrlClickRollupDaily, daily)):
+        table = model.__table__
+        for (url_id, bucket, *dims), count in totals.items():
+            increment(table, dict(zip(("url_id", "bucket") + DIMENSIONS, (url_id, bucket, *dims))), count)
+
+
+def compact_step(clicks, batch_size: int = 5000, lag: float = 60) -> int:
+    """Fold at most ``batch_size`` settled rows of click table ``clicks`` in one transaction."""
+    table = ClickRollupWatermark.__table__
+    match = table.c.name == clicks.name
+    now = datetime.datetime.utcnow()
+    try:
+        watermark = _lock_watermark(clicks.name)
+
+        if watermark.horizon_id <= watermark.last_id:
+            # Caught up: note the current max id; it becomes foldable after ``lag``
+            max_id = db.session.execute(select(func.max(clicks.c.id))).scalar() or 0
+            if max_id > watermark.last_id:
+                db.session.execute(update(table).where(match).values(horizon_id=max_id, horizon_at=now))
+            db.session.commit()
+            return 0
+
+        if watermark.horizon_at is not None and (now - watermark.horizon_at).total_seconds() < lag:
+            db.session.commit()
+            return 0
+
+        rows = db.session.execute(
+            select(
+                clicks.c.id, clicks.c.url_id, clicks.c.timestamp, clicks.c.source,
+                clicks.c.country, clicks.c.browser, clicks.c.os,
+            )
+            .where(clicks.c.id > watermark.last_id, clicks.c.id <= watermark.horizon_id)
+            .order_by(clicks.c.id)
+            .limit(batch_size)
+        ).all()
+        _fold(rows)
+
+        last_id = rows[-1][0] if len(rows) == batch_size else watermark.horizon_id
+        db.session.execute(update(table).where(match).values(last_id=last_id))
+        db.session.commit()
+        return len(rows)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _config(name: str, default):
+    return _app.config.get(name, default) if _app else default
+
+
+def compact(batch_size: int | None = None, lag: float | None = None) -> int:
+    """Fold everything that is settled, in every click table. Returns rows folded."""
+    batch_size = batch_size or int(_config("ROLLUP_BATCH_SIZE", 5000))
+    lag = float(_config("ROLLUP_LAG", 60)) if lag is None else lag
+    folded = 0
+    for clicks in click_partitions.read_tables():
+        while True:
+            count = compact_step(clicks, batch_size, lag)
+            folded += count
+            if count == 0:
+                break
+    return folded
+
+
+def backfill(rebuild: bool = False, batch_size: int | None = None) -> int:
+    """
+    Fold the existing click history.
+
+    With ``rebuild`` the rollups and the watermarks are cleared first.
+    Rows newer than ``ROLLUP_LAG`` are left to the regular compactor.
+    """
+    lag = float(_config("ROLLUP_LAG", 60))
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=lag)
+    if rebuild:
+        db.session.execute(delete(UrlClickRollupHourly))
+        db.session.execute(delete(UrlClickRollupDaily))
+        db.session.execute(delete(ClickRollupWatermark))
+        db.session.commit()
+
+    table = ClickRollupWatermark.__table__
+    for clicks in click_partitions.read_tables():
+        watermark = _lock_watermark(clicks.name)
+        horizon = db.session.execute(
+            select(func.max(clicks.c.id)).where(clicks.c.timestamp < cutoff)
+        ).scalar() or 0
+        if horizon > watermark.horizon_id:
+            # History is old enough to be settled: no need to wait out the lag
+            db.session.execute(
+                update(table).where(table.c.name == clicks.name).values(horizon_id=horizon, horizon_at=None)
+            )
+        db.session.commit()
+    return compact(batch_size=batch_size, lag=lag)
+
+
+def is_folded(name: str, clicks) -> bool:
+    """True if watermark ``name`` covers every row currently in click table ``clicks``."""
+    max_id = db.session.execute(select(func.max(clicks.c.id))).scalar()
+    if max_id is None:
+        return True
+    last_id = db.session.execute(
+        select(ClickRollupWatermark.last_id).where(ClickRollupWatermark.name == name)
+    ).scalar()
+    return last_id is not None and last_id >= max_id
+
+
+def forget_watermark(name: str):
+    db.session.execute(delete(ClickRollupWatermark).where(ClickRollupWatermark.name == name))
+    db.session.commit()
+
+
+def delete_rollups(url_ids):
+    """Drop the rollups of deleted links (caller commits)."""
+    url_ids = [i for i in url_ids if i is not None]
+    for start in range(0, len(url_ids), 1000):
+        chunk = url_ids[start:start + 1000]
+        db.session.execute(delete(UrlClickRollupHourly).where(UrlClickRollupHourly.url_id.in_(chunk)))
+        db.session.execute(delete(UrlClickRollupDaily).where(UrlClickRollupDaily.url_id.in_(chunk)))
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def breakdown(url_id: int, dimension: str, since: datetime.date | None = None, limit: int = 20) -> list:
+    """Click counts of one link grouped by ``dimension``, largest first."""
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown rollup dimension: {dimension}")
+    column = getattr(UrlClickRollupDaily, dimension)
+    query = (
+        select(column, func.sum(UrlClickRollupDaily.count))
+        .where(UrlClickRollupDaily.url_id == url_id)
+        .group_by(column)
+        .order_by(func.sum(UrlClickRollupDaily.count).desc())
+        .limit(limit)
+    )
+    if since is not None:
+        query = query.where(UrlClickRollupDaily.bucket >= since)
+    return [{dimension: value, "clicks": int(count)} for value, count in db.session.execute(query)]
+
+
+def daily_series(url_id: int, days: int = 30) -> list:
+    """Clicks per IST day for the last ``days`` days (days without clicks omitted)."""
+    since = ist_day(datetime.datetime.utcnow()) - datetime.timedelta(days=days - 1)
+    query = (
+        select(UrlClickRollupDaily.bucket, func.sum(UrlClickRollupDaily.count))
+        .where(UrlClickRollupDaily.url_id == url_id, UrlClickRollupDaily.bucket >= since)
+        .group_by(UrlClickRollupDaily.bucket)
+        .order_by(UrlClickRollupDaily.bucket)
+    )
+    return [{"date": bucket.isoformat(), "clicks": int(count)} for bucket, count in db.session.execute(query)]
+
+
+# -----------------------------
+# Compactor thread
+# -----------------------------
+def shutdown():
+    _stop.set()
+    compactor = _compactor
+    if compactor is not None and compactor.is_alive() and _compactor_pid == os.getpid():
+        compactor.join(timeout=5)
+
+
+def ensure_compactor():
+    """Start this worker's compactor thread if it is not running."""
+    global _compactor, _compactor_pid
+    pid = os.getpid()
+    if _app is None or (_compactor is not None and _compactor_pid == pid and _compactor.is_alive()):
+        return
+    with _compactor_lock:
+        if _compactor is not None and _compactor_pid == pid and _compactor.is_alive():
+            return
+        _stop.clear()
+        _compactor = threading.Thread(target=_run_compactor, name="click-rollup-compactor", daemon=True)
+        _compactor_pid = pid
+        _compactor.start()
+
+
+def _run_compactor():
+    interval = float(_app.config.get("ROLLUP_INTERVAL", 60))
+    while not _stop.wait(interval):
+        try:
+            with _app.app_context():
+                compact()
+        except Exception as exc:  # never let the compactor die
+            logger.warning("Click rollup compaction failed: %s", exc)
@@ -0,0 +1,408 @@
+"""
+Local Geo-IP lookups.
+
+IP ranges are imported from CSV into a compact binary table (see
+``build_database``) that is memory-mapped by every worker and searched with a
+binary search, so a lookup costs microseconds and needs no network. The
+ipwho.is HTTP call is only used when no local table is installed and
+``GEOIP_REMOTE_FALLBACK`` is enabled (it is off by default).
+
+Results are memoised in a per-worker LRU and, for remote lookups, in a shared
+Redis hash per IP (or per /24 / /48 prefix). "Unknown" answers are cached
+with their own, shorter TTL so a failing provider is not retried per click.
+
+Table layout (little-endian header, big-endian addresses so that byte order
+equals numeric order):
+
+    header   : magic(8) v4_count(8) v6_count(8) locations_offset(8) locations_len(8)
+    v4 rows  : start(4)  end(4)  location_index(4)     sorted by start
+    v6 rows  : start(16) end(16) location_index(4)     sorted by start
+    locations: UTF-8 JSON list of [country, region, city]
+"""
+import csv
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+import requests
+
+from .. import extensions
+from ..utils.lru_cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SGEOIP1\x00"
+_HEADER = struct.Struct("<8sQQQQ")
+_ROW = {4: struct.Struct(">4s4sI"), 6: struct.Struct(">16s16sI")}
+_RELOAD_CHECK_SECONDS = 30
+
+UNKNOWN = {"country": "Unknown", "region": "Unknown", "city": "Unknown"}
+
+_db_path = None
+_remote_fallback = False
+_database = None
+_database_mtime = None
+_retired = None
+_last_check = None
+_load_lock = threading.Lock()
+
+_cache = TTLCache(maxsize=10000, ttl=3600)
+_cache_config = {
+    "key_mode": "ip",
+    "ttl": 3600,
+    "redis_ttl": 7 * 86400,
+    "negative_ttl": 300,
+}
+_stats = {"lookups": 0, "l1_hits": 0, "l2_hits": 0, "misses": 0, "negative_hits": 0, "redis_errors": 0}
+_stats_lock = threading.Lock()
+
+
+class GeoIPDatabase:
+    """Read-only view over a table written by ``build_database``."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, v4_count, v6_count, loc_offset, loc_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a Geo-IP table")
+
+        v4_offset = _HEADER.size
+        v6_offset = v4_offset + v4_count * _ROW[4].size
+        self._tables = {
+            4: (v4_offset, v4_count),
+            6: (v6_offset, v6_count),
+        }
+        self._locations = [
+            {"country": c, "region": r, "city": ct}
+            for c, r, ct in json.loads(self._mm[loc_offset:loc_offset + loc_len].decode("utf-8"))
+        ]
+
+    def __len__(self):
+        return self._tables[4][1] + self._tables[6][1]
+
+    def lookup(self, ip: str) -> dict | None:
+        """Return a location dict for ``ip``, or None if no range covers it."""
+        try:
+            addr = _normalise(ipaddress.ip_address(ip.strip()))
+        except ValueError:
+            return None
+
+        row = _ROW[addr.version]
+        offset, count = self._tables[addr.version]
+        key = addr.packed
+        width = len(key)
+
+        # Last row whose start <= key
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = offset + mid * row.size
+            if self._mm[pos:pos + width] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+
+        _, end, loc_index = row.unpack_from(self._mm, offset + (lo - 1) * row.size)
+        if key > end:
+            return None
+        return dict(self._locations[loc_index])
+
+    def close(self):
+        self._mm.close()
+
+
+def _normalise(addr):
+    # IPv4-mapped IPv6 (::ffff:a.b.c.d) lives in the IPv4 table
+    if addr.version == 6 and addr.ipv4_mapped:
+        return addr.ipv4_mapped
+    return addr
+
+
+def _parse_address(value: str):
+    value = value.strip()
+    if value.isdigit():
+        return _normalise(ipaddress.ip_address(int(value)))
+    return _normalise(ipaddress.ip_address(value))
+
+
+def _clean(value) -> str:
+    value = (value or "").strip()
+    return value if value and value != "-" else "Unknown"
+
+
+def _parse_row(fields: list):
+    """
+    Accepts the common range CSV layouts:
+
+        network, country[, region[, city]]                    (CIDR)
+        start, end, country[, region[, city]]
+        start, end, country_code, country, region, city       (IP2Location style)
+
+    Addresses may be dotted/colon notation or decimal integers.
+    """
+    fields = [f.strip() for f in fields]
+    if "/" in fields[0]:
+        network = ipaddress.ip_network(fields[0], strict=False)
+        start, end = _normalise(network[0]), _normalise(network[-1])
+        rest = fields[1:]
+    else:
+        start, end = _parse_address(fields[0]), _parse_address(fields[1])
+        rest = fields[2:]
+
+    if len(rest) >= 4:
+        rest = rest[1:]  # drop the country code column
+    rest = (rest + ["", "", ""])[:3]
+    return start, end, (_clean(rest[0]), _clean(rest[1]), _clean(rest[2]))
+
+
+def build_database(csv_path: str, out_path: str) -> dict:
+    """
+    Import a range CSV into a binary table at ``out_path``.
+
+    The file is written next to the target and swapped in atomically, so
+    running workers keep serving from their existing mapping until they reload.
+
+    Returns:
+        dict: counts of IPv4 rows, IPv6 rows, locations and skipped lines
+    """
+    rows = {4: [], 6: []}
+    locations, location_index = [], {}
+    skipped = 0
+
+    with open(csv_path, newline="", encoding="utf-8") as fh:
+        for fields in csv.reader(fh):
+            if len(fields) < 2 or fields[0].lstrip().startswith("#"):
+                continue
+            try:
+                start, end, location = _parse_row(fields)
+            except ValueError:
+                skipped += 1  # header line or malformed row
+                continue
+            if start.version != end.version or int(start) > int(end):
+                skipped += 1
+                continue
+
+            idx = location_index.get(location)
+            if idx is None:
+                idx = location_index[location] = len(locations)
+                locations.append(location)
+            rows[start.version].append((start.packed, end.packed, idx))
+
+    for version in (4, 6):
+        rows[version].sort()
+
+    loc_blob = json.dumps(locations, ensure_ascii=False).encode("utf-8")
+    loc_offset = _HEADER.size + len(rows[4]) * _ROW[4].size + len(rows[6]) * _ROW[6].size
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(_HEADER.pack(MAGIC, len(rows[4]), len(rows[6]), loc_offset, len(loc_blob)))
+        for version in (4, 6):
+            pack = _ROW[version].pack
+            out.write(b"".join(pack(*r) for r in rows[version]))
+        out.write(loc_blob)
+    os.replace(tmp_path, out_path)
+
+    return {"ipv4": len(rows[4]), "ipv6": len(rows[6]), "locations": len(locations), "skipped": skipped}
+
+
+# -----------------------------
+# Process-wide table
+# -----------------------------
+def init_geoip(app):
+    """Remember where the table lives; it is mapped lazily on first lookup."""
+    global _db_path, _remote_fallback, _database, _database_mtime, _last_check
+    _db_path = app.config.get("GEOIP_DB_PATH") or os.path.join(app.instance_path, "geoip.bin")
+    app.config["GEOIP_DB_PATH"] = _db_path
+    _remote_fallback = bool(app.config.get("GEOIP_REMOTE_FALLBACK", False))
+    _database = None
+    _database_mtime = None
+    _last_check = None
+    if not _remote_fallback and not os.path.exists(_db_path):
+        logger.warning(
+            "No Geo-IP table at %s and GEOIP_REMOTE_FALLBACK is off: clicks are recorded without a location. "
+            "Build one with 'flask geoip build <csv>' or set GEOIP_REMOTE_FALLBACK=true.", _db_path)
+    init_geo_cache(app)
+
+
+def init_geo_cache(app):
+    global _cache
+    _cache_config.update({
+        "key_mode": app.config.get("GEO_CACHE_KEY", "ip"),
+        "ttl": int(app.config.get("GEO_CACHE_TTL", 3600)),
+        "redis_ttl": int(app.config.get("GEO_CACHE_REDIS_TTL", 7 * 86400)),
+        "negative_ttl": int(app.config.get("GEO_CACHE_NEGATIVE_TTL", 300)),
+    })
+    _cache = TTLCache(maxsize=int(app.config.get("GEO_CACHE_SIZE", 10000)), ttl=_cache_config["ttl"])
+
+
+def get_database() -> GeoIPDatabase | None:
+    """
+    Return the mapped table, re-mapping it if the file was rebuilt. The file
+    is checked at most every ``_RELOAD_CHECK_SECONDS``, also while there is
+    none (the default deployment), so lookups never stat it.
+    """
+    global _database, _database_mtime, _last_check
+    now = time.monotonic()
+    if _last_check is not None and now - _last_check < _RELOAD_CHECK_SECONDS:
+        return _database
+
+    with _load_lock:
+        if _last_check is not None and now - _last_check < _RELOAD_CHECK_SECONDS:
+            return _database
+        _last_check = now
+        if not _db_path:
+            return None
+        try:
+            mtime = os.stat(_db_path).st_mtime
+        except OSError:
+            _replace(None, None)
+            return None
+        if _database is None or mtime != _database_mtime:
+            try:
+                _replace(GeoIPDatabase(_db_path), mtime)
+                logger.info("Loaded Geo-IP table %s (%d ranges)", _db_path, len(_database))
+            except Exception as exc:
+                logger.warning("Geo-IP table %s could not be loaded: %s", _db_path, exc)
+                _replace(None, None)
+        return _database
+
+
+def _replace(database: GeoIPDatabase | None, mtime):
+    """
+    Swap in ``database``. The table it replaces is unmapped at the next swap,
+    so lookups that still hold it (from just before this one) can finish.
+    """
+    global _database, _database_mtime, _retired
+    if database is _database:
+        return
+    if _retired is not None:
+        _retired.close()
+    _retired, _database, _database_mtime = _database, database, mtime
+
+
+def _remote_lookup(ip: str) -> dict:
+    try:
+        resp = requests.get(f"https://ipwho.is/{ip}", timeout=3)
+        data = resp.json()
+        if data.get("success"):
+            return {
+                "country": data.get("country", "Unknown"),
+                "region": data.get("region", "Unknown"),
+                "city": data.get("city", "Unknown"),
+            }
+    except Exception:
+        pass
+    return dict(UNKNOWN)
+
+
+# -----------------------------
+# Two-level cache
+# -----------------------------
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _is_unknown(location: dict) -> bool:
+    return location.get("country", "Unknown") == "Unknown"
+
+
+def cache_key(ip: str) -> str:
+    """Cache key for ``ip``: the address itself, or its /24 (IPv4) / /48 (IPv6) prefix."""
+    if _cache_config["key_mode"] != "prefix":
+        return ip
+    try:
+        addr = _normalise(ipaddress.ip_address(ip))
+    except ValueError:
+        return ip
+    prefix = 24 if addr.version == 4 else 48
+    return str(ipaddress.ip_network(f"{addr}/{prefix}", strict=False))
+
+
+def _redis_get(key: str) -> dict | None:
+    client = extensions.redis_client
+    if not client:
+        return None
+    try:
+        data = client.hgetall(f"geo:{key}")
+    except Exception:
+        _count("redis_errors")
+        return None
+    if not data:
+        return None
+    return {"country": data.get("country", "Unknown"), "region": data.get("region", "Unknown"), "city": data.get("city", "Unknown")}
+
+
+def _redis_set(key: str, location: dict, ttl: int):
+    client = extensions.redis_client
+    if not client:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(f"geo:{key}", mapping=location)
+        pipe.expire(f"geo:{key}", ttl)
+        pipe.execute()
+    except Exception:
+        _count("redis_errors")
+
+
+def _store(key: str, location: dict, shared: bool):
+    negative = _is_unknown(location)
+    _cache.set(key, location, ttl=_cache_config["negative_ttl"] if negative else _cache_config["ttl"])
+    if shared:
+        _redis_set(key, location, _cache_config["negative_ttl"] if negative else _cache_config["redis_ttl"])
+
+
+def get_location_from_ip(ip: str | None) -> dict:
+    ip = (ip or "").strip()
+    _count("lookups")
+    key = cache_key(ip)
+
+    # L1: this worker
+    cached = _cache.get(key)
+    if cached is not MISSING:
+        _count("l1_hits")
+        if _is_unknown(cached):
+            _count("negative_hits")
+        return dict(cached)
+
+    # Local table: cheaper than a Redis round trip, so only L1 in front of it
+    database = get_database()
+    if database is not None:
+        _count("misses")
+        location = database.lookup(ip) or dict(UNKNOWN)
+        _store(key, location, shared=False)
+        return dict(location)
+
+    # L2: shared Redis hash
+    location = _redis_get(key)
+    if location is not None:
+        _count("l2_hits")
+        if _is_unknown(location):
+            _count("negative_hits")
+        _cache.set(key, location, ttl=_cache_config["negative_ttl"] if _is_unknown(location) else _cache_config["ttl"])
+        return dict(location)
+
+    _count("misses")
+    location = _remote_lookup(ip) if _remote_fallback else dict(UNKNOWN)
+    _store(key, location, shared=_remote_fallback)
+    return dict(location)
+
+
+def cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["l1"] = _cache.stats()
+    return stats
@@ -0,0 +1,467 @@
+"""
+Redirect cache for ``short:{code}`` keys.
+
+The cached payload carries everything the redirect needs, including the
+owner's grace-period state, so a cache hit costs no DB access:
+
+    {"long": ..., "id": ..., "plan_name": ..., "cancellation_date": ..., "active_until": ...,
+     "redirect": ..., "max_age": ...}
+
+``active_until`` is a UTC epoch timestamp (None while the link is not on a
+cancelled subscription's grace period). Anything that changes an owner's
+``cancellation_date`` must call ``invalidate_user_links`` so cached payloads
+are dropped once the change is committed.
+
+Unknown codes are cached as ``{"missing": true}`` for ``LINK_NEGATIVE_TTL``
+seconds so scanners and typos do not turn into DB lookups; whatever claims a
+code (create, generate-qr, edit) writes the new payload through with
+``write_through``, which replaces it.
+
+Each worker keeps a small, short-lived L1 copy of hot payloads in front of
+Redis. ``invalidate`` evicts locally and publishes the codes on
+``short:invalidate`` so every other worker evicts them too.
+
+Payloads also carry ``soft_exp``: after ``REDIS_TTL`` seconds an entry is
+stale but is kept for another ``LINK_STALE_TTL`` seconds and still served
+while one worker refreshes it in the background. Cache misses go through
+``load``, which coalesces concurrent loads of a code to a single DB query
+(per process via a future, across workers via a short Redis lock).
+"""
+import calendar
+import datetime
+import uuid
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import extensions
+from ..extensions import db
+from ..models.url import Urls
+from ..utils import metrics
+from ..utils.lru_cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "link_cache_invalidate"
+INVALIDATION_CHANNEL = "short:invalidate"
+
+_l1 = TTLCache(maxsize=10000, ttl=5)
+_subscriber = None
+_subscriber_pid = None
+_subscriber_lock = threading.Lock()
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_refreshing = set()
+_refresher = None
+_refresher_pid = None
+
+
+def init_link_cache(app):
+    global _l1
+    _l1 = TTLCache(
+        maxsize=int(app.config.get("LINK_L1_SIZE", 10000)),
+        ttl=float(app.config.get("LINK_L1_TTL", 5)),
+    )
+    metrics.register_collector(_collect_metrics)
+
+
+def cache_key(short_code: str) -> str:
+    return f"short:{short_code}"
+
+
+def _grace_period() -> datetime.timedelta:
+    try:
+        hours = float(current_app.config.get("LINK_GRACE_PERIOD_HOURS", 1))
+    except RuntimeError:  # outside an app context
+        hours = 1
+    return datetime.timedelta(hours=hours)
+
+
+def active_until(plan_name, cancellation_date) -> float | None:
+    """Epoch seconds after which a link stops redirecting, or None if it never does."""
+    if not cancellation_date or plan_name == 'FREE':
+        return None
+    return calendar.timegm((cancellation_date + _grace_period()).utctimetuple())
+
+
+def is_expired(payload: dict, now: float | None = None) -> bool:
+    until = payload.get("active_until")
+    return until is not None and (now or time.time()) > until
+
+
+def build_payload(url_entry, owner) -> dict:
+    cancellation_date = owner.cancellation_date if owner else None
+    return {
+        "long": url_entry.long,
+        "id": url_entry.id_,
+        "plan_name": url_entry.plan_name,
+        "cancellation_date": cancellation_date.isoformat() if cancellation_date else None,
+        "active_until": active_until(url_entry.plan_name, cancellation_date),
+        "redirect": url_entry.redirect_policy or "temporary",
+        "max_age": url_entry.redirect_max_age,
+    }
+
+
+def peek(short_code: str) -> dict | None:
+    """L1-only lookup (no Redis round trip)."""
+    payload = _l1.get(short_code)
+    return None if payload is MISSING else payload
+
+
+def get_payload(short_code: str) -> dict | None:
+    """
+    Cached payload for ``short_code`` (L1, then Redis), or None on a miss.
+
+    Entries written before the payload carried owner state are treated as a
+    miss so they are rebuilt from the DB.
+    """
+    payload = _l1.get(short_code)
+    if payload is not MISSING:
+        return payload
+
+    if not extensions.redis_client:
+        return None
+    ensure_subscriber()
+    try:
+        cached = extensions.redis_client.get(cache_key(short_code))
+    except Exception:
+        metrics.inc("link_cache_redis_total", result="error")
+        return None
+    payload = remember(short_code, cached)
+    metrics.inc("link_cache_redis_total", result="miss" if payload is None else "hit")
+    return payload
+
+
+def remember(short_code: str, cached: str | None) -> dict | None:
+    """Decode a payload read from Redis and keep it in L1; None if unusable."""
+    if not cached:
+        return None
+    try:
+        payload = json.loads(cached)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if payload.get("missing"):
+        _l1.set(short_code, payload, ttl=min(_l1.ttl, _negative_ttl()))
+        return payload
+    if "active_until" not in payload:
+        return None
+    _l1.set(short_code, payload)
+    return payload
+
+
+def is_missing(payload: dict) -> bool:
+    return bool(payload.get("missing"))
+
+
+def _config(name: str, default):
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:  # outside an app context
+        return default
+
+
+def _with_soft_expiry(payload: dict) -> tuple[dict, int]:
+    """Stamp the soft expiry on ``payload`` and return it with its Redis TTL."""
+    fresh = int(_config("REDIS_TTL", 3600))
+    stale = int(_config("LINK_STALE_TTL", 300))
+    payload = dict(payload, soft_exp=int(time.time()) + fresh)
+    return payload, fresh + stale
+
+
+def is_stale(payload: dict, now: float | None = None) -> bool:
+    soft_exp = payload.get("soft_exp")
+    return soft_exp is not None and (now or time.time()) > soft_exp
+
+
+def set_payload(short_code: str, payload: dict) -> dict:
+    payload, ttl = _with_soft_expiry(payload)
+    _l1.set(short_code, payload)
+    try:
+        if extensions.redis_client:
+            extensions.redis_client.setex(cache_key(short_code), ttl, json.dumps(payload))
+    except Exception as exc:
+        logger.warning("Redis SET %s failed: %s", cache_key(short_code), exc)
+    return payload
+
+
+def write_through(url_entry, owner):
+    """
+    Cache a link as soon as it is created or changed, so the first burst of
+    clicks on a freshly shared link is served from cache. Other workers are
+    told to drop any L1 copy (e.g. a "not found" entry) for the code.
+    """
+    if not url_entry.short:
+        return
+    payload, ttl = _with_soft_expiry(build_payload(url_entry, owner))
+    _l1.set(url_entry.short, payload)
+    try:
+        if extensions.redis_client:
+            pipe = extensions.redis_client.pipeline(transaction=False)
+            pipe.setex(cache_key(url_entry.short), ttl, json.dumps(payload))
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps([url_entry.short]))
+            pipe.execute()
+    except Exception as exc:
+        logger.warning("Redis write-through %s failed: %s", cache_key(url_entry.short), exc)
+
+
+def _negative_ttl() -> int:
+    return int(_config("LINK_NEGATIVE_TTL", 60))
+
+
+def set_missing(short_code: str):
+    """Remember that ``short_code`` does not exist (negative cache entry)."""
+    payload = {"missing": True}
+    ttl = _negative_ttl()
+    _l1.set(short_code, payload, ttl=min(_l1.ttl, ttl))
+    try:
+        if extensions.redis_client:
+            extensions.redis_client.set(cache_key(short_code), json.dumps(payload), ex=ttl, nx=True)
+    except Exception as exc:
+        logger.warning("Redis SET %s failed: %s", cache_key(short_code), exc)
+
+
+def invalidate(*short_codes):
+    """Drop codes from Redis and from the L1 cache of every worker."""
+    codes = [c for c in short_codes if c]
+    if not codes:
+        return
+    for code in codes:
+        _l1.pop(code)
+    try:
+        if extensions.redis_client:
+            pipe = extensions.redis_client.pipeline(transaction=False)
+            pipe.delete(*[cache_key(c) for c in codes])
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps(codes))
+            pipe.execute()
+    except Exception as exc:
+        logger.warning("Redis invalidation failed: %s", exc)
+
+
+def l1_stats() -> dict:
+    return _l1.stats()
+
+
+def _collect_metrics():
+    stats = _l1.stats()
+    metrics.set_counter("link_cache_l1_total", stats["hits"], result="hit")
+    metrics.set_counter("link_cache_l1_total", stats["misses"], result="miss")
+
+
+# -----------------------------
+# Single-flight loading
+# -----------------------------
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def lock_key(short_code: str) -> str:
+    return f"lock:short:{short_code}"
+
+
+def _acquire_lock(short_code: str) -> str | None:
+    """Short Redis lock so only one worker rebuilds a code. Returns a token, or None if held elsewhere."""
+    token = uuid.uuid4().hex
+    client = extensions.redis_client
+    if not client:
+        return token
+    try:
+        lock_ms = int(_config("LINK_LOCK_MS", 2000))
+        return token if client.set(lock_key(short_code), token, nx=True, px=lock_ms) else None
+    except Exception:
+        return token  # Redis down: load on our own rather than wait for nothing
+
+
+def _release_lock(short_code: str, token: str):
+    try:
+        if extensions.redis_client:
+            extensions.redis_client.eval(_RELEASE_LOCK, 1, lock_key(short_code), token)
+    except Exception:
+        pass
+
+
+def _store_loaded(short_code: str, payload: dict | None) -> dict:
+    if payload is None:
+        set_missing(short_code)
+        return {"missing": True}
+    return set_payload(short_code, payload)
+
+
+def _wait_for_peer(short_code: str) -> dict | None:
+    """Another worker holds the lock: poll for the payload it is about to write."""
+    deadline = time.monotonic() + float(_config("LINK_LOCK_WAIT", 0.2))
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        payload = get_payload(short_code)
+        if payload is not None:
+            return payload
+    return None
+
+
+def load(short_code: str, loader) -> dict:
+    """
+    Load ``short_code`` on a cache miss, coalescing concurrent callers.
+
+    ``loader(short_code)`` returns a payload from ``build_payload`` or None
+    for an unknown code; it runs once per process and, while the Redis lock
+    is held, once across workers. Waiters that time out load it themselves.
+
+    Returns:
+        dict: the payload (``{"missing": True}`` for unknown codes)
+    """
+    with _inflight_lock:
+        future = _inflight.get(short_code)
+        leader = future is None
+        if leader:
+            future = _inflight[short_code] = Future()
+
+    if not leader:
+        try:
+            return future.result(timeout=float(_config("LINK_LOCK_WAIT", 0.2)) * 2)
+        except Exception:
+            return _store_loaded(short_code, loader(short_code))
+
+    try:
+        token = _acquire_lock(short_code)
+        if token is None:
+            payload = _wait_for_peer(short_code)
+            if payload is None:
+                payload = _store_loaded(short_code, loader(short_code))
+        else:
+            try:
+                payload = _store_loaded(short_code, loader(short_code))
+            finally:
+                _release_lock(short_code, token)
+        future.set_result(payload)
+        return payload
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(short_code, None)
+
+
+def refresh_in_background(short_code: str, loader):
+    """
+    Rebuild a stale payload off the request path. At most one refresh per
+    code runs per process, and only the worker that takes the Redis lock
+    refreshes at all; everyone else keeps serving the stale copy.
+    """
+    if claim_refresh(short_code):
+        start_refresh(short_code, loader, _acquire_lock(short_code))
+
+
+def claim_refresh(short_code: str) -> bool:
+    """Mark ``short_code`` as being refreshed by this process; False if it already is."""
+    with _inflight_lock:
+        if short_code in _refreshing:
+            return False
+        _refreshing.add(short_code)
+        return True
+
+
+def start_refresh(short_code: str, loader, token: str | None):
+    """
+    Run a claimed refresh on the refresher pool. ``token`` is the Redis lock
+    token (see ``_acquire_lock``); None means another worker holds the lock.
+    """
+    global _refresher, _refresher_pid
+    if token is None:
+        with _inflight_lock:
+            _refreshing.discard(short_code)
+        return
+
+    app = current_app._get_current_object()
+    pid = os.getpid()
+    with _subscriber_lock:
+        if _refresher is None or _refresher_pid != pid:
+            _refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="link-cache-refresh")
+            _refresher_pid = pid
+        executor = _refresher
+    executor.submit(_refresh, app, short_code, loader, token)
+
+
+def _refresh(app, short_code: str, loader, token: str):
+    try:
+        with app.app_context():
+            _store_loaded(short_code, loader(short_code))
+    except Exception as exc:
+        logger.warning("Background refresh of %s failed: %s", short_code, exc)
+    finally:
+        _release_lock(short_code, token)
+        with _inflight_lock:
+            _refreshing.discard(short_code)
+
+
+# -----------------------------
+# Cross-worker L1 invalidation
+# -----------------------------
+def ensure_subscriber():
+    global _subscriber, _subscriber_pid
+    pid = os.getpid()
+    if _subscriber is not None and _subscriber_pid == pid and _subscriber.is_alive():
+        return
+    with _subscriber_lock:
+        if _subscriber is not None and _subscriber_pid == pid and _subscriber.is_alive():
+            return
+        _subscriber = threading.Thread(target=_listen_for_invalidations, name="link-cache-invalidator", daemon=True)
+        _subscriber_pid = pid
+        _subscriber.start()
+
+
+def _listen_for_invalidations():
+    while True:
+        client = extensions.redis_client
+        if not client:
+            return
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while we were disconnected is lost: start clean
+            _l1.clear()
+            for message in pubsub.listen():
+                for code in json.loads(message["data"]):
+                    _l1.pop(code)
+        except Exception as exc:
+            logger.warning("Link cache invalidation listener reconnecting: %s", exc)
+            time.sleep(1)
+
+
+# -----------------------------
+# Owner state changes
+# -----------------------------
+def invalidate_user_links(user_id):
+    """
+    Drop the cached payloads of every link owned by ``user_id`` once the
+    current transaction commits (e.g. cancellation, resubscription), so the
+    next redirect rebuilds them with the committed grace-period state.
+    """
+    shorts = [s for (s,) in db.session.query(Urls.short).filter(Urls.user_id == user_id) if s]
+    if shorts:
+        db.session().info.setdefault(_PENDING_KEY, set()).update(shorts)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    shorts = session.info.pop(_PENDING_KEY, None)
+    if shorts:
+        invalidate(*shorts)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
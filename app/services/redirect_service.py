@@ -0,0 +1,328 @@
+"""
+Staged redirect pipeline shared by every redirect entry point.
+
+    1. resolve_link   - short code -> long URL (Redis, then DB)
+    2. should_count   - HEAD requests and bots stop here, before any enrichment
+    3. record_click   - debounce, count, queue the raw analytics row (the writer enriches it)
+
+Only stage 3 does per-click work, so preview crawlers cost one cache lookup.
+
+Counted clicks whose link is in Redis take a shortcut: ``resolve_and_count``
+runs stages 1 and 3 as one Lua script (resolve, debounce, counters, stream
+append), i.e. a single Redis round trip per redirect.
+"""
+import datetime
+import ipaddress
+import json
+import logging
+import time
+import zlib
+from collections import namedtuple
+
+from flask import current_app
+from werkzeug.http import http_date
+
+from .. import extensions
+from ..models.url import Urls
+from ..models.user import User
+from ..utils.bot_detection import is_bot
+from ..utils import metrics
+from ..utils.timing import phase
+from . import click_counters, link_cache
+from .click_queue import enqueue_click, ensure_writer
+
+logger = logging.getLogger(__name__)
+
+LINK_OK = "ok"
+LINK_MISSING = "missing"
+LINK_EXPIRED = "expired"
+
+# 404 messages, by lookup status (expired: by where the payload came from)
+MISSING_MESSAGE = "URL does not exist or is inactive"
+EXPIRED_MESSAGES = {
+    "redis": " Redis Cache Hit: This link is no longer active due to subscription expiry (Testing).",
+    "db": "Database Hit: This link is no longer active due to subscription expiry (Testing).",
+}
+
+REDIRECT_TEMPORARY = "temporary"   # 302, never cached: every click reaches us
+REDIRECT_CACHED = "cached"         # 302 with max-age
+REDIRECT_PERMANENT = "permanent"   # 301 with max-age
+REDIRECT_POLICIES = (REDIRECT_TEMPORARY, REDIRECT_CACHED, REDIRECT_PERMANENT)
+
+LinkLookup = namedtuple(
+    "LinkLookup", "status long_url url_id source policy max_age active_until",
+    defaults=(REDIRECT_TEMPORARY, None, None),
+)
+
+
+def client_ip(headers, remote_addr: str | None) -> str:
+    xff = headers.get("X-Forwarded-For", '')
+    if xff:
+        # Client-supplied: only trust it if it is an address at all
+        forwarded = xff.split(',')[0].strip()
+        try:
+            return str(ipaddress.ip_address(forwarded))
+        except ValueError:
+            pass
+    return remote_addr or "0.0.0.0"
+
+
+# -------------------------------------
+# Stage 1: resolve
+# -------------------------------------
+def load_payload(short_code: str) -> dict | None:
+    url_entry = Urls.query.filter_by(short=short_code).first()
+    if not url_entry:
+        return None
+    owner = User.query.get(url_entry.user_id)
+    return link_cache.build_payload(url_entry, owner)
+
+
+def _lookup(payload: dict, source: str) -> LinkLookup:
+    if link_cache.is_missing(payload):
+        return LinkLookup(LINK_MISSING, None, None, source)
+    if link_cache.is_expired(payload):
+        return LinkLookup(LINK_EXPIRED, None, payload.get("id"), source)
+    return LinkLookup(
+        LINK_OK, payload.get("long"), payload.get("id"), source,
+        payload.get("redirect") or REDIRECT_TEMPORARY, payload.get("max_age"), payload.get("active_until"),
+    )
+
+
+def redirect_caching(link: LinkLookup, now: float | None = None) -> tuple[int, dict]:
+    """
+    Status code and caching headers for a resolved link.
+
+    Cached redirects never outlive the link: on a cancelled subscription's
+    grace period the lifetime is capped at ``active_until``.
+    """
+    no_store = 302, {"Cache-Control": "private, no-store"}
+    if link.policy not in (REDIRECT_CACHED, REDIRECT_PERMANENT):
+        return no_store
+
+    config = current_app.config
+    if link.max_age is not None:
+        max_age = int(link.max_age)
+    elif link.policy == REDIRECT_PERMANENT:
+        max_age = int(config.get("LINK_PERMANENT_MAX_AGE", 365 * 86400))
+    else:
+        max_age = int(config.get("LINK_CACHED_MAX_AGE", 300))
+
+    now = now or time.time()
+    if link.active_until is not None:
+        max_age = min(max_age, int(link.active_until - now))
+    if max_age <= 0:
+        return no_store
+
+    code = 301 if link.policy == REDIRECT_PERMANENT else 302
+    return code, {"Cache-Control": f"public, max-age={max_age}", "Expires": http_date(now + max_age)}
+
+
+def cached_lookup(short_code: str, payload: dict) -> LinkLookup:
+    if link_cache.is_stale(payload):
+        # Serve the stale copy; one worker rebuilds it off the request path
+        link_cache.refresh_in_background(short_code, load_payload)
+    return redis_lookup(payload)
+
+
+def redis_lookup(payload: dict) -> LinkLookup:
+    """Lookup for a payload served from the cache, without the stale check."""
+    return _lookup(payload, "redis")
+
+
+def resolve_link(short_code: str) -> LinkLookup:
+    # Redis HIT: the payload carries the owner's grace-period state -> no DB access
+    with phase("cache"):
+        payload = link_cache.get_payload(short_code)
+    if payload is not None:
+        return cached_lookup(short_code, payload)
+
+    # Redis MISS -> fallback to DB, one load per code however many requests are waiting.
+    # Unknown and expired links are cached too so they stay off the DB.
+    return _lookup(link_cache.load(short_code, load_payload), "db")
+
+
+# -------------------------------------
+# Stage 2: classify
+# -------------------------------------
+def should_count(method: str, user_agent: str | None) -> bool:
+    """HEAD probes and bots are redirected without being counted or enriched."""
+    if method == "HEAD":
+        return False
+    if is_bot(user_agent):
+        logger.debug("Bot skipped: %s", user_agent)
+        return False
+    return True
+
+
+# -------------------------------------
+# Stage 3: count
+# -------------------------------------
+def debounce_key(short_code: str, ip_address: str, user_agent: str) -> str:
+    # Stable across workers (built-in hash() is salted per process)
+    ua_hash = zlib.crc32(user_agent.encode("utf-8", "replace"))
+    return f"click:{short_code}:{ip_address}:{ua_hash}"
+
+
+DEBOUNCE_SECONDS = 2
+
+
+def _is_duplicate(short_code: str, ip_address: str, user_agent: str) -> bool:
+    # Mobile browsers often fire the same click twice within a second
+    try:
+        if extensions.redis_client:
+            # block duplicates for 2 seconds; SET NX answers "seen already?" in one round trip
+            with phase("debounce"):
+                first = extensions.redis_client.set(
+                    debounce_key(short_code, ip_address, user_agent), "1", nx=True, ex=DEBOUNCE_SECONDS
+                )
+            return not first
+    except Exception:
+        pass
+    return False
+
+
+def _click_event(url_id, user_agent: str, ip_address: str, source: str) -> dict:
+    return {
+        "url_id": url_id,
+        # Clamped to the url_analytics columns: one oversized value fails a whole batch insert
+        "user_agent": user_agent[:300],
+        "ip_address": (ip_address or "")[:50],
+        "source": click_counters.normalize_source(source),
+        "timestamp": datetime.datetime.utcnow(),
+    }
+
+
+def record_click(short_code: str, url_id, user_agent: str, ip_address: str, source: str) -> bool:
+    if url_id is None or _is_duplicate(short_code, ip_address, user_agent):
+        return False
+    event = _click_event(url_id, user_agent, ip_address, source)
+    with phase("analytics"):
+        click_counters.bump(url_id, click_counters.click_fields(source))
+        return enqueue_click(event)
+
+
+# -------------------------------------
+# Stages 1 + 3 in one Redis round trip
+# -------------------------------------
+# KEYS: short:{code}, debounce key, click stream, dirty-counter set
+# ARGV: now (epoch), debounce seconds, stream maxlen, event JSON, counter fields...
+# Returns {0} when the payload is not cached (caller falls back to the DB),
+# otherwise {1, payload, counted}.
+_REDIRECT_LUA = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then return {0} end
+local ok, payload = pcall(cjson.decode, raw)
+if not ok or type(payload) ~= 'table' then return {0} end
+if payload.missing then return {1, raw, 0} end
+local until_ts = payload.active_until
+if until_ts == nil then return {0} end
+if until_ts ~= cjson.null and tonumber(ARGV[1]) > tonumber(until_ts) then return {1, raw, 0} end
+
+if not redis.call('SET', KEYS[2], '1', 'NX', 'EX', tonumber(ARGV[2])) then
+    return {1, raw, 0}
+end
+
+local counters = 'clicks:' .. tostring(payload.id)
+for i = 5, #ARGV do
+    redis.call('HINCRBY', counters, ARGV[i], 1)
+end
+redis.call('SADD', KEYS[4], payload.id)
+
+local event = cjson.decode(ARGV[4])
+event.url_id = payload.id
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', tonumber(ARGV[3]), '*', 'e', cjson.encode(event))
+return {1, raw, 1}
+"""
+
+_scripts = {}
+
+
+def redirect_script(client):
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(_REDIRECT_LUA)
+    return script
+
+
+def peek_unavailable(short_code: str) -> LinkLookup | None:
+    """Missing/expired lookup straight from L1; those are never counted."""
+    payload = link_cache.peek(short_code)
+    if payload is not None and (link_cache.is_missing(payload) or link_cache.is_expired(payload)):
+        return redis_lookup(payload)
+    return None
+
+
+def redirect_script_call(short_code: str, user_agent: str, ip_address: str, source: str) -> tuple[list, list]:
+    """KEYS and ARGV of the redirect script for one click."""
+    config = current_app.config
+    event = _click_event(None, user_agent, ip_address, source)
+    event["timestamp"] = event["timestamp"].isoformat()
+    keys = [
+        link_cache.cache_key(short_code),
+        debounce_key(short_code, ip_address, user_agent),
+        config.get("CLICK_STREAM_KEY", "clicks:stream"),
+        click_counters.DIRTY_SET,
+    ]
+    args = [
+        int(time.time()),
+        DEBOUNCE_SECONDS,
+        int(config.get("CLICK_STREAM_MAXLEN", 1000000)),
+        json.dumps(event),
+        *click_counters.click_fields(source),
+    ]
+    return keys, args
+
+
+def script_payload(short_code: str, result) -> dict | None:
+    """Payload from the redirect script's reply; None when the caller must fall back."""
+    if not result or int(result[0]) != 1:
+        return None
+    return link_cache.remember(short_code, result[1])
+
+
+def script_lookup(short_code: str, result) -> LinkLookup | None:
+    payload = script_payload(short_code, result)
+    if payload is None:
+        return None
+    if int(result[2]):
+        # The click went to the stream: make sure this worker drains it
+        click_counters.ensure_flusher()
+        ensure_writer()
+    return cached_lookup(short_code, payload)
+
+
+def resolve_and_record(short_code: str, user_agent: str, ip_address: str, source: str) -> LinkLookup:
+    link = resolve_link(short_code)
+    if link.status == LINK_OK:
+        record_click(short_code, link.url_id, user_agent, ip_address, source)
+    return link
+
+
+def resolve_and_count(short_code: str, user_agent: str, ip_address: str, source: str) -> LinkLookup:
+    """
+    Resolve and count a click in one Redis call when the link is cached;
+    otherwise (cache miss, no Redis) fall back to ``resolve_link`` + ``record_click``.
+    """
+    link = peek_unavailable(short_code)
+    if link is not None:
+        return link
+
+    client = extensions.redis_client
+    if client:
+        link_cache.ensure_subscriber()
+        keys, args = redirect_script_call(short_code, user_agent, ip_address, source)
+        try:
+            with phase("cache"):
+                result = redirect_script(client)(keys=keys, args=args)
+        except Exception as exc:
+            logger.warning("Redirect script failed for %s: %s", short_code, exc)
+            metrics.inc("link_cache_redis_total", result="error")
+            result = None
+        link = script_lookup(short_code, result)
+        if result is not None:
+            metrics.inc("link_cache_redis_total", result="miss" if link is None else "hit")
+        if link is not None:
+            return link
+
+    return resolve_and_record(short_code, user_agent, ip_address, source)
@@ -0,0 +1,94 @@
+"""
+Short-code allocator.
+
+Sequence numbers come from the ``short_code_sequence`` table in blocks of
+``SHORT_CODE_BLOCK_SIZE`` (hi/lo): one UPDATE per block, after which each
+worker hands codes out from memory. Every number is turned into a code by
+the keyed permutation in ``utils.short_code``, so generated codes never
+collide with each other and need no lookup.
+
+Codes created before the allocator (random 7-character strings) share the
+keyspace, so each reserved block is checked against ``urls.short`` once,
+with a single IN query, and taken codes are skipped. Custom slugs cannot
+take a code the allocator may still issue (e.g. one waiting in a worker's
+block): ``is_generated`` rejects them.
+"""
+import logging
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from ..extensions import db
+from ..models.short_code_sequence import ShortCodeSequence
+from ..models.url import Urls
+from ..utils.short_code import MAX_ID, decode, encode
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_NAME = "urls.short"
+
+_lock = threading.Lock()
+_codes = []
+_pid = None
+
+
+def _secret():
+    config = current_app.config
+    return config.get("SHORT_CODE_KEY") or config["SECRET_KEY"]
+
+
+def _reserve_block(size: int) -> range:
+    """Atomically advance the sequence by ``size`` and return the reserved range."""
+    table = ShortCodeSequence.__table__
+    for _ in range(2):
+        with db.engine.begin() as conn:
+            # UPDATE first so the row stays locked until we have read the new value
+            updated = conn.execute(
+                update(table).where(table.c.name == SEQUENCE_NAME).values(next_value=table.c.next_value + size)
+            ).rowcount
+            if updated:
+                hi = conn.execute(select(table.c.next_value).where(table.c.name == SEQUENCE_NAME)).scalar_one()
+                return range(hi - size, hi)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(name=SEQUENCE_NAME, next_value=1 + size))
+            return range(1, 1 + size)
+        except Exception:
+            # Another worker created the row first; take a block from it instead
+            continue
+    raise RuntimeError("Could not reserve a short-code block")
+
+
+def _next_block() -> list:
+    size = int(current_app.config.get("SHORT_CODE_BLOCK_SIZE", 100))
+    block = _reserve_block(size)
+    if block.stop - 1 > MAX_ID:
+        raise RuntimeError("Short-code sequence exhausted")
+
+    secret = _secret()
+    codes = [encode(n, secret) for n in block]
+    taken = set(db.session.execute(select(Urls.short).where(Urls.short.in_(codes))).scalars())
+    if taken:
+        logger.info("Skipping %d short codes already in use", len(taken))
+    return [c for c in codes if c not in taken]
+
+
+def is_generated(code: str) -> bool:
+    """True if the allocator issues ``code`` for some sequence number (so it is no custom slug)."""
+    n = decode(code, _secret())
+    return n is not None and n >= 1
+
+
+def allocate() -> str:
+    """Next free short code for this worker."""
+    global _codes, _pid
+    with _lock:
+        if _pid != os.getpid():
+            # A forked worker must not reuse the parent's block
+            _codes, _pid = [], os.getpid()
+        while not _codes:
+            _codes = _next_block()
+            _codes.reverse()
+        return _codes.pop()
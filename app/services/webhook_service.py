@@ -2,6 +2,7 @@ import hmac
 import hashlib
 import json
 import datetime
+import logging
 from flask import current_app
 from app.extensions import db
 from app.models.webhook_events import WebhookEvent
@@ -12,7 +13,12 @@ from app.models.plan import Plan
 from app.models.billing_info import BillingInfo
 import requests
 from app.routes.subscription_routes import _downgrade_user_to_free
+from app.services.link_cache import invalidate_user_links
+from app.utils.timing import phase, timed
+
+logger = logging.getLogger(__name__)
  
+@timed("verify")
 def verify_webhook_signature(payload_body, signature, secret):
     """
     Verify Razorpay webhook signature
@@ -37,7 +43,7 @@ def verify_webhook_signature(payload_body, signature, secret):
        
         return hmac.compare_digest(expected_signature, signature)
     except Exception as e:
-        print(f"ERROR: Signature verification failed: {str(e)}")
+        logger.error("Signature verification failed: %s", e)
         return False
  
  
@@ -62,7 +68,7 @@ def store_webhook_event(event_data, signature):
         # Check if event already exists (idempotency)
         existing_event = WebhookEvent.query.filter_by(event_id=unique_event_id).first()
         if existing_event:
-            print(f"DEBUG: Webhook event {unique_event_id} already exists, skipping")
+            logger.debug("Webhook event %s already exists, skipping", unique_event_id)
             return None
        
         # Extract metadata
@@ -104,11 +110,11 @@ def store_webhook_event(event_data, signature):
         db.session.add(webhook_event)
         db.session.commit()
        
-        print(f"DEBUG: Stored webhook event {unique_event_id} - {event_type}")
+        logger.debug("Stored webhook event %s - %s", unique_event_id, event_type)
         return webhook_event
        
     except Exception as e:
-        print(f"ERROR: Failed to store webhook event: {str(e)}")
+        logger.error("Failed to store webhook event: %s", e)
         db.session.rollback()
         return None
  
@@ -120,7 +126,7 @@ def process_payment_authorized(event_data, webhook_event):
         payment_entity = payload.get('payment', {}).get('entity', {})
         payment_id = payment_entity.get('id')
        
-        print(f"DEBUG: Processing payment.authorized for payment {payment_id}")
+        logger.debug("Processing payment.authorized for payment %s", payment_id)
        
         # Update webhook event as processed
         webhook_event.processed = True
@@ -130,7 +136,7 @@ def process_payment_authorized(event_data, webhook_event):
         return True
     except Exception as e:
         error_msg = f"Failed to process payment.authorized: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         webhook_event.error_message = error_msg
         db.session.commit()
         return False
@@ -146,7 +152,7 @@ def process_payment_captured(event_data, webhook_event):
         payment_id = payment_entity.get('id')
         subscription_id = subscription_entity.get('id') if subscription_entity else None
        
-        print(f"DEBUG: Processing payment.captured for payment {payment_id}, subscription {subscription_id}")
+        logger.debug("Processing payment.captured for payment %s, subscription %s", payment_id, subscription_id)
        
         if not subscription_id:
             # Try to find subscription from payment notes
@@ -204,7 +210,8 @@ def process_payment_captured(event_data, webhook_event):
                                 user.usage_editable_links = 0
                                 # Clear cancellation date if it exists (User resubscribed)
                                 user.cancellation_date = None
-                                print(f"DEBUG: Updated User {user.id} to NEW Plan ID {internal_plan.id} (Limits & Usage Counters Reset)")
+                                invalidate_user_links(user.id)
+                                logger.info("Updated User %s to NEW Plan ID %s (Limits & Usage Counters Reset)", user.id, internal_plan.id)
                             else:
                                 if not user.permanent_custom_limits:
                                     user.custom_limits = None
@@ -215,7 +222,8 @@ def process_payment_captured(event_data, webhook_event):
                                 user.usage_editable_links = 0
                                 # Clear cancellation date (User renewed)
                                 user.cancellation_date = None
-                                print(f"DEBUG: User {user.id} renewed same Plan ID {internal_plan.id} (Usage Counters Reset)")
+                                invalidate_user_links(user.id)
+                                logger.info("User %s renewed same Plan ID %s (Usage Counters Reset)", user.id, internal_plan.id)
                    
                     # Update billing info
                     billing_info = BillingInfo.query.filter_by(user_id=sub.user_id).order_by(BillingInfo.created_at.desc()).first()
@@ -224,9 +232,9 @@ def process_payment_captured(event_data, webhook_event):
                         billing_info.razorpay_subscription_id = subscription_id
                
                 db.session.commit()
-                print(f"DEBUG: Activated subscription {subscription_id} via webhook")
+                logger.info("Activated subscription %s via webhook", subscription_id)
             else:
-                print(f"WARNING: Subscription {subscription_id} not found in database")
+                logger.warning("Subscription %s not found in database", subscription_id)
        
         # Mark webhook as processed
         webhook_event.processed = True
@@ -237,7 +245,7 @@ def process_payment_captured(event_data, webhook_event):
        
     except Exception as e:
         error_msg = f"Failed to process payment.captured: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         webhook_event.error_message = error_msg
         db.session.commit()
         return False
@@ -253,7 +261,7 @@ def process_payment_failed(event_data, webhook_event):
         payment_id = payment_entity.get('id')
         subscription_id = subscription_entity.get('id') if subscription_entity else None
        
-        print(f"DEBUG: Processing payment.failed for payment {payment_id}, subscription {subscription_id}")
+        logger.debug("Processing payment.failed for payment %s, subscription %s", payment_id, subscription_id)
        
         if subscription_id:
             sub = Subscription.query.filter_by(razorpay_subscription_id=subscription_id).first()
@@ -263,7 +271,7 @@ def process_payment_failed(event_data, webhook_event):
                 sub.updated_date = datetime.datetime.utcnow()
                 
                 db.session.commit()
-                print(f"DEBUG: Marked subscription {subscription_id} as Failed (User plan remains unchanged)")
+                logger.info("Marked subscription %s as Failed (User plan remains unchanged)", subscription_id)
        
         webhook_event.processed = True
         webhook_event.processed_at = datetime.datetime.utcnow()
@@ -273,7 +281,7 @@ def process_payment_failed(event_data, webhook_event):
        
     except Exception as e:
         error_msg = f"Failed to process payment.failed: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         webhook_event.error_message = error_msg
         db.session.commit()
         return False
@@ -286,7 +294,7 @@ def process_subscription_activated(event_data, webhook_event):
         subscription_entity = payload.get('subscription', {}).get('entity', {})
         subscription_id = subscription_entity.get('id')
        
-        print(f"DEBUG: Processing subscription.activated for {subscription_id}")
+        logger.debug("Processing subscription.activated for %s", subscription_id)
        
         if subscription_id:
             sub = Subscription.query.filter_by(razorpay_subscription_id=subscription_id).first()
@@ -335,7 +343,7 @@ def process_subscription_activated(event_data, webhook_event):
                                 user.usage_qrs = 0
                                 user.usage_qr_with_logo = 0
                                 user.usage_editable_links = 0
-                                print(f"DEBUG: Updated User {user.id} to NEW Plan ID {internal_plan.id} (Limits & Usage Counters Reset)")
+                                logger.info("Updated User %s to NEW Plan ID %s (Limits & Usage Counters Reset)", user.id, internal_plan.id)
                             else:
                                 if not user.permanent_custom_limits:
                                     user.custom_limits = None
@@ -344,7 +352,7 @@ def process_subscription_activated(event_data, webhook_event):
                                 user.usage_qrs = 0
                                 user.usage_qr_with_logo = 0
                                 user.usage_editable_links = 0
-                                print(f"DEBUG: User {user.id} renewed same Plan ID {internal_plan.id} (Usage Counters Reset)")
+                                logger.info("User %s renewed same Plan ID %s (Usage Counters Reset)", user.id, internal_plan.id)
                    
                     # Update billing info
                     billing_info = BillingInfo.query.filter_by(user_id=sub.user_id).order_by(BillingInfo.created_at.desc()).first()
@@ -353,12 +361,12 @@ def process_subscription_activated(event_data, webhook_event):
                         billing_info.razorpay_subscription_id = subscription_id
                
                 db.session.commit()
-                print(f"DEBUG: Activated subscription {subscription_id} via subscription.activated event")
+                logger.info("Activated subscription %s via subscription.activated event", subscription_id)
             elif sub and sub.subscription_status == 'Active':
                 # Already active, just update timestamp
                 sub.updated_date = datetime.datetime.utcnow()
                 db.session.commit()
-                print(f"DEBUG: Subscription {subscription_id} already active, updated timestamp")
+                logger.debug("Subscription %s already active, updated timestamp", subscription_id)
        
         webhook_event.processed = True
         webhook_event.processed_at = datetime.datetime.utcnow()
@@ -368,7 +376,7 @@ def process_subscription_activated(event_data, webhook_event):
        
     except Exception as e:
         error_msg = f"Failed to process subscription.activated: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         webhook_event.error_message = error_msg
         db.session.commit()
         return False
@@ -381,7 +389,7 @@ def process_subscription_cancelled(event_data, webhook_event):
         subscription_entity = payload.get('subscription', {}).get('entity', {})
         subscription_id = subscription_entity.get('id')
        
-        print(f"DEBUG: Processing subscription.cancelled for {subscription_id}")
+        logger.debug("Processing subscription.cancelled for %s", subscription_id)
        
         if subscription_id:
             sub = Subscription.query.filter_by(razorpay_subscription_id=subscription_id).first()
@@ -390,7 +398,7 @@ def process_subscription_cancelled(event_data, webhook_event):
                 current_end = subscription_entity.get('current_end')
                 if current_end:
                     sub.subscription_end_date = datetime.datetime.utcfromtimestamp(current_end)
-                    print(f"DEBUG: Updated subscription {subscription_id} end_date to {sub.subscription_end_date} from webhook")
+                    logger.info("Updated subscription %s end_date to %s from webhook", subscription_id, sub.subscription_end_date)
 
                 # Create subscription history record before updating
                 try:
@@ -409,9 +417,9 @@ def process_subscription_cancelled(event_data, webhook_event):
                         notes=sub.notes
                     )
                     db.session.add(history)
-                    print(f"DEBUG: Created subscription history for {subscription_id}")
+                    logger.info("Created subscription history for %s", subscription_id)
                 except Exception as e:
-                    print(f"WARNING: Failed to create subscription history: {str(e)}")
+                    logger.warning("Failed to create subscription history: %s", e)
                 
                 # Update subscription status
                 sub.subscription_status = 'Cancelled'
@@ -429,7 +437,7 @@ def process_subscription_cancelled(event_data, webhook_event):
                 ).first()
 
                 if other_active_sub:
-                    print(f"DEBUG: User {sub.user_id} has another active subscription {other_active_sub.razorpay_subscription_id}. SKIPPING downgrade to Free.")
+                    logger.debug("User %s has another active subscription %s. SKIPPING downgrade to Free.", sub.user_id, other_active_sub.razorpay_subscription_id)
                 else:
                     # Downgrade user to Free plan ONLY if no other active subscription exists
                     user = User.query.get(sub.user_id)
@@ -445,10 +453,10 @@ def process_subscription_cancelled(event_data, webhook_event):
                         #     user.usage_qrs = free_plan.max_qrs if free_plan.max_qrs != -1 else 0
                         #     user.usage_qr_with_logo = free_plan.max_qr_with_logo if free_plan.max_qr_with_logo != -1 else 0
                         #     user.usage_editable_links = free_plan.max_editable_links if free_plan.max_editable_links != -1 else 0
-                        print(f"DEBUG: Downgraded user {user.id} to Free plan with limits: links={user.usage_links}, qrs={user.usage_qrs}")
+                        logger.info("Downgraded user %s to Free plan with limits: links=%s, qrs=%s", user.id, user.usage_links, user.usage_qrs)
                 
                 db.session.commit()
-                print(f"DEBUG: Cancelled subscription {subscription_id}")
+                logger.info("Cancelled subscription %s", subscription_id)
        
         webhook_event.processed = True
         webhook_event.processed_at = datetime.datetime.utcnow()
@@ -458,7 +466,7 @@ def process_subscription_cancelled(event_data, webhook_event):
        
     except Exception as e:
         error_msg = f"Failed to process subscription.cancelled: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         webhook_event.error_message = error_msg
         db.session.commit()
         return False
@@ -473,7 +481,7 @@ def process_subscription_authenticated(event_data, webhook_event):
        
         subscription_id = subscription_entity.get('id')
        
-        print(f"DEBUG: Processing subscription.authenticated for subscription {subscription_id}")
+        logger.debug("Processing subscription.authenticated for subscription %s", subscription_id)
        
         if subscription_id:
             # Find subscription in database
@@ -540,7 +548,8 @@ def process_subscription_authenticated(event_data, webhook_event):
                             user.usage_editable_links = 0
                             # Clear cancellation date if it exists (User resubscribed)
                             user.cancellation_date = None
-                            print(f"DEBUG: Updated User {user.id} to NEW Plan ID {internal_plan.id} (Limits & Usage Counters Reset)")
+                            invalidate_user_links(user.id)
+                            logger.info("Updated User %s to NEW Plan ID %s (Limits & Usage Counters Reset)", user.id, internal_plan.id)
                         else:
                             if not user.permanent_custom_limits:
                                 user.custom_limits = None
@@ -551,7 +560,8 @@ def process_subscription_authenticated(event_data, webhook_event):
                             user.usage_editable_links = 0
                             # Clear cancellation date (User renewed)
                             user.cancellation_date = None
-                            print(f"DEBUG: User {user.id} renewed same Plan ID {internal_plan.id} (Usage Counters Reset)")
+                            invalidate_user_links(user.id)
+                            logger.info("User %s renewed same Plan ID %s (Usage Counters Reset)", user.id, internal_plan.id)
                 
                 # Update billing info
                 billing_info = BillingInfo.query.filter_by(user_id=sub.user_id).order_by(BillingInfo.created_at.desc()).first()
@@ -560,7 +570,7 @@ def process_subscription_authenticated(event_data, webhook_event):
                     billing_info.razorpay_subscription_id = subscription_id
                
                 db.session.commit()
-                print(f"DEBUG: Activated subscription {subscription_id} via subscription.authenticated")
+                logger.info("Activated subscription %s via subscription.authenticated", subscription_id)
 
                 # ============================================================================
                 # CANCEL PREVIOUS ACTIVE SUBSCRIPTIONS (DEFERRED CANCELLATION)
@@ -576,14 +586,14 @@ def process_subscription_authenticated(event_data, webhook_event):
                     ).all()
 
                     for old_sub in other_active_subs:
-                        print(f"DEBUG: Found previous active subscription {old_sub.razorpay_subscription_id}, cancelling now")
+                        logger.debug("Found previous active subscription %s, cancelling now", old_sub.razorpay_subscription_id)
                         _cancel_old_subscription(old_sub)
                         
                 except Exception as e:
-                    print(f"WARNING: Failed to process deferred cancellation: {str(e)}")
+                    logger.warning("Failed to process deferred cancellation: %s", e)
 
             else:
-                print(f"WARNING: Subscription {subscription_id} not found in database")
+                logger.warning("Subscription %s not found in database", subscription_id)
        
         # Mark webhook as processed
         webhook_event.processed = True
@@ -594,7 +604,7 @@ def process_subscription_authenticated(event_data, webhook_event):
        
     except Exception as e:
         error_msg = f"Failed to process subscription.authenticated: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         webhook_event.error_message = error_msg
         db.session.commit()
         return False
@@ -609,7 +619,7 @@ def _cancel_old_subscription(subscription):
         razorpay_key_secret = current_app.config.get('RAZORPAY_KEY_SECRET')
         
         if not razorpay_key_id or not razorpay_key_secret:
-            print("ERROR: Razorpay credentials missing for cancellation")
+            logger.error("Razorpay credentials missing for cancellation")
             return
 
         # 1. Call Razorpay API
@@ -623,9 +633,9 @@ def _cancel_old_subscription(subscription):
         )
         
         if response.status_code == 200:
-            print(f"DEBUG: Razorpay cancellation successful for {subscription.razorpay_subscription_id}")
+            logger.info("Razorpay cancellation successful for %s", subscription.razorpay_subscription_id)
         else:
-            print(f"WARNING: Razorpay cancellation failed for {subscription.razorpay_subscription_id}: {response.text}")
+            logger.warning("Razorpay cancellation failed for %s: %s", subscription.razorpay_subscription_id, response.text)
             # We proceed to mark it cancelled locally anyway to avoid double billing/access
 
         # 2. Create History Record
@@ -651,10 +661,10 @@ def _cancel_old_subscription(subscription):
         subscription.updated_date = datetime.datetime.utcnow()
         
         db.session.commit()
-        print(f"DEBUG: deferred cancellation completed for {subscription.razorpay_subscription_id}")
+        logger.info("deferred cancellation completed for %s", subscription.razorpay_subscription_id)
 
     except Exception as e:
-        print(f"ERROR: Error in _cancel_old_subscription: {str(e)}")
+        logger.error("Error in _cancel_old_subscription: %s", e)
 
 
 
@@ -671,7 +681,8 @@ def process_webhook_event(event_data, signature):
     """
     try:
         # Store the webhook event
-        webhook_event = store_webhook_event(event_data, signature)
+        with phase("store"):
+            webhook_event = store_webhook_event(event_data, signature)
        
         if not webhook_event:
             return True, "Duplicate event, already processed"
@@ -679,20 +690,21 @@ def process_webhook_event(event_data, signature):
         event_type = event_data.get('event', '')
        
         # Route to appropriate handler based on event type
-        if event_type == 'subscription.authenticated':
-            success = process_subscription_authenticated(event_data, webhook_event)
-        elif event_type == 'subscription.cancelled':
-            success = process_subscription_cancelled(event_data, webhook_event)
-        elif event_type == 'payment.failed':
-            success = process_payment_failed(event_data, webhook_event)
-        else:
-            # All other events are ignored/marked processed without action as per new requirement
-            # 'payment.authorized', 'payment.captured', 'subscription.activated', 'subscription.charged'
-            print(f"DEBUG: Event type {event_type} ignored/skipped (marking processed)")
-            webhook_event.processed = True
-            webhook_event.processed_at = datetime.datetime.utcnow()
-            db.session.commit()
-            success = True
+        with phase("handle"):
+            if event_type == 'subscription.authenticated':
+                success = process_subscription_authenticated(event_data, webhook_event)
+            elif event_type == 'subscription.cancelled':
+                success = process_subscription_cancelled(event_data, webhook_event)
+            elif event_type == 'payment.failed':
+                success = process_payment_failed(event_data, webhook_event)
+            else:
+                # All other events are ignored/marked processed without action as per new requirement
+                # 'payment.authorized', 'payment.captured', 'subscription.activated', 'subscription.charged'
+                logger.debug("Event type %s ignored/skipped (marking processed)", event_type)
+                webhook_event.processed = True
+                webhook_event.processed_at = datetime.datetime.utcnow()
+                db.session.commit()
+                success = True
        
         if success:
             return True, f"Event {event_type} processed successfully"
@@ -701,7 +713,7 @@ def process_webhook_event(event_data, signature):
            
     except Exception as e:
         error_msg = f"Webhook processing error: {str(e)}"
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         return False, error_msg
  
  
\ No newline at end of file
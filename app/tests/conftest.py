@@ -0,0 +1,40 @@
+import pytest
+from flask import Flask
+
+from app import extensions
+from app.extensions import db
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """In-memory Redis (with Lua) installed as ``extensions.redis_client``."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(extensions, "redis_client", client)
+    yield client
+    client.flushall()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Bare Flask app on a scratch SQLite file with every table created, context pushed."""
+    from app.models import (  # noqa: F401
+        billing_info, click_rollup, plan, short_code_sequence, subscription, subscription_history, url,
+        url_analytics, url_click_counter, user, user_deletion_history, webhook_events,
+    )
+    from app.services import click_partitions
+
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        SECRET_KEY="test",
+        GEOIP_REMOTE_FALLBACK=False,
+    )
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        click_partitions._forget()
+        yield flask_app
+        db.session.remove()
+    click_partitions._forget()
@@ -0,0 +1,42 @@
+import datetime
+
+from app.services.click_counters import click_fields, country_field
+
+
+def test_buckets_use_ist_calendar():
+    ts = datetime.datetime(2025, 1, 31, 20, 0)  # 01:30 IST on Feb 1
+    assert click_fields("qr", ts) == ["total", "source:qr", "day:2025-02-01", "hour:2025-02-01T01"]
+
+
+def test_country_field_defaults_to_unknown():
+    assert country_field(None) == "country:Unknown"
+    assert country_field("India") == "country:India"
+
+
+def test_unknown_sources_are_counted_as_direct():
+    ts = datetime.datetime(2025, 1, 31, 20, 0)
+    assert click_fields("x" * 200, ts)[1] == "source:direct"
+    assert click_fields(None, ts)[1] == "source:direct"
+
+
+def test_backfill_counts_each_stored_click_once(monkeypatch, app):
+    from app import extensions
+    from app.extensions import db
+    from app.services import click_counters, click_partitions
+
+    monkeypatch.setattr(extensions, "redis_client", None)
+    day = datetime.datetime(2025, 1, 10, 12, 0)
+    click_partitions.insert_rows([
+        {"url_id": 1, "source": "qr", "timestamp": day, "country": "India"},
+        {"url_id": 1, "source": "direct", "timestamp": day + datetime.timedelta(days=1), "country": None},
+        {"url_id": 2, "source": "direct", "timestamp": day + datetime.timedelta(days=5), "country": None},
+    ])
+    db.session.commit()
+
+    assert click_counters.backfill(day + datetime.timedelta(days=2)) == {"rows": 2, "links": 1}
+    assert click_counters.backfill(day + datetime.timedelta(days=2)) == {"rows": 0, "links": 0}
+    assert click_counters.backfill(day + datetime.timedelta(days=6)) == {"rows": 1, "links": 1}
+
+    counts = click_counters.get_counts([1, 2], ["total", "source:qr", "country:India", "country:Unknown"])
+    assert counts[1] == {"total": 2, "source:qr": 1, "country:India": 1, "country:Unknown": 1}
+    assert counts[2]["total"] == 1
@@ -0,0 +1,15 @@
+import datetime
+
+from app.services.click_partitions import PG_PARENT, next_month, partition_month, partition_name
+
+
+def test_partition_names_round_trip():
+    month = datetime.date(2025, 12, 1)
+    assert partition_name(month) == "url_analytics_p202512"
+    assert partition_month("url_analytics_p202512") == month
+    assert next_month(month) == datetime.date(2026, 1, 1)
+
+
+def test_non_partition_tables_are_ignored():
+    assert partition_month(PG_PARENT) is None
+    assert partition_month("url_analytics") is None
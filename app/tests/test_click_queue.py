@@ -0,0 +1,153 @@
+import datetime
+import time
+
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.services import click_partitions, click_queue
+
+STREAM = "clicks:stream"
+
+
+def _event(url_id=1, **extra):
+    return {"url_id": url_id, "user_agent": "Mozilla/5.0", "ip_address": "203.0.113.9", "source": "direct",
+            "timestamp": datetime.datetime.utcnow(), **extra}
+
+
+def _stored() -> int:
+    return sum(db.session.execute(select(func.count()).select_from(t)).scalar()
+               for t in click_partitions.read_tables())
+
+
+def _setup(monkeypatch, app, maxsize=10, **config):
+    app.config.update(CLICK_BATCH_SIZE=500, CLICK_FLUSH_INTERVAL=0.05, CLICK_STREAM_CLAIM_IDLE_MS=0, **config)
+    monkeypatch.setattr(click_queue, "ensure_compactor", lambda: None)
+    monkeypatch.setattr(click_queue, "_group_ready", False)
+    click_queue.init_click_queue(app)
+    monkeypatch.setattr(click_queue, "_queue", click_queue.queue.Queue(maxsize=maxsize))
+
+
+def test_full_queue_spills_to_the_stream_and_the_drain_stores_it(monkeypatch, app, redis):
+    _setup(monkeypatch, app, maxsize=1)
+    monkeypatch.setattr(click_queue, "ensure_writer", lambda: None)
+
+    assert click_queue.enqueue_click(_event())
+    assert click_queue.enqueue_click(_event(source="qr"))
+    assert redis.xlen(STREAM) == 1
+
+    assert click_queue._drain_stream() == 1
+    assert redis.xlen(STREAM) == 0
+    assert redis.xpending(STREAM, click_queue.STREAM_GROUP)["pending"] == 0
+    click_queue.flush()
+    assert _stored() == 2
+
+
+def test_rejected_rows_are_dead_lettered_and_the_rest_stored(monkeypatch, app, redis):
+    _setup(monkeypatch, app)
+    click_queue._push_to_stream([_event(), _event(url_id=None), _event()])
+
+    assert click_queue._drain_stream() == 3
+    assert _stored() == 2
+    assert redis.xpending(STREAM, click_queue.STREAM_GROUP)["pending"] == 0
+    dead = redis.xrange("clicks:dead")
+    assert len(dead) == 1 and '"url_id": null' in dead[0][1]["e"]
+
+
+def test_batch_stays_pending_while_the_database_is_down(monkeypatch, app, redis):
+    _setup(monkeypatch, app)
+    click_queue._push_to_stream([_event(), _event()])
+    write_rows, db_available = click_queue._write_rows, click_queue._db_available
+    monkeypatch.setattr(click_queue, "_write_rows", lambda rows: False)
+    monkeypatch.setattr(click_queue, "_db_available", lambda: False)
+
+    assert click_queue._drain_stream() == 0
+    assert redis.xpending(STREAM, click_queue.STREAM_GROUP)["pending"] == 2
+    assert not redis.exists("clicks:dead")
+
+    # DB back: the pending entries are reclaimed and stored
+    monkeypatch.setattr(click_queue, "_write_rows", write_rows)
+    monkeypatch.setattr(click_queue, "_db_available", db_available)
+    assert click_queue._drain_stream() == 2
+    assert _stored() == 2
+    assert redis.xpending(STREAM, click_queue.STREAM_GROUP)["pending"] == 0
+
+
+def test_writer_thread_stores_queued_clicks(monkeypatch, app, redis):
+    _setup(monkeypatch, app)
+    try:
+        for _ in range(3):
+            assert click_queue.enqueue_click(_event())
+        deadline = time.monotonic() + 5
+        while _stored() < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        click_queue.shutdown()
+    assert _stored() == 3
+    assert not click_queue._writer.is_alive()
+
+
+def test_click_events_only_carry_values_that_fit_their_columns():
+    from app.services.redirect_service import _click_event, client_ip
+
+    assert client_ip({"X-Forwarded-For": "x" * 80 + ", 10.0.0.1"}, "198.51.100.7") == "198.51.100.7"
+    assert client_ip({"X-Forwarded-For": "2001:db8::1, 10.0.0.1"}, "198.51.100.7") == "2001:db8::1"
+    event = _click_event(1, "ua", "203.0.113.9", "x" * 50)
+    assert event["source"] == "direct"
+    assert _click_event(1, "ua", "203.0.113.9", "qr")["source"] == "qr"
+
+
+def test_redirects_queue_raw_events_and_the_writer_enriches_them(monkeypatch, app):
+    from app.services import geoip, redirect_service
+
+    _setup(monkeypatch, app)
+    monkeypatch.setattr(click_queue, "ensure_writer", lambda: None)
+    monkeypatch.setattr(geoip, "_remote_fallback", False)
+    chrome = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+    assert redirect_service.record_click("abc1234", 1, chrome, "203.0.113.9", "qr")
+    queued = click_queue._queue.get_nowait()
+    assert "browser" not in queued and "country" not in queued
+
+    assert click_queue._store([queued]) == []
+    stored = [row for t in click_partitions.read_tables()
+              for row in db.session.execute(select(t.c.browser, t.c.country))]
+    assert stored == [("Chrome", "Unknown")]
+
+
+def test_without_redis_counters_are_written_with_the_clicks(monkeypatch, app):
+    from app import extensions
+    from app.services import click_counters, geoip
+
+    _setup(monkeypatch, app)
+    monkeypatch.setattr(extensions, "redis_client", None)
+    monkeypatch.setattr(geoip, "_remote_fallback", False)
+
+    # The bad row fails the batch insert; only the rows that are stored get counted
+    assert click_queue._store([_event(source="qr"), _event(url_id=None), _event()]) == []
+
+    assert _stored() == 2
+    counts = click_counters.get_counts([1], ["total", "source:qr", "source:direct", "country:Unknown"])
+    assert counts == {1: {"total": 2, "source:qr": 1, "source:direct": 1, "country:Unknown": 2}}
+
+
+def test_clicks_counted_by_the_redirect_script_are_stored(monkeypatch, app, redis):
+    from app.services import geoip, link_cache, redirect_service
+
+    _setup(monkeypatch, app)
+    monkeypatch.setattr(click_queue, "_writer", None)
+    monkeypatch.setattr(geoip, "_remote_fallback", False)
+    monkeypatch.setattr(redirect_service, "_scripts", {})
+    link_cache.set_payload("stored1", {"long": "https://example.com", "id": 1, "active_until": None})
+    try:
+        for n in range(3):
+            link = redirect_service.resolve_and_count("stored1", f"Mozilla/5.0 ({n})", "203.0.113.9", "qr")
+            assert link.status == redirect_service.LINK_OK
+        # Nothing was queued in-process: the script's clicks reach the DB only through the stream
+        assert click_queue.queue_depth() == 0
+        deadline = time.monotonic() + 5
+        while _stored() < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        click_queue.shutdown()
+    assert _stored() == 3
+    assert redis.xlen(STREAM) == 0
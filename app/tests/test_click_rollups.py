@@ -0,0 +1,28 @@
+import datetime
+
+from app.services.click_rollups import _dims, hour_start, ist_day
+
+
+def test_buckets_are_ist():
+    ts = datetime.datetime(2025, 1, 31, 20, 45)  # 02:15 IST on Feb 1
+    assert hour_start(ts) == datetime.datetime(2025, 2, 1, 2, 0)
+    assert ist_day(ts) == datetime.date(2025, 2, 1)
+
+
+def test_missing_dimensions_are_normalised():
+    assert _dims(None, None, "Chrome", None) == ("direct", "Unknown", "Chrome", "Unknown")
+
+
+def test_shutdown_stops_the_compactor(monkeypatch, app):
+    from app.services import click_rollups
+
+    app.config["ROLLUP_INTERVAL"] = 3600
+    monkeypatch.setattr(click_rollups, "_app", app)
+    monkeypatch.setattr(click_rollups, "_compactor", None)
+
+    click_rollups.ensure_compactor()
+    compactor = click_rollups._compactor
+    assert compactor.is_alive()
+
+    click_rollups.shutdown()
+    assert not compactor.is_alive()
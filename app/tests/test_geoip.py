@@ -0,0 +1,114 @@
+import logging
+import os
+
+from flask import Flask
+
+from app.services import geoip
+from app.services.geoip import GeoIPDatabase, build_database
+
+
+CSV = """start,end,country,region,city
+1.0.0.0,1.0.0.255,Australia,Queensland,Brisbane
+8.8.8.0,8.8.8.255,United States,California,Mountain View
+16843008,16843263,China,Fujian,Fuzhou
+2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,United States,California,Mountain View
+103.21.244.0/22,India,Karnataka,Bengaluru
+"""
+
+
+def _write_csv(tmp_path):
+    src = tmp_path / "ranges.csv"
+    src.write_text(CSV)
+    return src
+
+
+def _build(tmp_path):
+    out = tmp_path / "geoip.bin"
+    stats = build_database(str(_write_csv(tmp_path)), str(out))
+    return GeoIPDatabase(str(out)), stats
+
+
+def test_build_counts(tmp_path):
+    database, stats = _build(tmp_path)
+    assert stats == {"ipv4": 4, "ipv6": 1, "locations": 4, "skipped": 1}
+    assert len(database) == 5
+
+
+def test_lookup_ipv4_ranges(tmp_path):
+    database, _ = _build(tmp_path)
+    assert database.lookup("8.8.8.8")["city"] == "Mountain View"
+    assert database.lookup("1.0.0.0")["country"] == "Australia"
+    assert database.lookup("1.0.0.255")["country"] == "Australia"
+    assert database.lookup("1.1.1.1")["country"] == "China"
+    assert database.lookup("103.21.247.10")["region"] == "Karnataka"
+
+
+def test_lookup_ipv6_and_mapped(tmp_path):
+    database, _ = _build(tmp_path)
+    assert database.lookup("2001:4860:4860::8888")["country"] == "United States"
+    assert database.lookup("::ffff:8.8.8.8")["city"] == "Mountain View"
+
+
+def test_lookup_miss(tmp_path):
+    database, _ = _build(tmp_path)
+    assert database.lookup("9.9.9.9") is None
+    assert database.lookup("0.0.0.1") is None
+    assert database.lookup("2400:cb00::1") is None
+    assert database.lookup("not-an-ip") is None
+
+
+def test_table_file_is_checked_once_per_interval_and_replaced_maps_are_closed(monkeypatch, tmp_path):
+    monkeypatch.setattr(geoip, "init_geo_cache", lambda app: None)
+    for name in ("_db_path", "_remote_fallback", "_database", "_database_mtime", "_retired", "_last_check"):
+        monkeypatch.setattr(geoip, name, getattr(geoip, name))
+    path = tmp_path / "geoip.bin"
+    geoip.init_geoip(Flask(__name__, instance_path=str(tmp_path)))
+    stats = []
+    real_stat = os.stat
+    monkeypatch.setattr(os, "stat", lambda p, **kw: (p == str(path) and stats.append(p)) or real_stat(p, **kw))
+    clock = [1000.0]
+    monkeypatch.setattr(geoip.time, "monotonic", lambda: clock[0])
+
+    # No table installed: one stat per interval, not one per lookup
+    assert geoip.get_database() is None
+    assert geoip.get_database() is None
+    assert len(stats) == 1
+
+    build_database(str(_write_csv(tmp_path)), str(path))
+    clock[0] += geoip._RELOAD_CHECK_SECONDS
+    first = geoip.get_database()
+    assert first.lookup("8.8.8.8")["country"] == "United States"
+
+    os.utime(path, (1, 1))
+    clock[0] += geoip._RELOAD_CHECK_SECONDS
+    second = geoip.get_database()
+    assert second is not first
+    # The replaced map stays open for lookups already holding it ...
+    assert first.lookup("8.8.8.8") is not None
+
+    os.remove(path)
+    clock[0] += geoip._RELOAD_CHECK_SECONDS
+    assert geoip.get_database() is None
+    # ... until the next swap
+    assert first._mm.closed and not second._mm.closed
+    assert len(stats) == 4
+
+
+
+def test_startup_warns_when_clicks_would_have_no_location(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(geoip, "init_geo_cache", lambda app: None)
+    for name in ("_db_path", "_remote_fallback", "_database", "_database_mtime", "_last_check"):
+        monkeypatch.setattr(geoip, name, getattr(geoip, name))
+    app = Flask(__name__, instance_path=str(tmp_path))
+
+    with caplog.at_level(logging.WARNING, logger=geoip.__name__):
+        geoip.init_geoip(app)
+        assert "No Geo-IP table" in caplog.text
+
+        caplog.clear()
+        app.config["GEOIP_REMOTE_FALLBACK"] = True
+        geoip.init_geoip(app)
+        app.config["GEOIP_REMOTE_FALLBACK"] = False
+        _build(tmp_path)
+        geoip.init_geoip(app)
+        assert caplog.text == ""
@@ -0,0 +1,130 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from app.extensions import db
+from app.models.url import Urls
+from app.models.user import User
+from app.services import link_cache
+
+
+def test_load_coalesces_concurrent_misses():
+    calls = []
+
+    def loader(code):
+        calls.append(code)
+        time.sleep(0.05)
+        return {"long": "https://example.com", "id": 1, "active_until": None}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(link_cache.load("coalesce1", loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == ["coalesce1"]
+    assert len(results) == 8
+    assert all(r["long"] == "https://example.com" for r in results)
+    assert not link_cache.is_stale(results[0])
+
+
+def test_unknown_code_is_cached_as_missing():
+    payload = link_cache.load("coalesce2", lambda code: None)
+    assert link_cache.is_missing(payload)
+    assert link_cache.is_missing(link_cache.get_payload("coalesce2"))
+
+
+def test_is_stale_after_soft_expiry():
+    payload = {"long": "https://example.com", "soft_exp": 100}
+    assert link_cache.is_stale(payload, now=101)
+    assert not link_cache.is_stale(payload, now=99)
+    assert not link_cache.is_stale({"long": "https://example.com"})
+
+
+def _link(short="wt1", plan_name="FREE", cancellation_date=None):
+    url_entry = SimpleNamespace(short=short, long="https://example.com/new", id_=7, plan_name=plan_name,
+                                redirect_policy=None, redirect_max_age=None)
+    return url_entry, SimpleNamespace(cancellation_date=cancellation_date)
+
+
+def _published(pubsub) -> list:
+    # The (ignored) subscribe confirmation still costs one get_message call
+    messages = [pubsub.get_message(timeout=0.1) for _ in range(3)]
+    return [m["data"] for m in messages if m]
+
+
+def test_write_through_replaces_a_missing_entry_and_tells_other_workers(redis):
+    link_cache.set_missing("wt1")
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(link_cache.INVALIDATION_CHANNEL)
+
+    link_cache.write_through(*_link())
+
+    cached = link_cache.remember("wt1", redis.get(link_cache.cache_key("wt1")))
+    assert cached["long"] == "https://example.com/new" and cached["id"] == 7
+    assert cached["redirect"] == "temporary" and cached["active_until"] is None
+    assert 0 < redis.ttl(link_cache.cache_key("wt1")) <= 3600 + 300
+    assert link_cache.peek("wt1")["long"] == "https://example.com/new"
+    assert _published(pubsub) == ['["wt1"]']
+
+
+def test_write_through_skips_links_without_a_short_code(redis):
+    link_cache.write_through(*_link(short=None))
+    assert redis.keys("short:*") == []
+
+
+def _owner_with_links(*shorts):
+    owner = User(firstname="T", lastname="T", organization="T", phone="0", email="owner@test.local", password="x")
+    db.session.add(owner)
+    db.session.flush()
+    db.session.add_all([Urls(short=short, long="https://example.com", user_id=owner.id) for short in shorts])
+    db.session.commit()
+    return owner
+
+
+def test_owner_links_are_dropped_only_once_the_change_commits(app, redis):
+    owner = _owner_with_links("own1", "own2")
+    for short in ("own1", "own2"):
+        link_cache.set_payload(short, {"long": "https://example.com", "id": 1, "active_until": None})
+
+    link_cache.invalidate_user_links(owner.id)
+    db.session.rollback()
+    assert redis.exists(link_cache.cache_key("own1"), link_cache.cache_key("own2")) == 2
+
+    link_cache.invalidate_user_links(owner.id)
+    assert redis.exists(link_cache.cache_key("own1")) == 1  # nothing happens before the commit
+    db.session.commit()
+    assert redis.exists(link_cache.cache_key("own1"), link_cache.cache_key("own2")) == 0
+    assert link_cache.peek("own1") is None
+
+
+def test_invalidation_evicts_the_l1_copy_of_other_workers(monkeypatch, redis):
+    monkeypatch.setattr(link_cache, "_subscriber", None)
+    link_cache.ensure_subscriber()
+    deadline = time.monotonic() + 2
+    while not redis.pubsub_numsub(link_cache.INVALIDATION_CHANNEL)[0][1] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    payload = {"long": "https://example.com", "id": 3, "active_until": None}
+    link_cache._l1.set("sub1", payload)
+    link_cache._l1.set("sub2", payload)
+    # Another worker invalidates sub1
+    redis.publish(link_cache.INVALIDATION_CHANNEL, '["sub1"]')
+
+    while link_cache.peek("sub1") is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert link_cache.peek("sub1") is None
+    assert link_cache.peek("sub2") == payload
+
+
+def test_missing_entry_never_overwrites_a_cached_link(redis):
+    link_cache.set_payload("neg1", {"long": "https://example.com", "id": 4, "active_until": None})
+    link_cache._l1.clear()
+
+    link_cache.set_missing("neg1")  # e.g. a lookup that raced the link's creation
+    assert link_cache.remember("neg1", redis.get(link_cache.cache_key("neg1")))["id"] == 4
+
+    link_cache.set_missing("neg2")
+    assert link_cache.is_missing(link_cache.remember("neg2", redis.get(link_cache.cache_key("neg2"))))
+    assert 0 < redis.ttl(link_cache.cache_key("neg2")) <= 60
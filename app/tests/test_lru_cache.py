@@ -0,0 +1,33 @@
+import time
+
+from app.utils.lru_cache import MISSING, TTLCache
+
+
+def test_lru_eviction_order():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entry_expiry():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", "x", ttl=0.01)
+    cache.set("long", "y")
+    time.sleep(0.02)
+    assert cache.get("short") is MISSING
+    assert cache.get("long") == "y"
+
+
+def test_hit_rate():
+    cache = TTLCache(maxsize=10)
+    cache.set("k", None)
+    assert cache.get("k") is None
+    assert cache.get("other", "fallback") == "fallback"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
@@ -0,0 +1,63 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from app.utils import metrics
+
+
+def test_worker_snapshots_add_up_in_the_exposition(monkeypatch):
+    monkeypatch.setattr(metrics, "_dir", None)
+    worker = {
+        "counters": [["link_cache_redis_total", [["result", "hit"]], 3]],
+        "gauges": [],
+        "histograms": [["qr_render_seconds", [["style", "dots"]], [0] * 6 + [2] + [0] * 6 + [0.1, 2]]],
+    }
+    counters, _, histograms = metrics.aggregate([worker, worker])
+    assert counters[("link_cache_redis_total", (("result", "hit"),))] == 6
+    assert histograms[("qr_render_seconds", (("style", "dots"),))][-1] == 4
+
+    metrics.inc("link_cache_redis_total", result="test")
+    metrics.observe("qr_render_seconds", 0.03, style="test")
+    text = metrics.render()
+    assert 'link_cache_redis_total{result="test"} 1' in text
+    assert 'qr_render_seconds_bucket{style="test",le="0.025"} 0' in text
+    assert 'qr_render_seconds_bucket{style="test",le="0.05"} 1' in text
+    assert 'qr_render_seconds_count{style="test"} 1' in text
+
+
+def _value(name: str) -> float:
+    lines = [line for line in metrics.render().splitlines() if line.startswith(name + " ")]
+    return float(lines[0].split()[1]) if lines else 0.0
+
+
+def test_statement_metrics_come_from_the_timing_hooks(monkeypatch, tmp_path):
+    for name in ("_dir", "_interval", "_stale_after"):
+        monkeypatch.setattr(metrics, name, getattr(metrics, name))
+    metrics.init_metrics(Flask(__name__, instance_path=str(tmp_path)))
+    before = _value("db_queries_total"), _value("db_query_duration_seconds_count")
+
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+        assert conn.info["timing_started"] == []
+        assert "metrics_started" not in conn.info
+
+    assert _value("db_queries_total") == before[0] + 2
+    assert _value("db_query_duration_seconds_count") == before[1] + 2
+
+
+def test_metrics_endpoint_needs_a_configured_token(tmp_path):
+    from app.routes.core_routes import core_bp
+
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.register_blueprint(core_bp)
+    client = app.test_client()
+
+    assert client.get("/metrics").status_code == 404
+    app.config["METRICS_TOKEN"] = "scrape"
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape"}).status_code == 200
@@ -0,0 +1,30 @@
+import threading
+import time
+
+from app.utils.profiler import Sampler
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sampler_collapses_the_stacks_of_one_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,))
+    worker.start()
+    try:
+        sampler = Sampler(0.001, worker.ident).start()
+        time.sleep(0.1)
+        sampler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert sampler.samples > 0
+    lines = sampler.collapsed().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    frames = stack.split(";")
+    assert frames[0].startswith("_bootstrap ")
+    assert any(frame.startswith("_spin (tests/test_profiler.py:") for frame in frames)
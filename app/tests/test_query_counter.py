@@ -0,0 +1,28 @@
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.utils.query_counter import assert_max_queries, repeated, shape
+
+
+def test_loop_iterations_share_a_shape():
+    assert shape("SELECT * FROM urls WHERE id_ = 7") == shape("SELECT *  FROM urls\nWHERE id_ = 12")
+    assert shape("SELECT * FROM t WHERE name = 'a''b'") == "SELECT * FROM t WHERE name = ?"
+    statements = Counter({"SELECT count(*) FROM url_analytics WHERE url_id = 1": 1,
+                          "SELECT count(*) FROM url_analytics WHERE url_id = 2": 5,
+                          "SELECT * FROM users": 1})
+    assert repeated(statements, 5) == [("SELECT count(*) FROM url_analytics WHERE url_id = ?", 6)]
+
+
+def test_assert_max_queries_lists_the_statements():
+    engine = create_engine("sqlite://")
+    with assert_max_queries(3, engine) as log, engine.connect() as conn:
+        for i in range(3):
+            conn.execute(text("SELECT :i"), {"i": i})
+    assert log.count == 3
+
+    with pytest.raises(AssertionError, match=r"4 queries, expected at most 3:\n  4 x SELECT \?"):
+        with assert_max_queries(3, engine), engine.connect() as conn:
+            for i in range(4):
+                conn.execute(text("SELECT :i"), {"i": i})
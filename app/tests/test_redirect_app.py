@@ -0,0 +1,22 @@
+from flask import Flask
+
+from app.redirect_app import RedirectDispatcher
+
+
+def test_only_short_codes_take_the_fast_path():
+    app = Flask(__name__)
+    app.add_url_rule("/login", "login", lambda: "")
+    app.add_url_rule("/home/", "home", lambda: "")
+    app.add_url_rule("/analytics/<code>", "analytics", lambda code: "")
+    dispatcher = RedirectDispatcher(app, app.wsgi_app)
+
+    def code(path, method="GET", **extra):
+        return dispatcher.short_code({"REQUEST_METHOD": method, "PATH_INFO": path, **extra})
+
+    assert code("/abc1234") == "abc1234"
+    assert code("/abc1234", method="HEAD") == "abc1234"
+    assert code("/caf\xc3\xa9") == "café"
+    for path in ("/", "/login", "/home", "/home/", "/static/x.png", "/analytics/abc1234", "/abc1234/"):
+        assert code(path) is None, path
+    assert code("/abc1234", method="POST") is None
+    assert code("/abc1234", HTTP_ORIGIN="https://example.com") is None
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+from flask import Flask, request
+from sqlalchemy import func, select
+
+from app import extensions
+from app.extensions import db
+from app.redirect_asgi import RedirectASGI
+from app.services import click_partitions, click_queue, geoip, link_cache, redirect_service
+
+
+def test_non_redirects_are_served_by_flask():
+    app = Flask(__name__)
+    app.add_url_rule("/echo", "echo", lambda: {"body": request.get_data(as_text=True), "q": request.args["q"]},
+                     methods=["POST"])
+    asgi = RedirectASGI(app)
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"hello", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/echo", "query_string": b"q=1",
+             "headers": [(b"content-type", b"text/plain")], "client": ("127.0.0.1", 1), "server": ("x", 80)}
+    asyncio.run(asgi(scope, receive, send))
+
+    assert sent[0]["status"] == 200
+    assert sent[1]["body"] == b'{"body":"hello","q":"1"}\n'
+    assert asgi.short_code({"method": "GET", "path": "/echo"}, {}) is None
+    assert asgi.short_code({"method": "GET", "path": "/abc1234"}, {}) == "abc1234"
+
+
+class _SyncRedisOnTheLoop:
+    def __getattr__(self, name):
+        raise AssertionError(f"sync Redis call on the event loop: {name}")
+
+
+def test_stale_payload_is_refreshed_without_sync_redis(monkeypatch, app):
+    fakeredis = pytest.importorskip("fakeredis")
+    asgi = RedirectASGI(app)
+    asgi.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(extensions, "redis_client", _SyncRedisOnTheLoop())
+    started = []
+    monkeypatch.setattr(link_cache, "start_refresh", lambda code, loader, token: started.append((code, token)))
+    link_cache._l1.set("asgi1", {"long": "https://example.com", "id": 1, "active_until": None, "soft_exp": 1})
+
+    async def resolve_twice():
+        first = await asgi.resolve_link("asgi1")
+        second = await asgi.resolve_link("asgi1")
+        return first, second, await asgi.redis.get(link_cache.lock_key("asgi1"))
+
+    try:
+        first, second, lock = asyncio.run(resolve_twice())
+    finally:
+        link_cache._refreshing.discard("asgi1")
+
+    assert first.long_url == second.long_url == "https://example.com"
+    # One refresh per process, under a lock taken through the async client
+    assert started == [("asgi1", lock)] and lock
+
+
+def test_clicks_counted_over_asgi_are_stored(monkeypatch, app):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(extensions, "redis_client", fakeredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(link_cache, "_subscriber", None)
+    monkeypatch.setattr(redirect_service, "_scripts", {})
+    monkeypatch.setattr(geoip, "_remote_fallback", False)
+    monkeypatch.setattr(click_queue, "ensure_compactor", lambda: None)
+    monkeypatch.setattr(click_queue, "_group_ready", False)
+    monkeypatch.setattr(click_queue, "_writer", None)
+    app.config.update(CLICK_FLUSH_INTERVAL=0.05)
+    click_queue.init_click_queue(app)
+
+    asgi = RedirectASGI(app)
+    asgi.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    link_cache.set_payload("asgi2", {"long": "https://example.com", "id": 1, "active_until": None})
+
+    def stored() -> int:
+        return sum(db.session.execute(select(func.count()).select_from(t)).scalar()
+                   for t in click_partitions.read_tables())
+
+    try:
+        link = asyncio.run(asgi.resolve_and_count("asgi2", "Mozilla/5.0", "203.0.113.9", "qr"))
+        assert link.status == redirect_service.LINK_OK
+        deadline = time.monotonic() + 5
+        while stored() < 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        click_queue.shutdown()
+    assert stored() == 1
@@ -0,0 +1,27 @@
+from flask import Flask
+
+from app.services.redirect_service import LinkLookup, redirect_caching
+
+
+def _link(policy, max_age=None, active_until=None):
+    return LinkLookup(0, "https://example.com", 1, "redis", policy, max_age, active_until)
+
+
+def test_redirect_caching_per_policy():
+    app = Flask(__name__)
+    app.config.update(LINK_CACHED_MAX_AGE=300, LINK_PERMANENT_MAX_AGE=86400)
+    with app.app_context():
+        assert redirect_caching(_link("temporary")) == (302, {"Cache-Control": "private, no-store"})
+
+        code, headers = redirect_caching(_link("cached"), now=1000)
+        assert code == 302 and headers["Cache-Control"] == "public, max-age=300"
+
+        code, headers = redirect_caching(_link("permanent", max_age=60), now=1000)
+        assert code == 301 and headers["Cache-Control"] == "public, max-age=60"
+        assert "Expires" in headers
+
+        # Never cached past the end of a grace period
+        code, headers = redirect_caching(_link("permanent", active_until=1010), now=1000)
+        assert headers["Cache-Control"] == "public, max-age=10"
+        assert redirect_caching(_link("cached", active_until=900), now=1000)[0] == 302
+        assert redirect_caching(_link("cached", active_until=900), now=1000)[1]["Cache-Control"] == "private, no-store"
@@ -0,0 +1,82 @@
+import json
+import time
+
+import pytest
+
+from app.services import click_counters, link_cache, redirect_service
+
+STREAM = "clicks:stream"
+
+
+@pytest.fixture
+def script(monkeypatch, app, redis):
+    # Registered scripts are keyed by client id(), which a new fake client may reuse
+    monkeypatch.setattr(redirect_service, "_scripts", {})
+
+    def run(code, user_agent="Mozilla/5.0", ip_address="203.0.113.9", source="qr"):
+        keys, args = redirect_service.redirect_script_call(code, user_agent, ip_address, source)
+        return redirect_service.redirect_script(redis)(keys=keys, args=args)
+    return run
+
+
+def _cache(redis, code, **payload):
+    redis.set(link_cache.cache_key(code), json.dumps({"long": "https://example.com", "id": 5, **payload}))
+
+
+def test_uncached_and_legacy_payloads_fall_back_to_the_database(script, redis):
+    assert script("lua0") == [0]
+    _cache(redis, "lua0")  # written before payloads carried active_until
+    assert script("lua0") == [0]
+    assert redis.xlen(STREAM) == 0
+
+
+def test_hit_counts_the_click_and_streams_the_event(script, redis):
+    _cache(redis, "lua1", active_until=None)
+
+    found, raw, counted = script("lua1", source="qr")
+
+    assert (found, counted) == (1, 1)
+    assert json.loads(raw)["long"] == "https://example.com"
+    counters = redis.hgetall(click_counters.counter_key(5))
+    assert counters == dict.fromkeys(click_counters.click_fields("qr"), "1")
+    assert redis.smembers(click_counters.DIRTY_SET) == {"5"}
+
+    [(_, fields)] = redis.xrange(STREAM)
+    event = json.loads(fields["e"])
+    assert event["url_id"] == 5
+    assert event["user_agent"] == "Mozilla/5.0" and event["ip_address"] == "203.0.113.9"
+    assert event["source"] == "qr" and event["timestamp"]
+    assert "browser" not in event
+
+
+def test_repeat_click_is_debounced(script, redis):
+    _cache(redis, "lua2", active_until=None)
+
+    assert script("lua2")[2] == 1
+    assert script("lua2")[2] == 0
+    assert script("lua2", user_agent="Other/1.0")[2] == 1
+
+    assert redis.hget(click_counters.counter_key(5), "total") == "2"
+    assert redis.xlen(STREAM) == 2
+
+
+def test_missing_and_expired_links_resolve_without_counting(script, redis):
+    redis.set(link_cache.cache_key("lua3"), json.dumps({"missing": True}))
+    _cache(redis, "lua4", active_until=time.time() - 10)
+
+    missing, expired = script("lua3"), script("lua4")
+
+    assert missing[0] == 1 and missing[2] == 0 and json.loads(missing[1]) == {"missing": True}
+    assert expired[0] == 1 and expired[2] == 0
+    assert redirect_service.script_lookup("lua4", expired).status == redirect_service.LINK_EXPIRED
+    assert not redis.exists(click_counters.counter_key(5), click_counters.DIRTY_SET, STREAM)
+
+
+def test_unknown_sources_are_counted_as_direct(script, redis):
+    _cache(redis, "lua5", active_until=None)
+
+    assert script("lua5", source="utm_" + "x" * 200)[2] == 1
+
+    assert set(redis.hkeys(click_counters.counter_key(5))) == set(click_counters.click_fields("direct"))
+    [(_, fields)] = redis.xrange(STREAM)
+    assert json.loads(fields["e"])["source"] == "direct"
@@ -0,0 +1,42 @@
+from app.utils.short_code import CODE_LENGTH, MAX_ID, decode, encode, permute, unpermute
+
+
+def test_permutation_round_trips():
+    for n in (0, 1, 2, 12345, MAX_ID):
+        assert unpermute(permute(n, "secret"), "secret") == n
+
+
+def test_codes_are_unique_fixed_length_and_keyed():
+    codes = [encode(n, "secret") for n in range(1, 5001)]
+    assert len(set(codes)) == len(codes)
+    assert all(len(c) == CODE_LENGTH and c.isalnum() for c in codes)
+    assert encode(1, "secret") != encode(1, "other")
+
+
+def test_decode_inverts_encode_and_rejects_other_codes():
+    for n in (1, 12345, MAX_ID):
+        assert decode(encode(n, "secret"), "secret") == n
+    assert decode("abc", "secret") is None
+    assert decode("zzzzzzz", "secret") is None  # above 2**40
+    assert decode("abc-123", "secret") is None
+
+
+def test_allocator_skips_taken_codes_and_custom_slugs_cannot_take_its_codes(monkeypatch, app):
+    from app.extensions import db
+    from app.models.url import Urls
+    from app.services import short_codes
+
+    app.config["SHORT_CODE_BLOCK_SIZE"] = 3
+    monkeypatch.setattr(short_codes, "_codes", [])
+    monkeypatch.setattr(short_codes, "_pid", None)
+    # A link from before the allocator that happens to hold the first generated code
+    legacy = encode(1, "test")
+    db.session.add(Urls(short=legacy, long="https://example.com", user_id=1))
+    db.session.commit()
+
+    issued = [short_codes.allocate() for _ in range(3)]
+    assert legacy not in issued and len(set(issued)) == 3
+
+    assert short_codes.is_generated(short_codes._codes[-1])  # still waiting in the block
+    assert not short_codes.is_generated("mybrand")  # 7 characters, outside the generated space
+    assert not short_codes.is_generated("mybrand2024")
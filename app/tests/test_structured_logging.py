@@ -0,0 +1,24 @@
+import json
+import logging
+import os
+
+from app.utils.structured_logging import JsonFormatter, NonBlockingQueueHandler
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(logging.NullHandler(), maxsize=1)
+    handler._listener_pid = os.getpid()  # no writer thread draining the queue
+    logger = logging.getLogger("test.structured_logging")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("clicks for %s", "abc", extra={"short_code": "abc"})
+        logger.warning("second")
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.dropped == 1
+    record = json.loads(JsonFormatter().format(handler.queue.get_nowait()))
+    assert record["msg"] == "clicks for abc"
+    assert record["short_code"] == "abc"
+    assert record["level"] == "WARNING"
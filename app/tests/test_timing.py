@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.utils import timing
+
+
+def test_phases_accumulate_into_server_timing():
+    token = timing.begin()
+    try:
+        with timing.phase("cache"):
+            pass
+        with timing.phase("cache"):
+            pass
+        timing.timed("db")(lambda: None)()
+        value = timing.report(timing.current(), budget_ms=None, what="GET /x")
+    finally:
+        timing.end(token)
+
+    names = [part.split(";")[0] for part in value.split(", ")]
+    assert names == ["cache", "db", "total"]
+    assert timing.current() is None
+
+
+def test_phase_is_a_no_op_outside_a_request():
+    with timing.phase("cache"):
+        pass
+    assert timing.current() is None
+
+
+def test_failed_statements_do_not_leave_start_times_behind():
+    timing._listen_for_sql()
+    engine = create_engine("sqlite://")
+    token = timing.begin()
+    try:
+        with engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(Exception):
+                    conn.execute(text("SELECT * FROM no_such_table"))
+            conn.execute(text("SELECT 1"))
+            assert conn.info["timing_started"] == []
+    finally:
+        timing.end(token)
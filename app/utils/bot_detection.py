@@ -0,0 +1,20 @@
+import re
+
+# Link-preview crawlers, unfurlers and scanners that must not be counted as clicks
+BOT_KEYWORDS = [
+    "bot", "crawler", "spider", "preview", "fetch", "scan",
+    "safelinks", "teams", "outlook", "skype", "microsoft office",
+    "linkexpander", "slackbot", "discordbot", "whatsapp", "facebook",
+    "twitterbot", "google-read-aloud"
+]
+
+# One alternation instead of a substring scan per keyword; longest first so
+# the regex engine settles on the most specific match.
+_BOT_PATTERN = re.compile(
+    "|".join(re.escape(k) for k in sorted(BOT_KEYWORDS, key=len, reverse=True)),
+    re.IGNORECASE,
+)
+
+
+def is_bot(user_agent: str | None) -> bool:
+    return bool(user_agent) and _BOT_PATTERN.search(user_agent) is not None
@@ -0,0 +1,265 @@
+"""
+In-process metrics, exposed at /metrics in the Prometheus text format.
+
+    metrics.inc("link_cache_redis_total", result="hit")
+    metrics.observe("qr_render_seconds", 0.08, style="dots")
+
+Updates are a dict write under a lock. Every worker process snapshots its
+values to ``METRICS_DIR/<pid>.json`` in the background; /metrics adds up
+the snapshots of all workers (its own values live), so any worker can be
+scraped for the whole host.
+
+Snapshots of workers that stopped more than ``METRICS_STALE_SECONDS`` ago
+are dropped, which Prometheus sees as a counter reset.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Request latency by endpoint.", LATENCY_BUCKETS),
+    "link_cache_redis_total": ("counter", "Redis lookups of short: keys by result (hit, miss, error).", None),
+    "link_cache_l1_total": ("counter", "In-process L1 lookups of short links by result (hit, miss).", None),
+    "db_queries_total": ("counter", "SQL statements executed.", None),
+    "db_query_duration_seconds": ("histogram", "SQL statement latency.", LATENCY_BUCKETS),
+    "click_queue_depth": ("gauge", "Click events waiting in the in-process queue.", None),
+    "qr_render_seconds": ("histogram", "QR image render time by style.", LATENCY_BUCKETS),
+    "webhook_processing_seconds": ("histogram", "Webhook processing latency by event type.", LATENCY_BUCKETS),
+    "log_records_dropped_total": ("counter", "Log records dropped because the log queue was full.", None),
+}
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> float
+_gauges = {}        # (name, labels) -> float
+_histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+_collectors = []    # callables run before a snapshot, e.g. to read gauges
+
+_dir = None
+_interval = 5.0
+_stale_after = 3600.0
+_writer = None
+_writer_pid = None
+_db_events = False
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_writer()
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def set_counter(name: str, value: float, **labels):
+    """For collectors reading a counter kept elsewhere (e.g. cache stats)."""
+    with _lock:
+        _counters[_key(name, labels)] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if seconds <= bound:
+                series[i] += 1
+                break
+        series[-2] += seconds
+        series[-1] += 1
+    _ensure_writer()
+
+
+@contextmanager
+def timer(name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def register_collector(fn):
+    """``fn()`` runs before every snapshot (set gauges there)."""
+    if fn not in _collectors:
+        _collectors.append(fn)
+
+
+# -----------------------------
+# Snapshots and aggregation
+# -----------------------------
+def snapshot() -> dict:
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception as exc:
+            logger.warning("Metrics collector %s failed: %s", getattr(collect, "__name__", collect), exc)
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": [[n, list(l), v] for (n, l), v in _counters.items()],
+            "gauges": [[n, list(l), v] for (n, l), v in _gauges.items()],
+            "histograms": [[n, list(l), list(s)] for (n, l), s in _histograms.items()],
+        }
+
+
+def _write_snapshot():
+    if not _dir:
+        return
+    os.makedirs(_dir, exist_ok=True)
+    path = os.path.join(_dir, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _peer_snapshots() -> list:
+    """Snapshots written by the other live (or recently stopped) workers."""
+    if not _dir or not os.path.isdir(_dir):
+        return []
+    own = f"{os.getpid()}.json"
+    now = time.time()
+    snapshots = []
+    for name in os.listdir(_dir):
+        if not name.endswith(".json") or name == own:
+            continue
+        path = os.path.join(_dir, name)
+        try:
+            age = now - os.path.getmtime(path)
+            if age > _stale_after:
+                os.remove(path)
+                continue
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        # A worker that stopped writing no longer has a queue
+        if age > 3 * _interval:
+            data["gauges"] = []
+        snapshots.append(data)
+    return snapshots
+
+
+def aggregate(snapshots: list) -> tuple[dict, dict, dict]:
+    counters, gauges, histograms = {}, {}, {}
+    for data in snapshots:
+        for name, labels, value in data.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in data.get("gauges", []):
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, series in data.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.get(key)
+            histograms[key] = list(series) if total is None else [a + b for a, b in zip(total, series)]
+    return counters, gauges, histograms
+
+
+def _labels(labels, extra: tuple = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render() -> str:
+    """Prometheus text exposition of every worker's metrics."""
+    counters, gauges, histograms = aggregate([snapshot(), *_peer_snapshots()])
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), series in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, series):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {series[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+        else:
+            for (metric, labels), value in sorted((counters if kind == "counter" else gauges).items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Background snapshot writer
+# -----------------------------
+def _ensure_writer():
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _dir is None or (_writer is not None and _writer_pid == pid and _writer.is_alive()):
+        return
+    with _lock:
+        if _writer is not None and _writer_pid == pid and _writer.is_alive():
+            return
+        _writer = threading.Thread(target=_run_writer, name="metrics-writer", daemon=True)
+        _writer_pid = pid
+        _writer.start()
+
+
+def _run_writer():
+    while True:
+        time.sleep(_interval)
+        try:
+            _write_snapshot()
+        except Exception as exc:
+            logger.warning("Metrics snapshot failed: %s", exc)
+
+
+# -----------------------------
+# SQL statements
+# -----------------------------
+def _observe_statement(conn, statement, seconds):
+    inc("db_queries_total")
+    observe("db_query_duration_seconds", seconds)
+
+
+def init_metrics(app):
+    global _dir, _interval, _stale_after, _db_events
+    _dir = app.config.get("METRICS_DIR") or os.path.join(app.instance_path, "metrics")
+    _interval = float(app.config.get("METRICS_FLUSH_INTERVAL", 5))
+    _stale_after = float(app.config.get("METRICS_STALE_SECONDS", 3600))
+    if not _db_events:
+        # Statement timings come from timing's engine hooks
+        timing.add_statement_observer(_observe_statement)
+        _db_events = True
+
+    # Request latency from the start recorded by init_timing
+    @app.after_request
+    def _observe_request(response):
+        timings = timing.current()
+        if timings is not None:
+            observe("http_request_duration_seconds", time.perf_counter() - timings.started,
+                    endpoint=request.endpoint or "unmatched", method=request.method, status=response.status_code)
+        return response
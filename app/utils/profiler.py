@@ -0,0 +1,146 @@
+"""
+On-demand statistical profiler for a running worker.
+
+A daemon thread wakes every ``PROFILE_INTERVAL_MS``, reads the stacks of
+the other threads from ``sys._current_frames()`` and counts them. The
+result is collapsed stacks, one ``outer;...;inner count`` line per stack,
+as read by flamegraph.pl, speedscope and inferno.
+
+Two ways in (both need ``ADMIN_TOKEN``, see admin_routes):
+
+* ``POST /admin/profile?seconds=N``: samples every thread of the worker
+  that answers, for N seconds, and returns the stacks.
+* any request with ``X-Profile: <ADMIN_TOKEN>``: samples only that
+  request's thread; the stacks are saved under ``PROFILE_DIR`` and the
+  file name comes back in the ``X-Profile`` response header.
+
+Sampling reads wall-clock stacks: a thread waiting on Redis or the DB shows
+up in the wait. One capture runs at a time per worker.
+"""
+import collections
+import datetime
+import os
+import re
+import sys
+import threading
+
+from flask import current_app
+
+_busy = threading.Lock()
+
+_NAME = re.compile(r"^[\w.-]+\.folded$")
+
+
+class Sampler:
+    def __init__(self, interval: float, thread_id: int | None = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(own)
+
+    def sample(self, own: int):
+        frames = sys._current_frames()
+        if self.thread_id is not None:
+            frame = frames.get(self.thread_id)
+            if frame is not None:
+                self.counts[collapse(frame)] += 1
+        else:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident != own:
+                    self.counts[collapse(frame, names.get(ident, str(ident)))] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})".replace(";", ",")
+
+
+def collapse(frame, root: str | None = None) -> str:
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    if root is not None:
+        names.append(root.replace(";", ","))
+    return ";".join(reversed(names))
+
+
+def capture(seconds: float, interval: float) -> Sampler | None:
+    """Sample every thread for ``seconds``; None if a capture is already running."""
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        sampler = Sampler(interval).start()
+        # The calling thread only waits here; it is left out of the samples
+        threading.Event().wait(seconds)
+        return sampler.stop()
+    finally:
+        _busy.release()
+
+
+def interval_seconds(interval_ms: float) -> float:
+    # Below ~1 ms the sampler mostly competes with the profiled threads for the GIL
+    return max(float(interval_ms), 1.0) / 1000
+
+
+def profile_dir(app) -> str:
+    return app.config.get("PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+
+
+def profile_path(app, name: str) -> str | None:
+    """Path of a saved request profile, or None for names that are not ours."""
+    if not _NAME.match(name):
+        return None
+    return os.path.join(profile_dir(app), name)
+
+
+# -----------------------------
+# Single-request profiles
+# -----------------------------
+def save(sampler: Sampler, endpoint: str | None) -> str:
+    """Write a request profile under PROFILE_DIR; returns its file name."""
+    directory = profile_dir(current_app)
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    slug = re.sub(r"[^\w.-]", "_", endpoint or "unmatched")
+    name = f"{stamp}-{os.getpid()}-{slug}.folded"
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        f.write(sampler.collapsed())
+    return name
+
+
+def start_request_profile(interval: float) -> Sampler | None:
+    """Sample the calling thread; None if a capture is already running."""
+    if not _busy.acquire(blocking=False):
+        return None
+    return Sampler(interval, threading.get_ident()).start()
+
+
+def finish_request_profile(sampler: Sampler) -> Sampler:
+    try:
+        return sampler.stop()
+    finally:
+        _busy.release()
@@ -12,11 +12,23 @@ from qrcode.image.styles.moduledrawers import (
 from qrcode.image.styles.colormasks import SolidFillColorMask
 from flask import current_app
 
+from . import metrics
+
+# Styles with their own module drawer; anything else renders as square
+QR_STYLES = ("square", "dots", "circle", "rounded", "vertical-bars", "horizontal-bars", "mosaic", "beads")
+
+
 def generate_styled_qr(short_code, color_dark="#000000", style="square", logo_data=None, logo_path=None):
     """
     Generates a styled QR code for the given short_code.
     Returns the relative static path to the generated QR image.
     """
+    label = style.lower() if style.lower() in QR_STYLES else "square"
+    with metrics.timer("qr_render_seconds", style=label):
+        return _render_styled_qr(short_code, color_dark, style, logo_data, logo_path)
+
+
+def _render_styled_qr(short_code, color_dark, style, logo_data, logo_path):
     base_url = current_app.config.get("BASE_URL", "http://127.0.0.1:5000")
     qr_data = f"{base_url}/{short_code}?source=qr"
 
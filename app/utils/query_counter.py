@@ -0,0 +1,104 @@
+"""
+SQL statement counts per request, with N+1 detection.
+
+The statements of a request are counted on its ``timing.Timings`` (same
+engine events as the "db" phase). When the request finishes, ``review``
+logs it if it ran more than ``QUERY_BUDGET`` statements, or the same
+statement shape ``N_PLUS_ONE_THRESHOLD`` times or more: usually a query in
+a loop over rows, e.g. a lazy relationship per link.
+
+Tests pin an endpoint's query count with::
+
+    with assert_max_queries(3):
+        client.get("/my-urls", headers=auth)
+"""
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def shape(statement: str) -> str:
+    """``statement`` with literals and IN lists folded, so loop iterations compare equal."""
+    statement = _LITERALS.sub("?", statement)
+    statement = _IN_LISTS.sub("(?)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def repeated(statements: Counter, threshold: int) -> list[tuple[str, int]]:
+    """Statement shapes run at least ``threshold`` times, most frequent first."""
+    shapes = Counter()
+    for statement, count in statements.items():
+        shapes[shape(statement)] += count
+    return [(s, n) for s, n in shapes.most_common() if n >= threshold]
+
+
+def review(statements: Counter, config, what: str):
+    """Logs a request over its query budget or with repeated statement shapes."""
+    total = sum(statements.values())
+    if total < 2:
+        return
+    budget = int(config.get("QUERY_BUDGET", 20))
+    suspects = repeated(statements, int(config.get("N_PLUS_ONE_THRESHOLD", 5)))
+    if total > budget:
+        logger.warning("Request over query budget: %s", json.dumps({
+            "request": what, "queries": total, "budget": budget,
+            "repeated": [{"statement": s[:300], "count": n} for s, n in suspects],
+        }))
+    elif suspects:
+        logger.warning("Likely N+1 queries: %s", json.dumps({
+            "request": what, "queries": total,
+            "repeated": [{"statement": s[:300], "count": n} for s, n in suspects],
+        }))
+
+
+# -----------------------------
+# Test helpers
+# -----------------------------
+class QueryLog:
+    def __init__(self):
+        self.statements = Counter()
+
+    @property
+    def count(self) -> int:
+        return sum(self.statements.values())
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Counts the statements this thread runs on ``engine`` (default: the app's)."""
+    from . import timing
+
+    if engine is None:
+        from ..extensions import db
+        engine = db.engine
+    log = QueryLog()
+    thread = threading.get_ident()
+
+    def _record(conn, statement, seconds):
+        # Background writers share the engine; only count the caller's work
+        if threading.get_ident() == thread and conn.engine is engine:
+            log.statements[statement] += 1
+
+    timing.add_statement_observer(_record)
+    try:
+        yield log
+    finally:
+        timing.remove_statement_observer(_record)
+
+
+@contextmanager
+def assert_max_queries(limit: int, engine=None):
+    with count_queries(engine) as log:
+        yield log
+    if log.count > limit:
+        lines = "\n".join(f"  {n} x {s}" for s, n in repeated(log.statements, 1))
+        raise AssertionError(f"{log.count} queries, expected at most {limit}:\n{lines}")
@@ -0,0 +1,72 @@
+"""
+Keyed permutation of sequence numbers into short codes.
+
+``encode(n)`` runs ``n`` through a 4-round Feistel network over 40 bits and
+base62-encodes the result as 7 characters. The mapping is a bijection, so
+distinct sequence numbers always give distinct codes, while consecutive
+numbers come out unrelated; without the key, codes cannot be enumerated.
+"""
+import hashlib
+import string
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_LENGTH = 7
+BITS = 40
+MAX_ID = (1 << BITS) - 1
+
+_HALF = BITS // 2
+_MASK = (1 << _HALF) - 1
+_ROUNDS = 4
+
+
+def _round(key: bytes, i: int, value: int) -> int:
+    digest = hashlib.blake2b(value.to_bytes(4, "big"), digest_size=4, key=key, person=b"short-code-%d" % i).digest()
+    return int.from_bytes(digest, "big") & _MASK
+
+
+def _derive_key(secret) -> bytes:
+    secret = secret.encode("utf-8") if isinstance(secret, str) else bytes(secret)
+    return hashlib.blake2b(secret, digest_size=32, person=b"short-code-key").digest()
+
+
+def permute(n: int, secret) -> int:
+    if not 0 <= n <= MAX_ID:
+        raise ValueError(f"Sequence number out of range: {n}")
+    key = _derive_key(secret)
+    left, right = n >> _HALF, n & _MASK
+    for i in range(_ROUNDS):
+        left, right = right, left ^ _round(key, i, right)
+    return (left << _HALF) | right
+
+
+def unpermute(n: int, secret) -> int:
+    if not 0 <= n <= MAX_ID:
+        raise ValueError(f"Value out of range: {n}")
+    key = _derive_key(secret)
+    left, right = n >> _HALF, n & _MASK
+    for i in reversed(range(_ROUNDS)):
+        left, right = right ^ _round(key, i, left), left
+    return (left << _HALF) | right
+
+
+def base62(n: int, length: int = CODE_LENGTH) -> str:
+    chars = []
+    while n:
+        n, rem = divmod(n, 62)
+        chars.append(ALPHABET[rem])
+    return ''.join(reversed(chars)).rjust(length, ALPHABET[0])
+
+
+def encode(n: int, secret) -> str:
+    """Short code for sequence number ``n`` (always ``CODE_LENGTH`` characters)."""
+    return base62(permute(n, secret))
+
+
+def decode(code: str, secret) -> int | None:
+    """Sequence number ``encode`` turns into ``code``, or None if it never produces ``code``."""
+    if len(code) != CODE_LENGTH or any(c not in ALPHABET for c in code):
+        return None
+    n = 0
+    for c in code:
+        n = n * 62 + ALPHABET.index(c)
+    return unpermute(n, secret) if n <= MAX_ID else None
@@ -0,0 +1,161 @@
+"""
+Non-blocking structured logging.
+
+Records from every logger (``logging.getLogger(__name__)``, ``app.logger``,
+werkzeug, SQLAlchemy) go onto a bounded in-memory queue; one background
+thread formats and writes them to stderr (or ``LOG_FILE``). A request never
+waits on the write: when the queue is full the record is dropped and
+counted in ``log_records_dropped_total``.
+
+``LOG_LEVEL`` is the switch (DEBUG shows the webhook/subscription trace).
+Records below WARNING are kept at ``LOG_SAMPLE_RATE``. Output is one JSON
+object per line; ``LOG_FORMAT=text`` gives Flask's usual format for local
+runs.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+from flask.logging import default_handler
+
+from . import metrics
+
+# LogRecord attributes; anything else on a record came in through ``extra=``
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                  .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Keeps ``rate`` of the records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    ``QueueHandler`` that drops instead of blocking or raising on a full queue,
+    and (re)starts its writer thread lazily in each worker process.
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Resolve args and tracebacks now (they may change or pin frames);
+        # JSON encoding and the write happen on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._start_lock:
+            if self._listener_pid == pid:
+                return
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = pid
+
+    def close(self):
+        """Write out what is queued, then stop the writer thread."""
+        listener = self._listener
+        if listener is not None and self._listener_pid == os.getpid():
+            try:
+                listener.stop()
+            except queue.Full:
+                pass
+            self._listener = self._listener_pid = None
+        self.target.close()
+        super().close()
+
+
+def _shutdown():
+    if _handler is not None:
+        _handler.close()
+
+
+def _collect_metrics():
+    if _handler is not None:
+        metrics.set_counter("log_records_dropped_total", _handler.dropped)
+
+
+def init_logging(app):
+    """Route all logging through the queue; call before anything logs."""
+    global _handler
+    level = str(app.config.get("LOG_LEVEL", "INFO")).upper()
+
+    log_file = app.config.get("LOG_FILE")
+    target = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler(sys.stderr)
+    if str(app.config.get("LOG_FORMAT", "json")).lower() == "text":
+        target.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s"))
+    else:
+        target.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    if _handler is not None:
+        # create_app called again (tests, benchmarks): replace the previous handler
+        root.removeHandler(_handler)
+        _handler.close()
+    else:
+        atexit.register(_shutdown)
+    _handler = NonBlockingQueueHandler(target, int(app.config.get("LOG_QUEUE_SIZE", 10000)))
+    _handler.addFilter(SampleFilter(float(app.config.get("LOG_SAMPLE_RATE", 1.0))))
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+    # Flask's own handler writes synchronously; records reach the queue through the root logger
+    app.logger.removeHandler(default_handler)
+    metrics.register_collector(_collect_metrics)
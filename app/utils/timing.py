@@ -0,0 +1,193 @@
+"""
+Per-request phase timings.
+
+    with timing.phase("cache"):
+        payload = link_cache.get_payload(short_code)
+
+Phases add up per request in a contextvar, so the same calls work under
+Flask, the fast WSGI redirect path and asyncio tasks. SQL time is picked up
+as "db" from the engine events. The totals go back as a ``Server-Timing``
+header, and a request over its budget also logs its breakdown.
+
+Phases may nest (e.g. "db" inside "auth"). Outside a timed request
+``phase`` costs one contextvar lookup. The request's SQL statements are
+counted too, for query_counter.
+
+These are the only SQL engine hooks: anything else that needs per-statement
+data (metrics, ``query_counter.count_queries``) registers with
+``add_statement_observer``.
+"""
+import contextvars
+import functools
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import query_counter
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+_db_events = False
+_observers = ()
+
+
+class Timings:
+    __slots__ = ("started", "phases", "statements")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.statements = Counter()
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+def begin() -> contextvars.Token:
+    """Start timing the current request; pass the token to ``end``."""
+    return _current.set(Timings())
+
+
+def end(token: contextvars.Token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Token from another context (e.g. a copied one): just stop timing here
+        _current.set(None)
+
+
+def current() -> Timings | None:
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """Decorator form of ``phase``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def report(timings: Timings, budget_ms: float | None, what: str) -> str:
+    """``Server-Timing`` value for ``timings``; logs the breakdown when over ``budget_ms``."""
+    total_ms = (time.perf_counter() - timings.started) * 1000
+    phases_ms = {name: round(seconds * 1000, 2) for name, seconds in timings.phases.items()}
+    if budget_ms and total_ms > budget_ms:
+        logger.warning("Request over budget: %s", json.dumps({
+            "request": what, "total_ms": round(total_ms, 2), "budget_ms": budget_ms, "phases_ms": phases_ms,
+        }))
+    parts = [f"{name};dur={ms:.2f}" for name, ms in phases_ms.items()]
+    if "db" in phases_ms:
+        queries = sum(timings.statements.values())
+        parts[list(phases_ms).index("db")] += f';desc="{queries} {"query" if queries == 1 else "queries"}"'
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
+
+
+# -----------------------------
+# SQL time
+# -----------------------------
+def add_statement_observer(fn):
+    """
+    Call ``fn(conn, statement, seconds)`` after every SQL statement, in any
+    thread, inside a timed request or not (e.g. the metrics histogram).
+    """
+    global _observers
+    _listen_for_sql()
+    _observers += (fn,)
+
+
+def remove_statement_observer(fn):
+    global _observers
+    _observers = tuple(o for o in _observers if o is not fn)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("timing_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("timing_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.add("db", seconds)
+        timings.statements[statement] += 1
+    for observer in _observers:
+        observer(conn, statement, seconds)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute: drop its start time
+    conn = context.connection
+    started = conn.info.get("timing_started") if conn is not None else None
+    if started:
+        started.pop()
+
+
+def _listen_for_sql():
+    global _db_events
+    if not _db_events:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+        _db_events = True
+
+
+# -----------------------------
+# Flask requests
+# -----------------------------
+def budget_for(config, endpoint: str | None) -> float:
+    if endpoint == "url.redirection":
+        return float(config.get("REDIRECT_BUDGET_MS", 50))
+    return float(config.get("REQUEST_BUDGET_MS", 500))
+
+
+def init_timing(app):
+    _listen_for_sql()
+
+    @app.before_request
+    def _start_timing():
+        g._timing_token = begin()
+
+    @app.after_request
+    def _server_timing(response):
+        timings = current()
+        if timings is not None:
+            what = f"{request.method} {request.path}"
+            value = report(timings, budget_for(current_app.config, request.endpoint), what)
+            query_counter.review(timings.statements, current_app.config, what)
+            if current_app.config.get("SERVER_TIMING", True):
+                response.headers["Server-Timing"] = value
+        return response
+
+    @app.teardown_request
+    def _end_timing(exc):
+        token = g.pop("_timing_token", None)
+        if token is not None:
+            end(token)
@@ -0,0 +1,84 @@
+"""
+Memoised User-Agent parsing.
+
+``user_agents.parse`` is regex-heavy, but real traffic only carries a small
+set of distinct UA strings. Parsed results are kept in a bounded LRU keyed by
+a digest of the raw string, as compact immutable records shared by the
+redirect path and any reprocessing jobs.
+"""
+import hashlib
+
+from user_agents import parse
+
+from .lru_cache import MISSING, TTLCache
+
+
+class ParsedUserAgent:
+    __slots__ = ("browser", "browser_version", "os", "os_version", "platform", "device_class")
+
+    def __init__(self, browser, browser_version, os, os_version, platform, device_class):
+        set_ = object.__setattr__
+        set_(self, "browser", browser)
+        set_(self, "browser_version", browser_version)
+        set_(self, "os", os)
+        set_(self, "os_version", os_version)
+        set_(self, "platform", platform)
+        set_(self, "device_class", device_class)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ParsedUserAgent is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ParsedUserAgent is immutable")
+
+    def __repr__(self):
+        return f"<ParsedUserAgent {self.browser} {self.browser_version} / {self.platform} ({self.device_class})>"
+
+
+_cache = TTLCache(maxsize=4096, ttl=None)
+
+
+def init_ua_cache(app):
+    global _cache
+    _cache = TTLCache(maxsize=int(app.config.get("UA_CACHE_SIZE", 4096)), ttl=None)
+
+
+def _device_class(ua) -> str:
+    if ua.is_bot:
+        return "bot"
+    if ua.is_tablet:
+        return "tablet"
+    if ua.is_mobile:
+        return "mobile"
+    if ua.is_pc:
+        return "pc"
+    return "other"
+
+
+def _parse(user_agent_str: str) -> ParsedUserAgent:
+    ua = parse(user_agent_str)
+    os_family = ua.os.family or "Unknown"
+    os_version = ua.os.version_string or ""
+    return ParsedUserAgent(
+        browser=ua.browser.family or "Unknown",
+        browser_version=ua.browser.version_string or "Unknown",
+        os=os_family,
+        os_version=os_version,
+        platform=f"{os_family} {os_version}".strip(),
+        device_class=_device_class(ua),
+    )
+
+
+def parse_user_agent(user_agent_str: str | None) -> ParsedUserAgent:
+    user_agent_str = user_agent_str or "Unknown"
+    key = hashlib.blake2b(user_agent_str.encode("utf-8", "replace"), digest_size=16).digest()
+
+    parsed = _cache.get(key)
+    if parsed is MISSING:
+        parsed = _parse(user_agent_str)
+        _cache.set(key, parsed)
+    return parsed
+
+
+def ua_cache_stats() -> dict:
+    return _cache.stats()
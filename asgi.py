@@ -0,0 +1,6 @@
+from app import create_app
+from app.redirect_asgi import RedirectASGI
+
+# Optional ASGI entry point (any ASGI server, e.g. `uvicorn asgi:app`):
+# redirects are served on asyncio, everything else by the Flask app
+app = RedirectASGI(create_app())
@@ -0,0 +1,367 @@
+"""
+Benchmark: throughput and latency percentiles of the hot endpoints
+
+Boots create_app against a scratch database (a SQLite file in the temp dir
+by default, or a local Postgres) and an in-memory Redis stand-in (fakeredis,
+see benchmarks/requirements.txt), seeds it, and drives each scenario
+in-process through the WSGI app exactly as wsgi.py serves it:
+
+    redirect_hit / redirect_miss / redirect_bot   GET /<code> (cached, cache-miss, crawler)
+    create                                        POST /create
+    generate_qr_<style>                           POST /generate-qr, one per QR style
+    analytics_<n>                                 GET /analytics/<code>, link with n clicks
+    myurls_<n>                                    GET /myurls, user with n links
+    webhook                                       POST /api/subscription/webhook (signed)
+
+Numbers exclude the network and the web server; they are meant for
+comparing runs of the same machine against each other. Each run is written
+to benchmarks/results/<timestamp>.json; --compare prints the change
+against an earlier run.
+
+NEVER point this at a real database or Redis: it wipes and fills them.
+
+Run:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/run.py
+    python benchmarks/run.py --analytics-clicks 10000,1000000 --compare benchmarks/results/<earlier>.json
+    python benchmarks/run.py --database-url postgresql://localhost/bench --only redirect_hit,create
+"""
+
+import argparse
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+DEFAULT_DB = "sqlite:///" + os.path.join(tempfile.gettempdir(), "shorturl_bench.db")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+QR_STYLES = ("square", "dots", "circle", "rounded", "vertical-bars", "horizontal-bars", "mosaic", "beads")
+WEBHOOK_SECRET = "benchmark-webhook-secret"
+CHROME = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+GOOGLEBOT = "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+
+
+# -----------------------------
+# Boot
+# -----------------------------
+def boot(database_url: str, redis: str):
+    """create_app on the scratch database with Redis per ``redis`` ('fake', 'none' or a URL)."""
+    os.environ.update({
+        "SECRET_KEY": "benchmark",
+        "DATABASE_URL": database_url,
+        "BASE_URL": "http://bench.local",
+        "REDIS_URL": redis if "://" in redis else "",
+        "RAZORPAY_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        # Never call the remote Geo-IP service from a benchmark
+        "GEOIP_REMOTE_FALLBACK": "false",
+    })
+    if database_url.startswith("sqlite:///"):
+        path = database_url[len("sqlite:///"):]
+        if os.path.exists(path):
+            os.remove(path)
+
+    from app import create_app
+    from app import extensions
+    from app.extensions import db
+    from app.redirect_app import RedirectDispatcher
+    from app.services import click_partitions
+
+    app = create_app()
+    app.static_folder = tempfile.mkdtemp(prefix="shorturl_bench_static_")  # generated QR images land here
+    if app.config.get("FAST_REDIRECTS", True):
+        app.wsgi_app = RedirectDispatcher(app, app.wsgi_app)
+
+    if redis == "fake":
+        import fakeredis
+        extensions.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    if extensions.redis_client is not None:
+        extensions.redis_client.flushdb()
+
+    with app.app_context():
+        for _, table in click_partitions.partition_tables():
+            table.drop(db.engine, checkfirst=True)
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+# -----------------------------
+# Seed
+# -----------------------------
+def _code(rng) -> str:
+    return ''.join(rng.choices(string.ascii_letters + string.digits, k=8))
+
+
+def seed(app, myurls_links: list, analytics_clicks: list, rng) -> dict:
+    """Users, links and clicks for every scenario; returns what the scenarios need."""
+    from app.extensions import db
+    from app.models.plan import Plan
+    from app.models.url import Urls
+    from app.models.user import User
+    from app.services import click_counters, click_partitions, click_rollups
+    from app.utils.jwt_helper import encode_token
+
+    now = datetime.datetime.utcnow()
+    with app.app_context():
+        plan = Plan(
+            name="PREMIUM", max_links=-1, max_qrs=-1, max_custom_links=-1, max_qr_with_logo=-1,
+            max_editable_links=-1, allow_qr_styling=True, allow_analytics=True, show_individual_stats=True,
+            allow_api_access=True, analytics_level="detailed",
+        )
+        db.session.add(plan)
+        db.session.flush()
+
+        def user(n: int) -> User:
+            u = User(
+                firstname="Bench", lastname=str(n), organization="bench", phone="0", email=f"bench{n}@bench.local",
+                password="x", plan_id=plan.id, usage_links=0, usage_qrs=0, usage_qr_with_logo=0,
+                usage_editable_links=0, permanent_custom_limits=False,
+            )
+            db.session.add(u)
+            db.session.flush()
+            return u
+
+        def links(owner: User, count: int) -> list:
+            rows = [{
+                "long": f"https://example.com/{owner.id}/{i}", "short": _code(rng), "user_id": owner.id,
+                "created_at": now, "show_short": True, "is_custom": False, "is_edited": False, "plan_name": "PREMIUM",
+            } for i in range(count)]
+            for start in range(0, len(rows), 10000):
+                db.session.execute(Urls.__table__.insert(), rows[start:start + 10000])
+            return [r["short"] for r in rows]
+
+        main = user(1)
+        redirect_codes = links(main, 100)
+        seeded = {"token": encode_token(main.id, main.email), "redirect_codes": redirect_codes, "myurls": {}, "analytics": {}}
+
+        for n, count in enumerate(myurls_links, start=2):
+            owner = user(n)
+            links(owner, count)
+            seeded["myurls"][count] = encode_token(owner.id, owner.email)
+
+        for count in analytics_clicks:
+            code = links(main, 1)[0]
+            url_id = Urls.query.filter_by(short=code).first().id_
+            db.session.commit()  # partition DDL runs on its own connection
+            for start in range(0, count, 50000):
+                click_partitions.insert_rows([{
+                    "url_id": url_id, "browser": "Chrome", "os": "Windows", "platform": "Windows",
+                    "country": rng.choice(["India", "United States", "Germany"]), "city": "Bench",
+                    "ip_address": f"10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)}",
+                    "timestamp": now - datetime.timedelta(seconds=rng.randint(120, 90 * 86400)),
+                    "source": rng.choice(["direct", "qr"]),
+                } for _ in range(min(50000, count - start))])
+                db.session.commit()
+            seeded["analytics"][count] = code
+        db.session.commit()
+
+        # Totals and breakdowns come from the counters and rollups, as in production
+        click_counters.backfill(until=now)
+        click_rollups.backfill()
+    return seeded
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+class Scenario:
+    def __init__(self, name: str, request, before=None, requests: int | None = None, expect=(200,)):
+        self.name = name
+        self.request = request      # (client, i) -> response
+        self.before = before        # (i) -> None, untimed
+        self.requests = requests    # overrides --requests (slow scenarios)
+        self.expect = expect
+
+
+def scenarios(app, seeded: dict, requests: int) -> list:
+    from app.services import link_cache
+
+    auth = {"Authorization": f"Bearer {seeded['token']}"}
+    codes = seeded["redirect_codes"]
+    hit = codes[0]
+
+    def visitor(i: int) -> dict:
+        # A new client per request, so no click is debounced
+        return {"User-Agent": CHROME, "X-Forwarded-For": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"}
+
+    def uncache(i: int):
+        with app.app_context():
+            link_cache.invalidate(codes[1 + i % (len(codes) - 1)])
+
+    def webhook(client, i):
+        body = json.dumps({
+            "id": f"evt_bench_{time.time_ns()}_{i}", "event": "payment.captured", "created_at": int(time.time()),
+            "payload": {"payment": {"entity": {"id": f"pay_bench_{i}", "amount": 900}}},
+        }).encode()
+        signature = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        return client.post("/api/subscription/webhook", data=body,
+                           headers={"X-Razorpay-Signature": signature, "Content-Type": "application/json"})
+
+    result = [
+        Scenario("redirect_hit", lambda c, i: c.get(f"/{hit}", headers=visitor(i)), expect=(301, 302)),
+        Scenario("redirect_miss", lambda c, i: c.get(f"/{codes[1 + i % (len(codes) - 1)]}", headers=visitor(i)),
+                 before=uncache, expect=(301, 302)),
+        Scenario("redirect_bot", lambda c, i: c.get(f"/{hit}", headers={"User-Agent": GOOGLEBOT}), expect=(301, 302)),
+        Scenario("create", lambda c, i: c.post("/create", json={"long_url": f"https://example.com/new/{i}"}, headers=auth)),
+    ]
+    for style in QR_STYLES:
+        result.append(Scenario(
+            f"generate_qr_{style}",
+            lambda c, i, style=style: c.post("/generate-qr", headers=auth, json={
+                "long_url": f"https://example.com/qr/{style}/{i}", "style": style, "color_dark": "#1a73e8",
+                "generate_short": True,
+            }),
+            requests=max(1, requests // 10),
+        ))
+    for count, code in seeded["analytics"].items():
+        result.append(Scenario(f"analytics_{count}", lambda c, i, code=code: c.get(f"/analytics/{code}", headers=auth),
+                               requests=max(3, requests * 10000 // max(count, 10000) // 10)))
+    for count, token in seeded["myurls"].items():
+        result.append(Scenario(f"myurls_{count}",
+                               lambda c, i, token=token: c.get("/myurls", headers={"Authorization": f"Bearer {token}"}),
+                               requests=max(3, requests // 10)))
+    result.append(Scenario("webhook", webhook))
+    return result
+
+
+def _ok(scenario: Scenario, response) -> bool:
+    if response.status_code not in scenario.expect:
+        return False
+    if response.is_json:
+        body = response.get_json(silent=True) or {}
+        return body.get("success", True) is not False and body.get("status") != "error"
+    return True
+
+
+def run_scenario(app, scenario: Scenario, requests: int, warmup: int) -> dict:
+    client = app.test_client()
+    total = scenario.requests or requests
+    for i in range(warmup):
+        if scenario.before:
+            scenario.before(total + i)
+        scenario.request(client, total + i)
+
+    samples, errors = [], 0
+    for i in range(total):
+        if scenario.before:
+            scenario.before(i)
+        start = time.perf_counter()
+        response = scenario.request(client, i)
+        samples.append((time.perf_counter() - start) * 1000)
+        errors += not _ok(scenario, response)
+        response.close()
+
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / (sum(samples) / 1000), 2),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(cuts[49], 3),
+        "p90_ms": round(cuts[89], 3),
+        "p99_ms": round(cuts[98], 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+# -----------------------------
+# Results
+# -----------------------------
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_table(results: dict, baseline: dict | None = None):
+    width = max(len(name) for name in results)
+    header = f"{'scenario'.ljust(width)}  {'req/s':>10}  {'p50 ms':>9}  {'p90 ms':>9}  {'p99 ms':>9}  {'errors':>6}"
+    print("\n" + header + ("  vs baseline" if baseline else ""))
+    for name, r in results.items():
+        line = (f"{name.ljust(width)}  {r['throughput_rps']:10.1f}  {r['p50_ms']:9.3f}  "
+                f"{r['p90_ms']:9.3f}  {r['p99_ms']:9.3f}  {r['errors']:6d}")
+        base = (baseline or {}).get(name)
+        if base and base["throughput_rps"]:
+            change = (r["throughput_rps"] / base["throughput_rps"] - 1) * 100
+            line += f"  {change:+.1f}% req/s, p99 {base['p99_ms']:.3f} -> {r['p99_ms']:.3f} ms"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot endpoints on seeded data.")
+    parser.add_argument("--database-url", default=DEFAULT_DB, help="Scratch database (it is wiped)")
+    parser.add_argument("--redis", default="fake", help="'fake' (in-memory), 'none', or a scratch redis:// URL (flushed)")
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per scenario (slow ones run fewer)")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--analytics-clicks", default="10000", help="Comma-separated click counts, e.g. 10000,1000000")
+    parser.add_argument("--myurls-links", default="10000", help="Comma-separated link counts")
+    parser.add_argument("--only", default=None, help="Comma-separated scenario names (prefixes match)")
+    parser.add_argument("--output", default=None, help="Results file (defaults to benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    analytics_clicks = [int(n) for n in args.analytics_clicks.split(",") if n]
+    myurls_links = [int(n) for n in args.myurls_links.split(",") if n]
+
+    print("=" * 60)
+    print(f"Benchmark: {args.database_url} / redis={args.redis}")
+    print("=" * 60)
+    started = time.perf_counter()
+    app = boot(args.database_url, args.redis)
+    print(f"→ Seeding links and {', '.join(map(str, analytics_clicks))} analytics clicks ...")
+    seeded = seed(app, myurls_links, analytics_clicks, random.Random(args.seed))
+    print(f"✓ Ready in {time.perf_counter() - started:.1f}s")
+
+    only = [name for name in (args.only or "").split(",") if name]
+    results = {}
+    for scenario in scenarios(app, seeded, args.requests):
+        if only and not any(scenario.name.startswith(name) for name in only):
+            continue
+        print(f"→ {scenario.name} ...")
+        results[scenario.name] = run_scenario(app, scenario, args.requests, args.warmup)
+        if results[scenario.name]["errors"]:
+            print(f"⚠️  {scenario.name}: {results[scenario.name]['errors']} unexpected responses")
+
+    report = {
+        "started_at": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": args.database_url.split("://", 1)[0],
+        "redis": args.redis if "://" not in args.redis else "url",
+        "fast_redirects": bool(app.config.get("FAST_REDIRECTS", True)),
+        "params": {"requests": args.requests, "warmup": args.warmup, "analytics_clicks": analytics_clicks,
+                   "myurls_links": myurls_links, "seed": args.seed},
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+    print_table(results, baseline)
+    print(f"\n✓ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Migration: Indexes for the hot lookups
+Date: 2026-10-17
+
+Adds the indexes behind the redirect, create, dashboard, analytics and
+webhook lookups:
+
+    ux_urls_short                                    urls (short) UNIQUE, WHERE short IS NOT NULL
+    ix_urls_user_id_plan_name                        urls (user_id, plan_name)
+    ix_urls_user_id_is_custom                        urls (user_id, is_custom)
+    ix_url_analytics_url_id_timestamp                url_analytics (url_id, timestamp)
+    ix_subscriptions_razorpay_subscription_id        subscriptions (razorpay_subscription_id)
+    ix_razorpay_subscription_plans_razorpay_plan_id  razorpay_subscription_plans (razorpay_plan_id)
+
+Indexes are built online so the tables stay writable:
+- PostgreSQL: CREATE INDEX CONCURRENTLY (outside a transaction)
+- MSSQL: WITH (ONLINE = ON); editions without online index builds
+  (Standard/Express) fall back to a regular build
+- Anything else (SQLite): a plain CREATE INDEX
+
+If urls.short already holds duplicates, ux_urls_short is created as a
+non-unique index and the duplicates are listed so they can be cleaned up
+and the migration re-run.
+
+Run:
+    python migrations/add_hot_path_indexes.py
+    python migrations/add_hot_path_indexes.py --rollback
+"""
+
+import argparse
+import sys
+import os
+from collections import namedtuple
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import inspect, text
+
+IndexSpec = namedtuple("IndexSpec", "name table columns unique where")
+
+INDEXES = [
+    IndexSpec("ux_urls_short", "urls", ["short"], True, "short IS NOT NULL"),
+    IndexSpec("ix_urls_user_id_plan_name", "urls", ["user_id", "plan_name"], False, None),
+    IndexSpec("ix_urls_user_id_is_custom", "urls", ["user_id", "is_custom"], False, None),
+    IndexSpec("ix_url_analytics_url_id_timestamp", "url_analytics", ["url_id", "timestamp"], False, None),
+    IndexSpec("ix_subscriptions_razorpay_subscription_id", "subscriptions", ["razorpay_subscription_id"], False, None),
+    IndexSpec("ix_razorpay_subscription_plans_razorpay_plan_id", "razorpay_subscription_plans", ["razorpay_plan_id"], False, None),
+]
+
+
+def create_index_sql(dialect: str, spec: IndexSpec, quote, unique: bool, online: bool = True) -> str:
+    columns = ", ".join(quote(c) for c in spec.columns)
+    kind = "UNIQUE " if unique else ""
+    where = f" WHERE {spec.where}" if spec.where else ""
+
+    if dialect == "postgresql":
+        concurrently = "CONCURRENTLY " if online else ""
+        return f"CREATE {kind}INDEX {concurrently}IF NOT EXISTS {spec.name} ON {spec.table} ({columns}){where}"
+    if dialect == "mssql":
+        with_online = " WITH (ONLINE = ON)" if online else ""
+        return f"CREATE {kind}NONCLUSTERED INDEX {spec.name} ON {spec.table} ({columns}){where}{with_online}"
+    return f"CREATE {kind}INDEX IF NOT EXISTS {spec.name} ON {spec.table} ({columns}){where}"
+
+
+def drop_index_sql(dialect: str, spec: IndexSpec) -> str:
+    if dialect == "postgresql":
+        return f"DROP INDEX CONCURRENTLY IF EXISTS {spec.name}"
+    if dialect == "mssql":
+        return f"DROP INDEX IF EXISTS {spec.name} ON {spec.table}"
+    return f"DROP INDEX IF EXISTS {spec.name}"
+
+
+def _existing_indexes(engine, table: str) -> set:
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return None
+    return {ix["name"] for ix in inspector.get_indexes(table)}
+
+
+def _duplicates(conn, spec: IndexSpec, limit: int = 10) -> list:
+    column = spec.columns[0]
+    where = f"WHERE {spec.where} " if spec.where else ""
+    rows = conn.execute(text(
+        f"SELECT {column}, COUNT(*) FROM {spec.table} {where}GROUP BY {column} HAVING COUNT(*) > 1"
+    )).fetchmany(limit)
+    return [(value, count) for value, count in rows]
+
+
+def apply(engine, online: bool = True, log=print) -> list:
+    """Create every missing index. Returns the names created."""
+    dialect = engine.dialect.name
+    quote = engine.dialect.identifier_preparer.quote
+    created = []
+
+    # CONCURRENTLY cannot run inside a transaction; autocommit is harmless elsewhere
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for spec in INDEXES:
+            existing = _existing_indexes(engine, spec.table)
+            if existing is None:
+                log(f"⚠️  {spec.table} does not exist, skipping {spec.name}")
+                continue
+            if spec.name in existing:
+                log(f"✓ {spec.name} already exists")
+                continue
+
+            unique = spec.unique
+            if unique:
+                duplicates = _duplicates(conn, spec)
+                if duplicates:
+                    unique = False
+                    log(f"⚠️  {spec.table}.{spec.columns[0]} has duplicates, creating {spec.name} as non-unique:")
+                    for value, count in duplicates:
+                        log(f"     {value!r} x{count}")
+
+            log(f"→ Creating {spec.name} ...")
+            try:
+                conn.execute(text(create_index_sql(dialect, spec, quote, unique, online)))
+            except Exception as e:
+                if dialect == "mssql" and online and "online index" in str(e).lower():
+                    log("   Online index builds not available on this edition, building offline")
+                    conn.execute(text(create_index_sql(dialect, spec, quote, unique, online=False)))
+                elif dialect == "postgresql" and online:
+                    # A failed CONCURRENTLY build leaves an INVALID index behind
+                    conn.execute(text(drop_index_sql(dialect, spec)))
+                    raise
+                else:
+                    raise
+            created.append(spec.name)
+            log(f"✓ {spec.name} created")
+    return created
+
+
+def rollback(engine, log=print) -> list:
+    """Drop the indexes added by this migration."""
+    dialect = engine.dialect.name
+    dropped = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for spec in INDEXES:
+            existing = _existing_indexes(engine, spec.table)
+            if not existing or spec.name not in existing:
+                continue
+            conn.execute(text(drop_index_sql(dialect, spec)))
+            dropped.append(spec.name)
+            log(f"✓ {spec.name} dropped")
+    return dropped
+
+
+def run_migration(undo: bool = False):
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    with app.app_context():
+        print("=" * 60)
+        print(f"{'Rolling back' if undo else 'Starting'} migration: Hot path indexes ({db.engine.dialect.name})")
+        print("=" * 60)
+        if undo:
+            rollback(db.engine)
+        else:
+            apply(db.engine)
+        print("\n✓ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rollback", action="store_true", help="Drop the indexes instead of creating them")
+    run_migration(undo=parser.parse_args().rollback)
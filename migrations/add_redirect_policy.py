@@ -0,0 +1,60 @@
+"""
+Migration: Per-link redirect policy
+Date: 2026-10-17
+
+Adds to urls:
+
+    redirect_policy   VARCHAR(20) NULL   "temporary" | "cached" | "permanent" (NULL = temporary)
+    redirect_max_age  INT NULL           cache lifetime in seconds (NULL = config default)
+
+Existing links keep NULL, i.e. uncached 302s exactly as before.
+
+Run:
+    python migrations/add_redirect_policy.py
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import inspect, text
+
+COLUMNS = [
+    ("redirect_policy", "VARCHAR(20) NULL"),
+    ("redirect_max_age", "INT NULL"),
+]
+
+
+def apply(engine, log=print) -> list:
+    """Add the missing columns. Returns the names added."""
+    existing = {c["name"] for c in inspect(engine).get_columns("urls")}
+    added = []
+    with engine.begin() as conn:
+        for name, ddl in COLUMNS:
+            if name in existing:
+                log(f"✓ urls.{name} already exists")
+                continue
+            log(f"→ Adding urls.{name} ...")
+            conn.execute(text(f"ALTER TABLE urls ADD {name} {ddl}"))
+            added.append(name)
+            log(f"✓ urls.{name} added")
+    return added
+
+
+def run_migration():
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    with app.app_context():
+        print("=" * 60)
+        print(f"Starting migration: Redirect policy ({db.engine.dialect.name})")
+        print("=" * 60)
+        apply(db.engine)
+        print("\n✓ Done")
+
+
+if __name__ == "__main__":
+    run_migration()
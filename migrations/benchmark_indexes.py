@@ -0,0 +1,176 @@
+"""
+Benchmark: hot lookups before and after add_hot_path_indexes.py
+
+Seeds a scratch database (1,000,000 clicks by default), times each hot query
+without the indexes, applies the migration, and times them again.
+
+NEVER point this at a real database: it creates and fills the tables.
+
+Run:
+    python migrations/benchmark_indexes.py                      # SQLite file in the temp dir
+    python migrations/benchmark_indexes.py --database-url postgresql://.../bench --clicks 1000000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEFAULT_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "shorturl_index_bench.db")
+
+
+def _models(database_url: str):
+    # The app package reads its config on import; the benchmark only needs the models
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("DATABASE_URL", database_url)
+    os.environ.setdefault("BASE_URL", "http://localhost")
+    from app.extensions import db
+    from app.models.plan import Plan
+    from app.models.user import User
+    from app.models.url import Urls
+    from app.models.url_analytics import UrlAnalytics
+    from app.models.subscription import RazorpaySubscriptionPlan, Subscription
+    return db, [Plan, User, Urls, UrlAnalytics, Subscription, RazorpaySubscriptionPlan]
+
+
+def _code(rng) -> str:
+    return ''.join(rng.choices(string.ascii_letters + string.digits, k=7))
+
+
+def seed(engine, models, users: int, links: int, clicks: int, rng):
+    Plan, User, Urls, UrlAnalytics, Subscription, RazorpaySubscriptionPlan = models
+    now = datetime.datetime.utcnow()
+    chunk = 10000
+
+    def insert_many(table, rows):
+        with engine.begin() as conn:
+            for start in range(0, len(rows), chunk):
+                conn.execute(table.insert(), rows[start:start + chunk])
+
+    insert_many(Plan.__table__, [{"id": 1, "name": "FREE"}])
+    insert_many(User.__table__, [{
+        "id": i, "firstname": "Bench", "lastname": str(i), "organization": "bench", "phone": "0",
+        "email": f"user{i}@bench.local", "password": "x", "usage_links": 0, "usage_qrs": 0,
+        "usage_qr_with_logo": 0, "usage_editable_links": 0, "permanent_custom_limits": False,
+    } for i in range(1, users + 1)])
+
+    codes = set()
+    while len(codes) < links:
+        codes.add(_code(rng))
+    codes = list(codes)
+    insert_many(Urls.__table__, [{
+        "id_": i, "long": f"https://example.com/{i}", "short": code, "user_id": rng.randint(1, users),
+        "created_at": now, "show_short": True, "is_custom": rng.random() < 0.1, "is_edited": False,
+        "plan_name": rng.choice(["FREE", "PRO", "PREMIUM"]),
+    } for i, code in enumerate(codes, start=1)])
+
+    for start in range(0, clicks, 100000):
+        insert_many(UrlAnalytics.__table__, [{
+            "url_id": rng.randint(1, links), "browser": "Chrome", "os": "Windows", "country": "India",
+            "timestamp": now - datetime.timedelta(seconds=rng.randint(0, 90 * 86400)),
+            "source": rng.choice(["direct", "qr"]),
+        } for _ in range(min(100000, clicks - start))])
+
+    insert_many(Subscription.__table__, [{
+        "id": f"sub-{i}", "user_id": i, "razorpay_subscription_id": f"sub_{i:010d}",
+        "razorpay_plan_id": f"plan_{i:010d}",
+    } for i in range(1, users + 1)])
+    insert_many(RazorpaySubscriptionPlan.__table__, [{
+        "id": i, "plan_name": "PRO", "user_id": i, "razorpay_plan_id": f"plan_{i:010d}",
+        "period": "monthly", "interval": 1, "amount": 9.0, "created_date": now,
+    } for i in range(1, users + 1)])
+    return codes
+
+
+def queries(codes, users: int, links: int):
+    """(label, SQL, params factory) for each hot lookup."""
+    from sqlalchemy import text
+    return [
+        ("redirect / create: urls by short", text("SELECT * FROM urls WHERE short = :s"),
+         lambda rng: {"s": rng.choice(codes)}),
+        ("my_urls (grace): urls by user + plan", text("SELECT * FROM urls WHERE user_id = :u AND plan_name = 'FREE'"),
+         lambda rng: {"u": rng.randint(1, users)}),
+        ("custom link limit: count by user + is_custom",
+         text("SELECT COUNT(*) FROM urls WHERE user_id = :u AND is_custom = :c"),
+         lambda rng: {"u": rng.randint(1, users), "c": True}),
+        ("analytics: clicks of a link, newest first",
+         text("SELECT * FROM url_analytics WHERE url_id = :l ORDER BY timestamp DESC"),
+         lambda rng: {"l": rng.randint(1, links)}),
+        ("clicks today: count by link + time range",
+         text("SELECT COUNT(*) FROM url_analytics WHERE url_id = :l AND timestamp >= :t"),
+         lambda rng: {"l": rng.randint(1, links), "t": datetime.datetime.utcnow() - datetime.timedelta(days=1)}),
+        ("webhook: subscription by razorpay id",
+         text("SELECT * FROM subscriptions WHERE razorpay_subscription_id = :s"),
+         lambda rng: {"s": f"sub_{rng.randint(1, users):010d}"}),
+        ("renewal: plan by razorpay plan id",
+         text("SELECT * FROM razorpay_subscription_plans WHERE razorpay_plan_id = :p"),
+         lambda rng: {"p": f"plan_{rng.randint(1, users):010d}"}),
+    ]
+
+
+def time_queries(engine, specs, repeat: int, seed_value: int) -> dict:
+    """Median milliseconds per query label."""
+    rng = random.Random(seed_value)
+    results = {}
+    with engine.connect() as conn:
+        for label, sql, params in specs:
+            samples = []
+            for _ in range(repeat):
+                args = params(rng)
+                start = time.perf_counter()
+                conn.execute(sql, args).fetchall()
+                samples.append((time.perf_counter() - start) * 1000)
+            results[label] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot path index migration on seeded data.")
+    parser.add_argument("--database-url", default=DEFAULT_URL, help="Scratch database (it is wiped)")
+    parser.add_argument("--clicks", type=int, default=1000000)
+    parser.add_argument("--links", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=25, help="Runs per query (median is reported)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from add_hot_path_indexes import apply, rollback
+
+    db, models = _models(args.database_url)
+    engine = create_engine(args.database_url)
+    tables = [m.__table__ for m in models]
+
+    print(f"→ Seeding {args.users} users, {args.links} links, {args.clicks} clicks into {engine.url.render_as_string()}")
+    started = time.perf_counter()
+    db.metadata.drop_all(engine, tables=tables)
+    db.metadata.create_all(engine, tables=tables)
+    rollback(engine, log=lambda *_: None)  # start from the pre-migration schema
+    codes = seed(engine, models, args.users, args.links, args.clicks, random.Random(args.seed))
+    print(f"✓ Seeded in {time.perf_counter() - started:.1f}s")
+
+    specs = queries(codes, args.users, args.links)
+    before = time_queries(engine, specs, args.repeat, args.seed)
+
+    started = time.perf_counter()
+    apply(engine, log=lambda *_: None)
+    print(f"✓ Indexes built in {time.perf_counter() - started:.1f}s")
+    after = time_queries(engine, specs, args.repeat, args.seed)
+
+    width = max(len(label) for label, _, _ in specs)
+    print(f"\n{'query'.ljust(width)}  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}")
+    for label, _, _ in specs:
+        speedup = before[label] / after[label] if after[label] else float("inf")
+        print(f"{label.ljust(width)}  {before[label]:10.3f}  {after[label]:10.3f}  {speedup:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
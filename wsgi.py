@@ -1,5 +1,10 @@
+
 from app import create_app
+from app.redirect_app import RedirectDispatcher
 
 app = create_app()
 
+# GET/HEAD /<short_code> is answered by the minimal redirect app, the rest by Flask
+if app.config.get("FAST_REDIRECTS", True):
+    app.wsgi_app = RedirectDispatcher(app, app.wsgi_app)
 